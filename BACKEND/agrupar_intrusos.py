@@ -0,0 +1,392 @@
+"""
+Agrupamiento de Intrusos por Lotes - V-ESCOM
+============================================
+Job fuera de línea que agrupa todas las capturas de personas_no_autorizadas
+en identidades de intruso y mantiene un centroide por identidad:
+
+  1. Semilla: las identidades que ya asignó la re-identificación en línea
+     entran al union-find (cada captura se une con su id_intruso), de modo
+     que el job solo fusiona identidades y nunca las parte ni las renombra
+     sin necesidad.
+  2. Grafo de vecinos: recorre las capturas en lotes (paginación por id_pna)
+     y, por cada una, consulta sus k vecinos más cercanos con el índice HNSW
+     (una sola consulta LATERAL por lote). Cada par con similitud >= umbral
+     une ambas capturas en un union-find.
+  3. Escritura: las capturas sin identidad reciben la raíz de su grupo.
+  4. Centroides: en una sola transacción, toda captura cuyo id_intruso quedó
+     fusionado en otro grupo pasa al id canónico (también las que llegaron
+     después del tope) y intrusos_centroides se reconstruye con
+     avg(embedding) por identidad; la re-identificación en línea busca
+     primero ahí.
+
+Id canónico de un grupo: el menor id_intruso ya existente en él; solo un
+grupo sin identidades previas toma su menor id_pna (misma convención que la
+re-identificación en línea al abrir una identidad).
+
+Memoria acotada: solo se mantienen el arreglo del union-find (8 bytes por
+captura) y la marca de ids existentes (1 byte); los embeddings nunca salen
+de la BD.
+
+Reanudable: el avance (fase, último id_pna, union-find) se guarda en un
+checkpoint .npz cada --checkpoint-seg segundos; si el job se interrumpe, la
+siguiente ejecución continúa desde ahí (--reiniciar empieza de cero). Repetir
+lotes ya procesados es inofensivo: uniones y escrituras son idempotentes.
+
+Uso:
+  python agrupar_intrusos.py
+  python agrupar_intrusos.py --lote 5000 --vecinos 10 --umbral 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+from app.bd import SessionLocal
+from app.services.intrusos_service import REID_SIMILITUD
+
+# ─── Configuración de logging ─────────────────────────────────────────────────
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] Agrupamiento | %(message)s",
+    datefmt="%H:%M:%S",
+)
+log = logging.getLogger("agrupar_intrusos")
+
+FASE_SEMILLA    = "semilla"
+FASE_GRAFO      = "grafo"
+FASE_ESCRITURA  = "escritura"
+FASE_CENTROIDES = "centroides"
+FASE_TERMINADO  = "terminado"
+
+
+# ─── Union-find ───────────────────────────────────────────────────────────────
+def buscar_raiz(padre: np.ndarray, x: int) -> int:
+    raiz = x
+    while padre[raiz] != raiz:
+        raiz = padre[raiz]
+    # Compresión de camino
+    while padre[x] != raiz:
+        padre[x], x = raiz, padre[x]
+    return int(raiz)
+
+
+def unir(padre: np.ndarray, a: int, b: int, existente: np.ndarray | None = None) -> bool:
+    """
+    Une los grupos de a y b. La raíz es el menor id_pna, prefiriendo los
+    que ya son id_intruso (existente[id] = True) para conservar identidades.
+    """
+    raiz_a, raiz_b = buscar_raiz(padre, a), buscar_raiz(padre, b)
+    if raiz_a == raiz_b:
+        return False
+    if existente is None:
+        clave_a, clave_b = (False, raiz_a), (False, raiz_b)
+    else:
+        clave_a = (not existente[raiz_a], raiz_a)
+        clave_b = (not existente[raiz_b], raiz_b)
+    if clave_a < clave_b:
+        padre[raiz_b] = raiz_a
+    else:
+        padre[raiz_a] = raiz_b
+    return True
+
+
+def fusiones(padre: np.ndarray, existente: np.ndarray) -> tuple[list[int], list[int]]:
+    """Ids existentes que dejan de ser canónicos y el id que los reemplaza."""
+    anteriores, canonicos = [], []
+    for id_intruso in np.flatnonzero(existente):
+        raiz = buscar_raiz(padre, int(id_intruso))
+        if raiz != id_intruso:
+            anteriores.append(int(id_intruso))
+            canonicos.append(raiz)
+    return anteriores, canonicos
+
+
+# ─── Checkpoint ───────────────────────────────────────────────────────────────
+class Checkpoint:
+    """Guarda el estado como máximo cada intervalo_seg segundos."""
+
+    def __init__(self, ruta: Path, intervalo_seg: float) -> None:
+        self.ruta = ruta
+        self.intervalo_seg = intervalo_seg
+        self._ultimo_guardado = time.monotonic()
+
+    def tal_vez_guardar(self, estado: dict) -> None:
+        if time.monotonic() - self._ultimo_guardado >= self.intervalo_seg:
+            self.guardar(estado)
+
+    def guardar(self, estado: dict) -> None:
+        guardar_checkpoint(self.ruta, estado)
+        self._ultimo_guardado = time.monotonic()
+
+
+def guardar_checkpoint(ruta: Path, estado: dict) -> None:
+    temporal = ruta.with_suffix(".tmp")
+    with open(temporal, "wb") as f:
+        np.savez(f, **estado)
+    os.replace(temporal, ruta)
+
+
+def cargar_checkpoint(ruta: Path) -> dict | None:
+    if not ruta.exists():
+        return None
+    with np.load(ruta, allow_pickle=False) as datos:
+        if "existente" not in datos:
+            # Checkpoint de una versión sin semilla: se empieza de cero
+            return None
+        return {
+            "fase":   str(datos["fase"]),
+            "tope":   int(datos["tope"]),
+            "ultimo": int(datos["ultimo"]),
+            "padre":  datos["padre"].copy(),
+            "existente": datos["existente"].copy(),
+            "aristas": int(datos["aristas"]),
+        }
+
+
+# ─── Fases ────────────────────────────────────────────────────────────────────
+def _ids_lote(db, desde: int, tope: int, lote: int) -> list[int]:
+    filas = db.execute(
+        text(
+            """
+            SELECT id_pna FROM personas_no_autorizadas
+            WHERE id_pna > :desde AND id_pna <= :tope
+              AND embedding_detectado IS NOT NULL
+            ORDER BY id_pna
+            LIMIT :lote
+            """
+        ),
+        {"desde": desde, "tope": tope, "lote": lote},
+    ).all()
+    return [f[0] for f in filas]
+
+
+def fase_semilla(db, estado: dict, lote: int, checkpoint: Checkpoint) -> None:
+    padre, existente, tope = estado["padre"], estado["existente"], estado["tope"]
+    if estado["ultimo"] == 0:
+        ids_intruso = db.execute(
+            text(
+                """
+                SELECT DISTINCT id_intruso FROM personas_no_autorizadas
+                WHERE id_pna <= :tope AND id_intruso IS NOT NULL AND id_intruso <= :tope
+                """
+            ),
+            {"tope": tope},
+        ).scalars().all()
+        existente[list(ids_intruso)] = True
+        log.info(f"Semilla: {len(ids_intruso)} identidades existentes")
+
+    while True:
+        filas = db.execute(
+            text(
+                """
+                SELECT id_pna, id_intruso FROM personas_no_autorizadas
+                WHERE id_pna > :desde AND id_pna <= :tope
+                  AND id_intruso IS NOT NULL AND id_intruso <= :tope
+                ORDER BY id_pna
+                LIMIT :lote
+                """
+            ),
+            {"desde": estado["ultimo"], "tope": tope, "lote": lote},
+        ).all()
+        if not filas:
+            break
+        for id_pna, id_intruso in filas:
+            unir(padre, id_pna, id_intruso, existente)
+        estado["ultimo"] = filas[-1][0]
+        checkpoint.tal_vez_guardar(estado)
+
+
+def fase_grafo(
+    db, estado: dict, lote: int, vecinos: int, umbral: float, checkpoint: Checkpoint
+) -> None:
+    padre, existente, tope = estado["padre"], estado["existente"], estado["tope"]
+    db.execute(text(f"SET hnsw.ef_search = {max(40, vecinos * 2)}"))
+    procesadas, inicio = 0, time.perf_counter()
+
+    while True:
+        ids = _ids_lote(db, estado["ultimo"], tope, lote)
+        if not ids:
+            break
+        t0 = time.perf_counter()
+        pares = db.execute(
+            text(
+                """
+                SELECT q.id_pna, m.id_pna
+                FROM personas_no_autorizadas q
+                JOIN LATERAL (
+                    SELECT c.id_pna, c.embedding_detectado <=> q.embedding_detectado AS distancia
+                    FROM personas_no_autorizadas c
+                    WHERE c.embedding_detectado IS NOT NULL
+                    ORDER BY c.embedding_detectado <=> q.embedding_detectado
+                    LIMIT :vecinos
+                ) m ON TRUE
+                WHERE q.id_pna = ANY(:ids)
+                  AND m.id_pna <> q.id_pna
+                  AND m.id_pna <= :tope
+                  AND m.distancia <= :distancia_max
+                """
+            ),
+            {"ids": ids, "vecinos": vecinos, "tope": tope, "distancia_max": 1.0 - umbral},
+        ).all()
+        for a, b in pares:
+            if unir(padre, a, b, existente):
+                estado["aristas"] += 1
+
+        estado["ultimo"] = ids[-1]
+        checkpoint.tal_vez_guardar(estado)
+        procesadas += len(ids)
+        log.info(
+            f"Grafo: hasta id_pna={ids[-1]}/{tope} | {len(ids) / (time.perf_counter() - t0):.0f} filas/s "
+            f"| uniones acumuladas={estado['aristas']}"
+        )
+
+    total = time.perf_counter() - inicio
+    if procesadas:
+        log.info(f"Grafo terminado: {procesadas} filas en {total:.1f}s ({procesadas / total:.0f} filas/s)")
+
+
+def fase_escritura(db, estado: dict, lote: int, checkpoint: Checkpoint) -> None:
+    """
+    Solo completa las capturas sin identidad: las que ya tienen una se
+    corrigen por id fusionado en fase_centroides, junto con los centroides.
+    """
+    padre, tope = estado["padre"], estado["tope"]
+    procesadas, inicio = 0, time.perf_counter()
+
+    while True:
+        ids = _ids_lote(db, estado["ultimo"], tope, lote)
+        if not ids:
+            break
+        raices = [buscar_raiz(padre, i) for i in ids]
+        db.execute(
+            text(
+                """
+                UPDATE personas_no_autorizadas p
+                SET id_intruso = v.raiz
+                FROM unnest(CAST(:ids AS int[]), CAST(:raices AS int[])) AS v(id_pna, raiz)
+                WHERE p.id_pna = v.id_pna AND p.id_intruso IS NULL
+                """
+            ),
+            {"ids": ids, "raices": raices},
+        )
+        db.commit()
+        estado["ultimo"] = ids[-1]
+        checkpoint.tal_vez_guardar(estado)
+        procesadas += len(ids)
+
+    total = time.perf_counter() - inicio
+    if procesadas:
+        log.info(f"Escritura terminada: {procesadas} filas en {total:.1f}s ({procesadas / total:.0f} filas/s)")
+
+
+def fase_centroides(db, estado: dict) -> int:
+    """
+    Reasigna los ids fusionados y reconstruye los centroides en una sola
+    transacción: la re-identificación en línea nunca ve centroides de ids
+    que ya no existen ni capturas con ids sin centroide. El bloqueo de
+    intrusos_centroides hace esperar a las búsquedas en línea mientras dura.
+    """
+    inicio = time.perf_counter()
+    anteriores, canonicos = fusiones(estado["padre"], estado["existente"])
+    db.execute(text("LOCK TABLE intrusos_centroides IN ACCESS EXCLUSIVE MODE"))
+    # Sin filtro de tope: también las capturas llegadas durante el job
+    reasignadas = db.execute(
+        text(
+            """
+            UPDATE personas_no_autorizadas p
+            SET id_intruso = v.canonico
+            FROM unnest(CAST(:anteriores AS int[]), CAST(:canonicos AS int[])) AS v(anterior, canonico)
+            WHERE p.id_intruso = v.anterior
+            """
+        ),
+        {"anteriores": anteriores, "canonicos": canonicos},
+    ).rowcount
+    db.execute(text("DELETE FROM intrusos_centroides"))
+    insertados = db.execute(
+        text(
+            """
+            INSERT INTO intrusos_centroides (id_intruso, embedding, capturas)
+            SELECT id_intruso, avg(embedding_detectado), count(*)
+            FROM personas_no_autorizadas
+            WHERE embedding_detectado IS NOT NULL AND id_intruso IS NOT NULL
+            GROUP BY id_intruso
+            """
+        )
+    ).rowcount
+    db.commit()
+    log.info(
+        f"Centroides reconstruidos: {insertados} identidades, {len(anteriores)} fusionadas "
+        f"({reasignadas} capturas reasignadas) en {time.perf_counter() - inicio:.1f}s"
+    )
+    return insertados
+
+
+# ─── Main ─────────────────────────────────────────────────────────────────────
+def main() -> None:
+    parser = argparse.ArgumentParser(description="V-ESCOM Agrupamiento de intrusos")
+    parser.add_argument("--lote",     type=int, default=2000,
+                        help="Capturas por lote (default 2000)")
+    parser.add_argument("--vecinos",  type=int, default=10,
+                        help="Vecinos k-NN consultados por captura (default 10)")
+    parser.add_argument("--umbral",   type=float, default=REID_SIMILITUD,
+                        help="Similitud mínima para unir dos capturas (default INTRUSOS_REID_SIMILITUD)")
+    parser.add_argument("--estado",   type=str, default="agrupamiento_intrusos.npz",
+                        help="Ruta del checkpoint para reanudar")
+    parser.add_argument("--checkpoint-seg", type=float, default=30.0,
+                        help="Segundos entre guardados del checkpoint (default 30)")
+    parser.add_argument("--reiniciar", action="store_true",
+                        help="Ignora el checkpoint y empieza de cero")
+    args = parser.parse_args()
+
+    ruta = Path(args.estado)
+    checkpoint = Checkpoint(ruta, args.checkpoint_seg)
+    db = SessionLocal()
+    try:
+        estado = None if args.reiniciar else cargar_checkpoint(ruta)
+        if estado is None or estado["fase"] == FASE_TERMINADO:
+            tope = db.execute(text("SELECT COALESCE(max(id_pna), 0) FROM personas_no_autorizadas")).scalar()
+            # Las capturas que lleguen durante el job quedan para la siguiente ejecución
+            estado = {
+                "fase": FASE_SEMILLA,
+                "tope": int(tope),
+                "ultimo": 0,
+                "padre": np.arange(int(tope) + 1, dtype=np.int64),
+                "existente": np.zeros(int(tope) + 1, dtype=bool),
+                "aristas": 0,
+            }
+            log.info(f"Agrupando capturas hasta id_pna={tope} (umbral={args.umbral}, k={args.vecinos})")
+        else:
+            log.info(f"Reanudando fase '{estado['fase']}' desde id_pna={estado['ultimo']}")
+
+        if estado["fase"] == FASE_SEMILLA:
+            fase_semilla(db, estado, args.lote, checkpoint)
+            estado.update(fase=FASE_GRAFO, ultimo=0)
+            checkpoint.guardar(estado)
+
+        if estado["fase"] == FASE_GRAFO:
+            fase_grafo(db, estado, args.lote, args.vecinos, args.umbral, checkpoint)
+            estado.update(fase=FASE_ESCRITURA, ultimo=0)
+            checkpoint.guardar(estado)
+
+        if estado["fase"] == FASE_ESCRITURA:
+            fase_escritura(db, estado, args.lote, checkpoint)
+            estado.update(fase=FASE_CENTROIDES)
+            checkpoint.guardar(estado)
+
+        if estado["fase"] == FASE_CENTROIDES:
+            identidades = fase_centroides(db, estado)
+            estado.update(fase=FASE_TERMINADO)
+            checkpoint.guardar(estado)
+            log.info(f"✓ Agrupamiento completo: {identidades} identidades de intruso")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
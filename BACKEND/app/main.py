@@ -9,12 +9,16 @@ Este módulo inicializa la aplicación FastAPI y configura los componentes centr
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from app.routes import profesores, camaras, auth, reconocimiento, alertas, ws_alertas, cubiculos
 from app.routes import reportes
 from app.routes import stream
 from app.routes import rtsp as rtsp_routes
+from app.services import arranque_service
+from app.services.galeria_service import galeria
+from app.services.inferencia_service import inferencia_pool
 from app.services.rtsp_manager import rtsp_manager
 # ─── Configuracion de la instancia ──────────────────────────────────────────────
 app = FastAPI(
@@ -49,7 +53,24 @@ app.include_router(ws_alertas.router)
 app.include_router(reportes.router)
 app.include_router(stream.router)
 app.include_router(rtsp_routes.router)
-rtsp_manager.inicializar(app)  
+
+
+# ─── Ciclo de vida ──────────────────────────────────────────────────────────────
+# La fase de arranque (modelos, galería, pool de BD) corre en segundo plano
+# para que /listo responda 503 mientras carga; el auto-arranque de cámaras la
+# espera y se omite si falló.
+@app.on_event("startup")
+async def _preparar_motor() -> None:
+    arranque_service.iniciar_en_segundo_plano()
+
+
+@app.on_event("shutdown")
+async def _detener_inferencia() -> None:
+    galeria.detener()
+    inferencia_pool.detener()
+
+
+rtsp_manager.inicializar(app)
 
 fotos_path = Path(__file__).resolve().parent.parent / "fotos_rostros"
 app.mount("/fotos_rostros", StaticFiles(directory=str(fotos_path)), name="fotos_rostros")
@@ -57,4 +78,14 @@ app.mount("/fotos_rostros", StaticFiles(directory=str(fotos_path)), name="fotos_
 @app.get("/", tags=["Root"])
 async def root():
     """Endpoint de salud para verificar que la API está operativa."""
-    return {"status": "online", "system": "V-ESCOM"}
\ No newline at end of file
+    return {"status": "online", "system": "V-ESCOM"}
+
+
+@app.get("/listo", tags=["Root"])
+async def listo():
+    """
+    Readiness: 200 solo cuando los modelos están cargados y calentados,
+    la galería cargada y el pool de BD pre-llenado; 503 mientras tanto.
+    """
+    estado = arranque_service.estado_arranque
+    return JSONResponse(status_code=200 if estado["listo"] else 503, content=estado)
@@ -5,7 +5,8 @@ Representa los dispositivos de captura de video distribuidos en la unidad.
 Vincula el hardware físico (IP) con la ubicación lógica (Cubículo).
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, TIMESTAMP
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.bd import Base
 
@@ -40,4 +41,24 @@ class Camara(Base):
     estado = Column(String(20), default="Activa")
     
     # Auditoría de creación del registro
-    fecha_registro = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
+    fecha_registro = Column(TIMESTAMP, server_default=func.now())
+
+    # ── Perfil de detección (nulo = valores globales del motor) ──
+    # Región de interés en coordenadas normalizadas (0-1):
+    # {"rect": [x1, y1, x2, y2]} o {"poligono": [[x, y], ...]}
+    roi = Column(JSONB, nullable=True)
+
+    # Tamaño de entrada del detector (ej. 320 para cámaras de geometría fija)
+    det_size = Column(Integer, nullable=True)
+
+    # Lado mínimo en píxeles para considerar un rostro
+    min_rostro_px = Column(Integer, nullable=True)
+
+    # Máximo de rostros a procesar por frame
+    max_rostros = Column(Integer, nullable=True)
+
+    # Sensibilidad del detector de movimiento (0-1; 0 = analizar siempre)
+    sensibilidad_movimiento = Column(Float, nullable=True)
+
+    # Presupuesto de decodificación del hilo de captura (frames/s; 0 = todos)
+    fps_decodificacion = Column(Float, nullable=True)
\ No newline at end of file
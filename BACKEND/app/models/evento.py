@@ -6,7 +6,7 @@ accesos de personal conocido y registros de intrusos.
 """
 
 from pgvector.sqlalchemy import VECTOR
-from sqlalchemy import Column, Integer, String, Float, Date, Time, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, Time, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from app.bd import Base
 
@@ -36,6 +36,10 @@ class EventoAcceso(Base):
     # Puntaje de confianza del reconocimiento (ej. 0.98 para alta certeza)
     similitud = Column(Float)
 
+    # De-duplicación de intrusos: avistamientos fusionados en este evento
+    avistamientos = Column(Integer, nullable=False, server_default="1")
+    ultimo_avistamiento = Column(DateTime, server_default=func.now())
+
 
 class PersonaNoAutorizada(Base):
     """
@@ -55,4 +59,27 @@ class PersonaNoAutorizada(Base):
     ruta_imagen_captura = Column(String(255))
     
     # Vector característico del rostro desconocido para comparaciones futuras
-    embedding_detectado = Column(VECTOR(512))
\ No newline at end of file
+    embedding_detectado = Column(VECTOR(512))
+
+    # Identidad estable del intruso: id_pna de su primera captura.
+    # Las capturas posteriores de la misma persona heredan este valor.
+    id_intruso = Column(Integer, index=True, nullable=True)
+
+    # Origen de la captura
+    id_camara = Column(Integer, ForeignKey("camaras.id_camara"), nullable=True)
+    id_evento = Column(Integer, nullable=True)
+
+
+class IntrusoCentroide(Base):
+    """
+    Embedding representativo (promedio) de cada identidad de intruso.
+
+    Lo reconstruye el job agrupar_intrusos.py; la re-identificación en línea
+    lo consulta antes que las capturas individuales.
+    """
+    __tablename__ = "intrusos_centroides"
+
+    id_intruso = Column(Integer, primary_key=True)
+    embedding = Column(VECTOR(512), nullable=False)
+    capturas = Column(Integer, nullable=False)
+    actualizado = Column(DateTime, server_default=func.now())
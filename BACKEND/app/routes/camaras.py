@@ -15,6 +15,7 @@ from app.services import camara_service
 from app.core.deps import get_current_admin # Sugerencia: Proteger estas rutas
 from app.models.administrador import Administrador
 from app.routes.stream import detener_stream_activo
+from app.services.rtsp_manager import rtsp_manager
 
 router = APIRouter(prefix="/camaras", tags=["Cámaras"])
 
@@ -49,8 +50,13 @@ def actualizar_camara(
     db: Session = Depends(get_db),
     _admin: Administrador = Depends(get_current_admin)
 ):
-    """Modifica la IP, ubicación o estado de una cámara existente."""
-    return camara_service.actualizar_camara(db, id_camara, datos)
+    """
+    Modifica la IP, ubicación, estado o perfil de detección de una cámara.
+    Los cambios de perfil se aplican en caliente al worker RTSP activo.
+    """
+    camara = camara_service.actualizar_camara(db, id_camara, datos)
+    rtsp_manager.actualizar_perfil(id_camara, camara_service.perfil_deteccion(camara))
+    return camara
 
 
 @router.delete("/{id_camara}", summary="Desactivar cámara")
@@ -2,9 +2,10 @@
 Router del módulo de reconocimiento facial.
 Todas las rutas requieren autenticación JWT (admin).
 """
+import json
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, Query, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, UploadFile
 from sqlalchemy.orm import Session
 
 from app.bd import get_db
@@ -15,10 +16,17 @@ from app.schemas.reconocimiento_schema import (
     CrearPersonaAutorizada,
     DatosEvento,
     DatosPersonaAutorizada,
+    HistorialIntruso,
+    ResultadoFrame,
+    ResultadoLote,
     ResultadoReconocimiento,
     UpdPersonaAutorizada,
 )
-from app.services import reconocimiento_service
+from app.services import camara_service, reconocimiento_service
+from app.services.inferencia_service import agrupador_reconocimiento, inferencia_pool
+from app.utils.face_utils import FACE_MODELO
+from app.utils.lote_embeddings import CABECERA_MODELO, decodificar_embeddings
+from app.utils.lote_frames import FrameLote, decodificar_lote
 
 router = APIRouter(prefix="/reconocimiento", tags=["Reconocimiento Facial"])
 
@@ -149,6 +157,203 @@ async def identificar(
     return await reconocimiento_service.identificar_rostro(db, imagen, id_camara)
 
 
+@router.post(
+    "/identificar/frame",
+    response_model=ResultadoFrame,
+    summary="Identificar todos los rostros de un frame",
+)
+async def identificar_frame(
+    imagen: UploadFile = File(..., description="Frame capturado por la cámara"),
+    id_camara: Optional[int] = Form(None, description="ID de la cámara que capturó el frame"),
+    db: Session = Depends(get_db),
+    _: Administrador = Depends(get_current_admin),
+):
+    """
+    Modo multi-rostro: identifica cada rostro presente en el frame y
+    registra un evento de acceso por rostro. Un frame sin rostros
+    retorna una lista vacía (no es error).
+    """
+    contenido = await imagen.read()
+    perfil = camara_service.obtener_perfil_deteccion(db, id_camara)
+    rostros = await reconocimiento_service.identificar_rostros_frame(
+        db, contenido, id_camara, perfil=perfil
+    )
+    return ResultadoFrame(total_rostros=len(rostros), rostros=rostros)
+
+
+async def _leer_lote(request: Request, db: Session) -> List[FrameLote]:
+    """
+    Frames de /identificar/lote, en multipart o en el formato binario de
+    app.utils.lote_frames (application/octet-stream). Rechaza con 422 las
+    marcas de tiempo no plausibles y las cámaras inexistentes.
+    """
+    maximo = reconocimiento_service.LOTE_MAX_FRAMES
+    tipo = request.headers.get("content-type", "")
+    if not tipo.startswith("multipart/form-data"):
+        try:
+            frames = decodificar_lote(await request.body(), maximo)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    else:
+        formulario = await request.form()
+        archivos = formulario.getlist("imagenes")
+        if len(archivos) > maximo:
+            raise HTTPException(status_code=413, detail=f"El lote excede {maximo} frames")
+        try:
+            metadatos = json.loads(formulario.get("metadatos") or "[]")
+            id_defecto = formulario.get("id_camara")
+            id_defecto = int(id_defecto) if id_defecto else None
+        except ValueError:
+            raise HTTPException(status_code=422, detail="metadatos o id_camara inválidos")
+        if not isinstance(metadatos, list) or (metadatos and len(metadatos) != len(archivos)):
+            raise HTTPException(
+                status_code=422, detail="metadatos debe tener un elemento por imagen"
+            )
+        frames = []
+        for i, archivo in enumerate(archivos):
+            meta = metadatos[i] if metadatos else {}
+            try:
+                id_camara = meta.get("id_camara", id_defecto)
+                ts = meta.get("ts")
+                frames.append(FrameLote(
+                    contenido=await archivo.read(),
+                    id_camara=int(id_camara) if id_camara is not None else None,
+                    ts=float(ts) if ts is not None else None,
+                ))
+            except (AttributeError, TypeError, ValueError):
+                raise HTTPException(status_code=422, detail=f"metadatos[{i}] inválido")
+    if not frames:
+        raise HTTPException(status_code=422, detail="El lote no contiene frames")
+    reconocimiento_service.validar_origen_lote(db, frames)
+    return frames
+
+
+@router.post(
+    "/identificar/lote",
+    response_model=ResultadoLote,
+    summary="Identificar los rostros de varios frames en una petición",
+)
+async def identificar_lote(
+    request: Request,
+    db: Session = Depends(get_db),
+    _: Administrador = Depends(get_current_admin),
+):
+    """
+    Para equipos remotos que envían varios frames a la vez: una sola
+    autenticación, un lote de inferencia y una transacción para todos los
+    eventos. Acepta:
+
+    - multipart/form-data: `imagenes` (uno por frame), `id_camara` opcional
+      para todos y `metadatos` opcional, un JSON con un objeto
+      `{"id_camara": int, "ts": epoch}` por imagen.
+    - application/octet-stream: el formato binario con prefijo de longitud
+      de app.utils.lote_frames.
+
+    Retorna un resultado por frame en el orden de envío.
+    """
+    frames = await _leer_lote(request, db)
+    perfiles = {
+        id_camara: camara_service.obtener_perfil_deteccion(db, id_camara)
+        for id_camara in {f.id_camara for f in frames}
+    }
+    return await reconocimiento_service.identificar_lote(db, frames, perfiles)
+
+
+@router.post(
+    "/identificar/embeddings",
+    response_model=ResultadoFrame,
+    summary="Identificar rostros embebidos en un equipo de borde",
+)
+async def identificar_embeddings(
+    request: Request,
+    db: Session = Depends(get_db),
+    _: Administrador = Depends(get_current_admin),
+):
+    """
+    Recibe embeddings ArcFace ya calculados (rtsp_worker.py --edge) en el
+    formato binario de app.utils.lote_embeddings (application/octet-stream):
+    por rostro, cámara, marca de tiempo, bbox, det_score, el embedding
+    float32 de 512 dimensiones y opcionalmente el recorte JPEG.
+    La cabecera X-Face-Modelo debe coincidir con el FACE_MODELO del servidor.
+    No decodifica imágenes ni usa el pool de inferencia.
+    """
+    modelo = request.headers.get(CABECERA_MODELO)
+    if modelo != FACE_MODELO:
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                f"Embeddings del modelo '{modelo}' no comparables con el del servidor "
+                f"'{FACE_MODELO}' (cabecera {CABECERA_MODELO})"
+            ),
+        )
+    try:
+        rostros = decodificar_embeddings(
+            await request.body(), reconocimiento_service.LOTE_MAX_ROSTROS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    reconocimiento_service.validar_origen_lote(db, rostros)
+    return await reconocimiento_service.identificar_embeddings(db, rostros)
+
+
+# ─── Intrusos recurrentes ─────────────────────────────────────────────────────
+
+@router.post(
+    "/intrusos/buscar",
+    response_model=HistorialIntruso,
+    summary="Buscar un rostro entre los intrusos registrados",
+)
+async def buscar_intruso(
+    imagen: UploadFile = File(..., description="Imagen con un solo rostro"),
+    db: Session = Depends(get_db),
+    _: Administrador = Depends(get_current_admin),
+):
+    """
+    Compara el rostro contra el histórico de personas no autorizadas y
+    retorna cuántas veces y en qué cámaras se ha visto a esa persona.
+    404 si no coincide con ningún intruso.
+    """
+    return await reconocimiento_service.buscar_intruso(db, imagen)
+
+
+@router.get(
+    "/intrusos/{id_intruso}",
+    response_model=HistorialIntruso,
+    summary="Historial de avistamientos de un intruso",
+)
+def historial_intruso(
+    id_intruso: int,
+    db: Session = Depends(get_db),
+    _: Administrador = Depends(get_current_admin),
+):
+    return reconocimiento_service.obtener_historial_intruso(db, id_intruso)
+
+
+# ─── Motor de inferencia ──────────────────────────────────────────────────────
+
+@router.get(
+    "/motor/perfil",
+    summary="Tiempo de inferencia por módulo del motor facial",
+)
+def perfil_motor(
+    reiniciar: bool = Query(False, description="Si es true, reinicia los contadores tras leerlos"),
+    _: Administrador = Depends(get_current_admin),
+):
+    """
+    Reporta el modelo/módulos cargados y el tiempo promedio por llamada de
+    cada módulo ONNX, junto con el estado del pool y de los micro-lotes.
+    Útil para comparar configuraciones (FACE_MODELO / FACE_MODULOS).
+    """
+    reporte = {
+        **inferencia_pool.perfil(),
+        "pool": inferencia_pool.estado(),
+        "lotes": agrupador_reconocimiento.estado(),
+    }
+    if reiniciar:
+        inferencia_pool.reiniciar_perfil()
+    return reporte
+
+
 # ─── Historial de eventos ─────────────────────────────────────────────────────
 
 @router.get(
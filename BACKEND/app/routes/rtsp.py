@@ -15,12 +15,49 @@ from app.core.deps import get_current_admin
 from app.core.security import decode_access_token
 from app.models.administrador import Administrador
 from app.models.camara import Camara
+from app.services.captura_proceso import abrir_captura
+from app.services.consumidores_camara import GrabadorVideo
 from app.services.rtsp_manager import rtsp_manager
 from pydantic import BaseModel
 
 log = logging.getLogger("rtsp_routes")
 router = APIRouter(prefix="/rtsp", tags=["RTSP / Captura Continua"])
 
+# Segundos sin frames nuevos de la cámara antes de cerrar un cliente MJPEG
+MJPEG_SIN_FRAMES_SEG = float(os.getenv("MJPEG_SIN_FRAMES_SEG", "10"))
+# Segundos que puede tardar el envío de un frame a un cliente lento
+MJPEG_PLAZO_ENVIO_SEG = float(os.getenv("MJPEG_PLAZO_ENVIO_SEG", "5"))
+
+
+class RespuestaMJPEG(StreamingResponse):
+    """
+    StreamingResponse que desconecta a los clientes estancados: si enviar un
+    frame tarda más de plazo_envio_seg (el socket no drena), se corta el
+    stream en lugar de retener la corrutina y la memoria del frame.
+    """
+
+    def __init__(self, contenido, plazo_envio_seg: float, **kwargs) -> None:
+        super().__init__(contenido, **kwargs)
+        self.plazo_envio_seg = plazo_envio_seg
+
+    async def stream_response(self, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        async for parte in self.body_iterator:
+            try:
+                await asyncio.wait_for(
+                    send({"type": "http.response.body", "body": parte, "more_body": True}),
+                    self.plazo_envio_seg,
+                )
+            except asyncio.TimeoutError:
+                log.warning("[MJPEG] Cliente estancado, desconectando")
+                await self.body_iterator.aclose()
+                return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
 
 class IniciarStreamPayload(BaseModel):
     id_camara: int
@@ -28,6 +65,10 @@ class IniciarStreamPayload(BaseModel):
     rtsp_user: Optional[str] = "adminadmin"
     rtsp_pass: Optional[str] = ""
     stream: Optional[str] = "stream2"
+    # Doble stream: URL o nombre del stream principal (ej. "stream1") para
+    # reconocimiento y evidencia en alta resolución
+    rtsp_url_alta: Optional[str] = None
+    stream_alta: Optional[str] = None
 
 
 def _resolver_rtsp_url(id_camara: int, db: Session,
@@ -66,12 +107,19 @@ async def iniciar_stream(
             if pwd else
             f"rtsp://{camara.direccion_ip}:554/{payload.stream}"
         )
+    rtsp_url_alta = payload.rtsp_url_alta
+    if not rtsp_url_alta and payload.stream_alta:
+        rtsp_url_alta = f"{rtsp_url.rsplit('/', 1)[0]}/{payload.stream_alta}"
     log.info(f"URL RTSP que se usará: {rtsp_url}")
     from app.core.security import create_access_token
     token = create_access_token({"sub": str(admin.id_admin), "email": admin.email})
     rtsp_manager.set_token(token)
-    await rtsp_manager.iniciar_camara(payload.id_camara, rtsp_url)
-    return {"mensaje": f"Worker iniciado para cámara #{payload.id_camara}", "rtsp_url": rtsp_url}
+    worker = await rtsp_manager.iniciar_camara(payload.id_camara, rtsp_url, rtsp_url_alta)
+    return {
+        "mensaje": f"Worker iniciado para cámara #{payload.id_camara}",
+        "rtsp_url": rtsp_url,
+        "rtsp_url_alta": worker.rtsp_url_alta,
+    }
 
 
 @router.delete("/detener/{id_camara}")
@@ -85,24 +133,54 @@ def estado_streams(_admin: Administrador = Depends(get_current_admin)):
     return rtsp_manager.estado()
 
 
+@router.post("/grabar/{id_camara}")
+def iniciar_grabacion(
+    id_camara: int,
+    fps: Optional[float] = Query(None, gt=0, le=60),
+    _admin: Administrador = Depends(get_current_admin),
+):
+    """
+    Graba a disco los frames del worker de la cámara, sin abrir otra conexión
+    al stream: el grabador se enchufa al mismo decodificador.
+    """
+    grabador = GrabadorVideo(id_camara) if fps is None else GrabadorVideo(id_camara, fps)
+    if not rtsp_manager.adjuntar_consumidor(id_camara, grabador):
+        raise HTTPException(status_code=503, detail="La cámara no tiene un worker activo")
+    return {"mensaje": f"Grabación iniciada para cámara #{id_camara}", "ruta": grabador.ruta}
+
+
+@router.delete("/grabar/{id_camara}")
+def detener_grabacion(id_camara: int, _admin: Administrador = Depends(get_current_admin)):
+    grabador = rtsp_manager.soltar_consumidor(id_camara, GrabadorVideo.nombre)
+    if grabador is None:
+        raise HTTPException(status_code=404, detail="La cámara no se está grabando")
+    return {"mensaje": f"Grabación detenida para cámara #{id_camara}", **grabador.estado()}
+
+
 @router.get("/snapshot/{id_camara}")
 async def snapshot(
     id_camara: int,
+    ancho: Optional[int] = Query(None, ge=64, description="Ancho máximo del JPEG"),
     db: Session = Depends(get_db),
     _admin: Administrador = Depends(get_current_admin),
 ):
-    # Intentar servir desde ultimo_jpg del worker primero
+    # Intentar servir desde el worker: se suscribe un momento a la vista
+    # previa para que el hilo de captura codifique un solo frame
     worker = rtsp_manager._workers.get(id_camara)
-    if worker and worker.activo and worker.ultimo_jpg:
-        return Response(content=worker.ultimo_jpg, media_type="image/jpeg")
+    if worker and worker.activo:
+        id_suscriptor = worker.vista.suscribir(ancho=ancho)
+        try:
+            jpg, _ = await worker.vista.difusor.esperar(worker.vista.version, timeout=3.0)
+        finally:
+            worker.vista.desuscribir(id_suscriptor)
+        if jpg:
+            return Response(content=jpg, media_type="image/jpeg")
 
     # Fallback: capturar directamente
     rtsp_url = _resolver_rtsp_url(id_camara, db)
 
     def _capturar() -> bytes:
-        os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
-        cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)  # type: ignore
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # type: ignore
+        cap = abrir_captura(rtsp_url)
         if not cap.isOpened():
             return b""
         for _ in range(5):
@@ -124,10 +202,14 @@ async def snapshot(
 async def mjpeg_stream(
     id_camara: int,
     token: str = Query(..., description="JWT del administrador"),
+    fps: float = Query(15.0, gt=0, le=30, description="Cuadros por segundo deseados"),
+    ancho: Optional[int] = Query(None, ge=64, description="Ancho máximo de los frames"),
     db: Session = Depends(get_db),
 ):
     """
-    Stream MJPEG — lee frames de worker.ultimo_jpg sin abrir conexión RTSP extra.
+    Stream MJPEG — lee frames de la vista previa del worker sin abrir conexión
+    RTSP extra. Mientras el cliente está conectado, el worker codifica a la
+    mayor tasa/ancho pedidos por sus espectadores; sin espectadores no codifica.
     Autenticación via ?token=... porque los <img> no envían headers.
     """
     payload = decode_access_token(token)
@@ -152,40 +234,48 @@ async def mjpeg_stream(
 
     async def generar_frames():
         """
-        Lee ultimo_jpg del worker directamente.
-        NO abre conexión RTSP — evita conflicto con el worker de captura.
+        Espera cada JPEG nuevo del difusor de la vista previa (sin polling).
+        Si el cliente va atrasado recibe el más reciente y se saltan los
+        intermedios. NO abre conexión RTSP — evita conflicto con el worker.
         """
-        ultimo_enviado = None
-        sin_frame = 0
+        version = worker.vista.version
+        saltados = 0
+        id_suscriptor = worker.vista.suscribir(fps=fps, ancho=ancho)
+        intervalo = 1.0 / fps
+        loop = asyncio.get_running_loop()
 
         try:
             while worker.activo:
-                jpg = worker.ultimo_jpg
-
-                if jpg is not None and jpg is not ultimo_enviado:
-                    ultimo_enviado = jpg
-                    sin_frame = 0
-                    yield (
-                        b"--frame\r\n"
-                        b"Content-Type: image/jpeg\r\n\r\n"
-                        + jpg
-                        + b"\r\n"
-                    )
-                else:
-                    sin_frame += 1
-                    if sin_frame > 150:  # ~10s sin frames nuevos
-                        log.warning(f"[MJPEG Cam#{id_camara}] Sin frames nuevos, cerrando")
-                        break
-
-                await asyncio.sleep(0.067)  # ~15 fps
+                jpg, nueva = await worker.vista.difusor.esperar(
+                    version, timeout=MJPEG_SIN_FRAMES_SEG
+                )
+                if jpg is None:
+                    log.warning(f"[MJPEG Cam#{id_camara}] Sin frames nuevos, cerrando")
+                    break
+                saltados += max(0, nueva - version - 1)
+                version = nueva
+
+                inicio = loop.time()
+                yield (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n"
+                    + jpg
+                    + b"\r\n"
+                )
+                # Respetar el fps de este cliente aunque otro pida más
+                restante = intervalo - (loop.time() - inicio)
+                if restante > 0:
+                    await asyncio.sleep(restante)
 
         except (asyncio.CancelledError, GeneratorExit):
             pass
         finally:
-            log.info(f"[MJPEG Cam#{id_camara}] Cliente desconectado")
+            worker.vista.desuscribir(id_suscriptor)
+            log.info(f"[MJPEG Cam#{id_camara}] Cliente desconectado (frames saltados: {saltados})")
 
-    return StreamingResponse(
+    return RespuestaMJPEG(
         generar_frames(),
+        plazo_envio_seg=MJPEG_PLAZO_ENVIO_SEG,
         media_type="multipart/x-mixed-replace; boundary=frame",
         headers={
             "Cache-Control": "no-cache, no-store, must-revalidate",
@@ -206,5 +296,6 @@ async def test_frame(
         "activo": worker.activo,
         "tiene_jpg": worker.ultimo_jpg is not None,
         "tamanio_jpg": len(worker.ultimo_jpg) if worker.ultimo_jpg else 0,
+        "vista_previa": worker.vista.estado(),
         "ultimo_frame_ts": worker.ultimo_frame_ts,
     }
\ No newline at end of file
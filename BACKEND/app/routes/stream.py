@@ -6,159 +6,42 @@ frames y el motor ArcFace/InsightFace para identificar rostros en tiempo real.
 
 Flujo:
     1. Se inicia el monitoreo de una cámara registrada en BD.
-    2. Cada N segundos se captura un frame del stream RTSP.
+    2. Se adjunta al worker de la cámara en rtsp_manager (un solo
+       decodificador por cámara) con muestreo fijo cada N segundos.
     3. El frame se procesa con el motor de reconocimiento facial.
     4. Si se detecta un intruso, se genera alerta + SMS + WebSocket.
 """
-import asyncio
-import cv2
-import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
-from app.bd import get_db, SessionLocal
+from app.bd import get_db
 from app.core.deps import get_current_admin
 from app.models.administrador import Administrador
 from app.models.camara import Camara
-from app.services import reconocimiento_service
+from app.services.estado_camaras import estados_camara
+from app.services.rtsp_manager import rtsp_manager
 
 router = APIRouter(prefix="/stream", tags=["Stream RTSP"])
 
-# ─── Estado global de tareas activas ────────────────────────────────────────
-# { id_camara: asyncio.Task }
-_tareas_activas: dict[int, asyncio.Task] = {}
+# Origen con el que este router se adjunta al worker de la cámara: la captura
+# y el reconocimiento corren en el motor único de rtsp_manager, compartido
+# con /rtsp, la vista previa y la grabación.
+ORIGEN = "stream"
 
 
-def _actualizar_estado_camara(id_camara: int, activa: bool, estado: str) -> None:
-    db = SessionLocal()
-    try:
-        camara = db.query(Camara).filter(Camara.id_camara == id_camara).first()
-        if camara is not None:
-            camara.activa = activa
-            camara.estado = estado
-            db.commit()
-    finally:
-        db.close()
+def _monitoreando(id_camara: int) -> bool:
+    worker = rtsp_manager.obtener_worker(id_camara)
+    return worker is not None and ORIGEN in worker.origenes
 
 
 def detener_stream_activo(id_camara: int) -> bool:
-    tarea = _tareas_activas.pop(id_camara, None)
-    if tarea is None:
+    """Detiene por completo el pipeline de la cámara (p. ej. al desactivarla)."""
+    if rtsp_manager.obtener_worker(id_camara) is None:
         return False
-    tarea.cancel()
-    _actualizar_estado_camara(id_camara, False, "Apagada")
+    rtsp_manager.detener_camara(id_camara)
     return True
 
 
-# ─── Clase auxiliar para simular UploadFile con bytes de frame ───────────────
-class FrameUpload:
-    """
-    Simula el objeto UploadFile de FastAPI para pasar frames
-    capturados por OpenCV al servicio de reconocimiento.
-    """
-    def __init__(self, contenido: bytes):
-        self.filename = "frame.jpg"
-        self._contenido = contenido
-
-    async def read(self) -> bytes:
-        return self._contenido
-
-
-# ─── Tarea de captura en background ──────────────────────────────────────────
-async def _capturar_camara(
-    id_camara: int,
-    url_stream: str,
-    intervalo: float = 1.0,
-):
-    """
-    Tarea asyncio que captura frames continuamente desde una cámara IP.
-    Se ejecuta en background mientras el monitoreo esté activo.
-
-    Args:
-        id_camara: ID de la cámara en BD (para registrar eventos).
-        url_stream: URL RTSP/HTTP del stream o índice de webcam ("0").
-        intervalo: Segundos entre cada captura de frame.
-    """
-    # Convertir "0" a entero para webcam local
-    fuente = int(url_stream) if url_stream.isdigit() else url_stream
-
-    cap = cv2.VideoCapture(fuente)
-
-    if not cap.isOpened():
-        print(f"[Stream #{id_camara}] ✗ No se pudo abrir: {url_stream}")
-        _actualizar_estado_camara(id_camara, False, "Desconectada")
-        _tareas_activas.pop(id_camara, None)
-        return
-
-    print(f"[Stream #{id_camara}] ✓ Monitoreo iniciado → {url_stream}")
-
-    intentos_fallidos = 0
-    MAX_INTENTOS = 5
-
-    try:
-        while id_camara in _tareas_activas:
-            ret, frame = cap.read()
-
-            if not ret:
-                intentos_fallidos += 1
-                print(
-                    f"[Stream #{id_camara}] Sin frame "
-                    f"({intentos_fallidos}/{MAX_INTENTOS}), reintentando..."
-                )
-
-                if intentos_fallidos >= MAX_INTENTOS:
-                    print(
-                        f"[Stream #{id_camara}] Demasiados fallos, "
-                        f"reconectando stream..."
-                    )
-                    cap.release()
-                    await asyncio.sleep(5)
-                    cap = cv2.VideoCapture(fuente)
-                    intentos_fallidos = 0
-
-                await asyncio.sleep(intervalo)
-                continue
-
-            intentos_fallidos = 0
-
-            # Convertir frame BGR → bytes JPEG
-            _, buffer = cv2.imencode(
-                ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85]
-            )
-            imagen_bytes = buffer.tobytes()
-
-            # Procesar con el motor de reconocimiento en una sesión nueva
-            db: Session = SessionLocal()
-            try:
-                resultado = await reconocimiento_service.identificar_rostro(
-                    db,
-                    FrameUpload(imagen_bytes),
-                    id_camara=id_camara,
-                )
-                estado = "✓ Autorizado" if resultado.tipo_acceso == "Autorizado" else "⚠ INTRUSO"
-                print(
-                    f"[Stream #{id_camara}] {estado} | "
-                    f"similitud={resultado.similitud:.3f} | "
-                    f"evento=#{resultado.id_evento}"
-                )
-            except ValueError:
-                # No se detectó rostro en el frame — es normal, no es error
-                pass
-            except Exception as e:
-                print(f"[Stream #{id_camara}] Error procesando frame: {e}")
-            finally:
-                db.close()
-
-            await asyncio.sleep(intervalo)
-
-    except asyncio.CancelledError:
-        print(f"[Stream #{id_camara}] Tarea cancelada correctamente.")
-    finally:
-        cap.release()
-        _tareas_activas.pop(id_camara, None)
-        print(f"[Stream #{id_camara}] Stream cerrado y recursos liberados.")
-
-
 # ─── Endpoints ────────────────────────────────────────────────────────────────
 
 @router.post(
@@ -190,7 +73,7 @@ async def iniciar_stream(
             detail="Cámara no encontrada o inactiva"
         )
 
-    if id_camara in _tareas_activas:
+    if _monitoreando(id_camara):
         raise HTTPException(
             status_code=409,
             detail="Esta cámara ya está siendo monitoreada"
@@ -207,26 +90,22 @@ async def iniciar_stream(
 
     url_stream = camara.direccion_ip
 
-    # Validar antes de crear la tarea para no dejar la cámara como "activa"
-    # cuando realmente no hay conexión de video.
-    fuente = int(url_stream) if url_stream.isdigit() else url_stream
-    probe = cv2.VideoCapture(fuente)
-    if not probe.isOpened():
-        probe.release()
-        _actualizar_estado_camara(id_camara, False, "Desconectada")
+    # Validar antes de adjuntar el worker para no dejar la cámara como "activa"
+    # cuando realmente no hay conexión de video. El sondeo corre fuera del
+    # event loop y se recuerda unos segundos (clics repetidos no re-marcan).
+    if not await rtsp_manager.sondear_camara(id_camara, url_stream):
+        estados_camara.registrar(id_camara, False, "Desconectada")
         raise HTTPException(
             status_code=422,
             detail="No se pudo abrir el stream de la cámara. Verifica la conexión o la URL.",
         )
-    probe.release()
 
-    _actualizar_estado_camara(id_camara, True, "Activa")
+    estados_camara.registrar(id_camara, True, "Activa")
 
-    # Crear tarea asyncio en background
-    tarea = asyncio.create_task(
-        _capturar_camara(id_camara, url_stream, intervalo)
+    # Reutiliza el decodificador si la cámara ya tiene un worker activo
+    await rtsp_manager.iniciar_camara(
+        id_camara, url_stream, origen=ORIGEN, intervalo_seg=intervalo
     )
-    _tareas_activas[id_camara] = tarea
 
     return {
         "message": f"Monitoreo iniciado para cámara '{camara.nombre}' (#{id_camara})",
@@ -244,14 +123,17 @@ async def detener_stream(
     id_camara: int,
     _admin: Administrador = Depends(get_current_admin),
 ):
-    """Cancela la tarea de captura y libera los recursos de la cámara."""
-    if id_camara not in _tareas_activas:
+    """
+    Retira el monitoreo de la cámara. El worker se detiene si ningún otro
+    origen o consumidor (vista previa, grabación, /rtsp) lo está usando.
+    """
+    if not _monitoreando(id_camara):
         raise HTTPException(
             status_code=404,
             detail="Esta cámara no está siendo monitoreada actualmente"
         )
 
-    detener_stream_activo(id_camara)
+    rtsp_manager.soltar_origen(id_camara, ORIGEN)
 
     return {
         "message": f"Monitoreo detenido para cámara #{id_camara}",
@@ -267,9 +149,12 @@ async def listar_activas(
     _admin: Administrador = Depends(get_current_admin),
 ):
     """Retorna los IDs de las cámaras actualmente siendo monitoreadas."""
+    activas = [
+        c["id_camara"] for c in rtsp_manager.estado() if ORIGEN in c["origenes"]
+    ]
     return {
-        "camaras_activas": list(_tareas_activas.keys()),
-        "total": len(_tareas_activas),
+        "camaras_activas": activas,
+        "total": len(activas),
     }
 
 
@@ -282,7 +167,7 @@ async def estado_stream(
     _admin: Administrador = Depends(get_current_admin),
 ):
     """Verifica si una cámara específica está siendo monitoreada."""
-    activa = id_camara in _tareas_activas
+    activa = _monitoreando(id_camara)
     return {
         "id_camara": id_camara,
         "monitoreando": activa,
@@ -6,7 +6,7 @@ El esquema de salida consolida información del evento original para facilitar
 la interpretación del administrador.
 """
 
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import Literal, Optional
 from pydantic import BaseModel, Field
 
@@ -28,6 +28,8 @@ class DatosAlerta(BaseModel):
     tipo_acceso: Optional[str] = Field(None, description="'Autorizado' o 'No Autorizado'")
     id_camara: Optional[int] = None
     similitud: Optional[float] = Field(None, description="Confianza del reconocimiento facial")
+    avistamientos: int = Field(1, description="Avistamientos del intruso fusionados en el evento")
+    ultimo_avistamiento: Optional[datetime] = None
     
     # Estampas de tiempo del suceso
     fecha: Optional[date] = None
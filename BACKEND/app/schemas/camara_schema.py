@@ -6,8 +6,38 @@ Asegura que cada cámara esté correctamente vinculada a un cubículo
 y posea una identificación de red válida.
 """
 
-from pydantic import BaseModel, Field, IPvAnyAddress
-from typing import Optional
+from pydantic import BaseModel, Field, IPvAnyAddress, model_validator
+from typing import List, Optional
+
+# ─── Perfil de detección ──────────────────────────────────────────────────────
+
+class RegionInteres(BaseModel):
+    """
+    Zona del encuadre donde se buscan rostros, en coordenadas normalizadas (0-1).
+    Se indica un rectángulo o un polígono (no ambos).
+    """
+    rect: Optional[List[float]] = Field(None, example=[0.25, 0.0, 0.75, 1.0])
+    poligono: Optional[List[List[float]]] = Field(
+        None, example=[[0.3, 0.0], [0.7, 0.0], [0.8, 1.0], [0.2, 1.0]]
+    )
+
+    @model_validator(mode="after")
+    def _validar_forma(self):
+        if (self.rect is None) == (self.poligono is None):
+            raise ValueError("Indica 'rect' o 'poligono' (exactamente uno)")
+        if self.rect is not None:
+            if len(self.rect) != 4:
+                raise ValueError("'rect' debe ser [x1, y1, x2, y2]")
+            x1, y1, x2, y2 = self.rect
+            if not (0 <= x1 < x2 <= 1 and 0 <= y1 < y2 <= 1):
+                raise ValueError("'rect' debe cumplir 0 <= x1 < x2 <= 1 y 0 <= y1 < y2 <= 1")
+        if self.poligono is not None:
+            if len(self.poligono) < 3 or any(len(p) != 2 for p in self.poligono):
+                raise ValueError("'poligono' requiere al menos 3 puntos [x, y]")
+            if any(not (0 <= c <= 1) for p in self.poligono for c in p):
+                raise ValueError("Las coordenadas del polígono deben estar entre 0 y 1")
+        return self
+
 
 # ─── Esquemas de camara ───────────────────────────────────────────────────────
 
@@ -20,6 +50,13 @@ class CrearCamara(BaseModel):
     # ID del cubículo al que pertenece (debe existir en la DB)
     id_cubiculo: int
     estado: Optional[str] = "Activa"
+    # Perfil de detección opcional
+    roi: Optional[RegionInteres] = None
+    det_size: Optional[int] = Field(None, ge=128, le=1280, multiple_of=32)
+    min_rostro_px: Optional[int] = Field(None, ge=0)
+    max_rostros: Optional[int] = Field(None, ge=1)
+    sensibilidad_movimiento: Optional[float] = Field(None, ge=0, le=1)
+    fps_decodificacion: Optional[float] = Field(None, ge=0, le=60)
 
 class UpdCamara(BaseModel):
     """
@@ -33,6 +70,12 @@ class UpdCamara(BaseModel):
     # Permite habilitar o deshabilitar el procesamiento de IA
     activa: Optional[bool] = None
     estado: Optional[str] = None
+    roi: Optional[RegionInteres] = None
+    det_size: Optional[int] = Field(None, ge=128, le=1280, multiple_of=32)
+    min_rostro_px: Optional[int] = Field(None, ge=0)
+    max_rostros: Optional[int] = Field(None, ge=1)
+    sensibilidad_movimiento: Optional[float] = Field(None, ge=0, le=1)
+    fps_decodificacion: Optional[float] = Field(None, ge=0, le=60)
 
 class DatosCamara(BaseModel):
     """
@@ -46,6 +89,12 @@ class DatosCamara(BaseModel):
     id_cubiculo: int
     activa: bool
     estado: Optional[str]
+    roi: Optional[RegionInteres] = None
+    det_size: Optional[int] = None
+    min_rostro_px: Optional[int] = None
+    max_rostros: Optional[int] = None
+    sensibilidad_movimiento: Optional[float] = None
+    fps_decodificacion: Optional[float] = None
 
     class Config:
         # Habilita la compatibilidad con modelos de SQLAlchemy
@@ -7,7 +7,7 @@ trazabilidad de los eventos de seguridad detectados por las cámaras.
 """
 
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, date, time
 
 # ─── Persona autorizada ──────────────────────────────────────────
@@ -63,6 +63,56 @@ class ResultadoReconocimiento(BaseModel):
     apellidos: Optional[str] = None
     # ID del evento generado para su posterior consulta o alerta
     id_evento: int
+    # Veces que se ha visto al intruso en el mismo evento (de-duplicación)
+    avistamientos: int = 1
+    # Identidad estable del intruso entre eventos (re-identificación)
+    id_intruso: Optional[int] = None
+
+
+class RostroIdentificado(ResultadoReconocimiento):
+    """Resultado de un rostro dentro de un frame con varias personas."""
+    # Caja del rostro en coordenadas del frame: [x1, y1, x2, y2]
+    bbox: List[float]
+    # Confianza del detector para este rostro
+    det_score: float
+    # Pista del rastreador de la cámara (None sin seguimiento)
+    id_pista: Optional[int] = None
+    # False si la identidad se tomó de la caché de la pista (sin evento nuevo)
+    reconocido: bool = True
+
+
+class HistorialIntruso(BaseModel):
+    """Avistamientos previos de un intruso recurrente."""
+    id_intruso: int
+    # Similitud con el histórico (solo en búsquedas por imagen)
+    similitud: Optional[float] = None
+    total_avistamientos: int
+    # Avistamientos en los últimos 7 días
+    avistamientos_semana: int
+    camaras: List[int]
+    primer_avistamiento: Optional[datetime] = None
+    ultimo_avistamiento: Optional[datetime] = None
+
+
+class ResultadoFrame(BaseModel):
+    """Resultado del modo multi-rostro: un elemento por rostro detectado."""
+    total_rostros: int
+    rostros: List[RostroIdentificado]
+
+
+class ResultadoFrameLote(ResultadoFrame):
+    """Resultado de un frame dentro de /identificar/lote, en el orden de envío."""
+    indice: int
+    id_camara: Optional[int] = None
+    ts: Optional[float] = None
+    # Motivo si el frame no se pudo procesar (p. ej. imagen inválida)
+    error: Optional[str] = None
+
+
+class ResultadoLote(BaseModel):
+    total_frames: int
+    total_rostros: int
+    frames: List[ResultadoFrameLote]
 
 
 # ─── Bitacora de eventos ──────────────────────────────────────────────────────
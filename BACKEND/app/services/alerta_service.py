@@ -30,6 +30,8 @@ def _a_alerta_detalle(alerta: Alerta, evento: EventoAcceso | None) -> dict:
         "tipo_acceso": evento.tipo_acceso if evento else None,
         "id_camara": evento.id_camara if evento else None,
         "similitud": evento.similitud if evento else None,
+        "avistamientos": (evento.avistamientos or 1) if evento else 1,
+        "ultimo_avistamiento": evento.ultimo_avistamiento if evento else None,
         "fecha": alerta.fecha,
         "hora": alerta.hora,
     }
@@ -0,0 +1,122 @@
+"""
+Fase de Arranque del Motor - V-ESCOM
+====================================
+Prepara todo lo costoso antes de declarar la API lista, para que ni la
+primera petición a /reconocimiento/identificar ni el primer frame de una
+cámara auto-arrancada paguen la carga de modelos:
+
+    1. Pool de inferencia: cada proceso carga los modelos desde
+       FACE_MODELOS_DIR (sin descargar) y ejecuta inferencias de prueba en
+       cada tamaño de detector configurado (global + perfiles de cámara).
+    2. Galería de embeddings en memoria.
+    3. Pool de conexiones de la BD pre-llenado.
+
+La fase corre como tarea en segundo plano (iniciar_en_segundo_plano):
+uvicorn no acepta conexiones hasta que terminan los startup handlers, así
+que esperarla ahí haría imposible observar el 503 de GET /listo mientras
+se carga. El auto-arranque de cámaras espera a la tarea (esperar_listo) y
+no arranca nada si la fase falló.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+
+log = logging.getLogger("arranque")
+
+estado_arranque: dict = {
+    "listo": False,
+    "error": None,
+    "tiempos_ms": {},
+    "procesos_inferencia": [],
+}
+
+# Referencia a la tarea de arranque (evita que el recolector la descarte)
+_tarea: Optional[asyncio.Task] = None
+
+
+def _tamanos_det_camaras() -> List[int]:
+    """Tamaños de detector usados por los perfiles de cámara."""
+    from app.bd import SessionLocal
+
+    db = SessionLocal()
+    try:
+        filas = db.execute(
+            text("SELECT DISTINCT det_size FROM camaras WHERE det_size IS NOT NULL")
+        ).all()
+        return [int(f[0]) for f in filas]
+    finally:
+        db.close()
+
+
+def _prellenar_pool_bd() -> int:
+    """Abre tantas conexiones como el tamaño del pool y las devuelve a él."""
+    from app.bd import engine
+
+    tamano = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    conexiones = []
+    try:
+        for _ in range(tamano):
+            conexion = engine.connect()
+            conexion.execute(text("SELECT 1"))
+            conexiones.append(conexion)
+    finally:
+        for conexion in conexiones:
+            conexion.close()
+    return len(conexiones)
+
+
+async def preparar() -> None:
+    """Ejecuta la fase de arranque completa y marca la API como lista."""
+    from app.services.galeria_service import galeria
+    from app.services.inferencia_service import inferencia_pool
+
+    loop = asyncio.get_event_loop()
+    tiempos = estado_arranque["tiempos_ms"]
+    inicio_total = time.perf_counter()
+
+    try:
+        inicio = time.perf_counter()
+        conexiones = await loop.run_in_executor(None, _prellenar_pool_bd)
+        tiempos["pool_bd"] = round((time.perf_counter() - inicio) * 1000.0, 1)
+        log.info(f"Pool de BD pre-llenado con {conexiones} conexiones ({tiempos['pool_bd']} ms)")
+
+        tamanos = await loop.run_in_executor(None, _tamanos_det_camaras)
+        inicio = time.perf_counter()
+        inferencia_pool.iniciar(tamanos_det=tamanos)
+        procesos = await inferencia_pool.precalentar()
+        tiempos["inferencia"] = round((time.perf_counter() - inicio) * 1000.0, 1)
+        estado_arranque["procesos_inferencia"] = procesos
+        for reporte in procesos:
+            log.info(f"Proceso de inferencia pid={reporte['pid']} calentado: {reporte['tiempos_ms']}")
+
+        inicio = time.perf_counter()
+        await loop.run_in_executor(None, galeria.iniciar)
+        tiempos["galeria"] = round((time.perf_counter() - inicio) * 1000.0, 1)
+
+        tiempos["total"] = round((time.perf_counter() - inicio_total) * 1000.0, 1)
+        estado_arranque["listo"] = True
+        log.info(f"API lista. Tiempos de arranque (ms): {tiempos}")
+    except Exception as e:
+        # La API sigue respondiendo, pero /listo reporta el fallo
+        estado_arranque["error"] = str(e)
+        log.error(f"Fallo en la fase de arranque: {e}")
+
+
+def iniciar_en_segundo_plano() -> asyncio.Task:
+    """Lanza preparar() sin bloquear el arranque de uvicorn (idempotente)."""
+    global _tarea
+    if _tarea is None:
+        _tarea = asyncio.get_running_loop().create_task(preparar())
+    return _tarea
+
+
+async def esperar_listo() -> bool:
+    """Espera a que termine la fase de arranque. True si la API quedó lista."""
+    if _tarea is not None:
+        await asyncio.shield(_tarea)
+    return bool(estado_arranque["listo"])
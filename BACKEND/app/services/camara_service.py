@@ -9,6 +9,9 @@ Campos clave:
     - ubicacion: Descripcion fisica de donde esta instalada.
     - id_cubiculo: Referencia al cubiculo asignado (FK).
     - estado: Estado operativo (activa/inactiva).
+    - roi / det_size / min_rostro_px / max_rostros: Perfil de detección por cámara.
+    - sensibilidad_movimiento: Sensibilidad del detector de movimiento (0 = siempre analizar).
+    - fps_decodificacion: Frames por segundo que el hilo de captura decodifica (0 = todos).
     
 Gestion de camaras:
     - Crear: Permite registrar una nueva camara con validación de campos.
@@ -31,6 +34,40 @@ def _normalizar_direccion_ip(direccion_ip):
         return None
     return str(direccion_ip)
 
+
+def _normalizar_roi(roi):
+    # Se guarda solo la forma indicada (rect o poligono) en el JSONB
+    if roi is None:
+        return None
+    if not isinstance(roi, dict):
+        roi = roi.model_dump()
+    return {k: v for k, v in roi.items() if v is not None} or None
+
+
+def perfil_deteccion(camara: Camara) -> dict | None:
+    """Perfil de detección de la cámara en el formato de face_utils.detectar_y_alinear."""
+    perfil = {
+        "roi": camara.roi,
+        "det_size": camara.det_size,
+        "min_rostro_px": camara.min_rostro_px,
+        "max_rostros": camara.max_rostros,
+    }
+    perfil = {k: v for k, v in perfil.items() if v}
+    # 0 es un valor válido (desactiva el detector de movimiento)
+    if camara.sensibilidad_movimiento is not None:
+        perfil["sensibilidad_movimiento"] = camara.sensibilidad_movimiento
+    # 0 también es válido (decodificar todos los frames)
+    if camara.fps_decodificacion is not None:
+        perfil["fps_decodificacion"] = camara.fps_decodificacion
+    return perfil or None
+
+
+def obtener_perfil_deteccion(db: Session, id_camara: int | None) -> dict | None:
+    if id_camara is None:
+        return None
+    camara = db.query(Camara).filter(Camara.id_camara == id_camara).first()
+    return perfil_deteccion(camara) if camara is not None else None
+
 # ─── CRUD Camaras ────────────────────────────────────────────────────────────────
 def crear_camara(db: Session, camara_data):
     # crear camara con datos proporcionados
@@ -41,6 +78,12 @@ def crear_camara(db: Session, camara_data):
         id_cubiculo=camara_data.id_cubiculo,
         activa=False,
         estado=camara_data.estado or "Apagada",
+        roi=_normalizar_roi(camara_data.roi),
+        det_size=camara_data.det_size,
+        min_rostro_px=camara_data.min_rostro_px,
+        max_rostros=camara_data.max_rostros,
+        sensibilidad_movimiento=camara_data.sensibilidad_movimiento,
+        fps_decodificacion=camara_data.fps_decodificacion,
     )
 
     db.add(nueva_camara)
@@ -71,6 +114,8 @@ def actualizar_camara(db: Session, id_camara: int, datos):
     update_data = datos.model_dump(exclude_unset=True)
     if "direccion_ip" in update_data:
         update_data["direccion_ip"] = _normalizar_direccion_ip(update_data["direccion_ip"])
+    if "roi" in update_data:
+        update_data["roi"] = _normalizar_roi(update_data["roi"])
 
     for key, value in update_data.items():
         setattr(camara, key, value)
@@ -0,0 +1,306 @@
+"""
+Captura RTSP en un proceso por cámara - V-ESCOM
+===============================================
+Modo opcional (RTSP_CAPTURA_PROCESOS=true) del CameraWorker: el decodificador
+de cada cámara corre en su propio proceso, fuera del GIL de la API, y un
+VideoCapture colgado no puede bloquear el servidor.
+
+    proceso de captura                      proceso de la API
+    ──────────────────                      ─────────────────
+    grab() / retrieve() según fps           ProcesoCaptura.siguiente()
+    AnilloFrames.escribir(frame)  ──seq──▶  vista de solo lectura (LecturaAnillo)
+                                  ─────────▶ ("anillo", nombre, forma)
+                                  ─────────▶ ("estado", activa, estado)
+
+La tubería solo transporta mensajes de control y números de secuencia; los
+pixeles viajan por el anillo en memoria compartida (ver app.utils.anillo_frames).
+Los fps a entregar (retrieve: conversión a BGR; grab() decodifica todos los
+paquetes igual) se comparten en un RawValue que la API ajusta en
+caliente (presupuesto de la cámara y espectadores de la vista previa).
+
+El proceso reintenta la conexión sin límite, con espera exponencial y
+jitter (app.utils.backoff). Si muere (excepción nativa, OOM, kill) o el
+watchdog del supervisor pide reiniciarlo (reiniciar()), se relanza.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection
+from typing import Callable, Optional
+
+from app.utils.anillo_frames import AnilloFrames, LecturaAnillo
+from app.utils.backoff import BackoffExponencial
+
+log = logging.getLogger("captura_proceso")
+
+RANURAS = int(os.getenv("RTSP_ANILLO_RANURAS", "8"))
+# Plazos de FFmpeg: sin ellos, una cámara inalcanzable deja open()/read()
+# colgados hasta el timeout TCP del sistema (decenas de segundos)
+TIMEOUT_APERTURA_MS = int(os.getenv("RTSP_TIMEOUT_APERTURA_MS", "5000"))
+TIMEOUT_LECTURA_MS  = int(os.getenv("RTSP_TIMEOUT_LECTURA_MS", "5000"))
+
+# Opciones de FFmpeg para todas las capturas RTSP (TCP en lugar de UDP para
+# estabilidad en WiFi). Es una variable de entorno global que OpenCV lee en
+# cada apertura: se fija una sola vez al importar este módulo, que también
+# importan los procesos de captura. Un valor ya presente en el entorno manda.
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
+
+
+def abrir_captura(
+    fuente: str,
+    timeout_apertura_ms: int = TIMEOUT_APERTURA_MS,
+    timeout_lectura_ms: int = TIMEOUT_LECTURA_MS,
+):
+    """
+    VideoCapture para una URL RTSP/HTTP (backend FFmpeg con buffer mínimo y
+    plazos de apertura/lectura) o para el índice de una webcam local ("0").
+    Bloquea hasta timeout_apertura_ms: no llamar desde el event loop.
+    """
+    import cv2
+
+    if fuente.isdigit():
+        return cv2.VideoCapture(int(fuente))
+    parametros = []
+    # Las propiedades existen desde OpenCV 4.5.2; en versiones previas se
+    # abre sin plazos
+    if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+        parametros += [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_apertura_ms]
+    if hasattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC"):
+        parametros += [cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_lectura_ms]
+    if parametros:
+        cap = cv2.VideoCapture(fuente, cv2.CAP_FFMPEG, parametros)  # type: ignore
+    else:
+        cap = cv2.VideoCapture(fuente, cv2.CAP_FFMPEG)  # type: ignore
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # type: ignore
+    return cap
+
+
+def probar_captura(fuente: str) -> bool:
+    """Abre la fuente y lee un frame. Bloqueante (ver abrir_captura)."""
+    cap = abrir_captura(fuente)
+    try:
+        return bool(cap.isOpened() and cap.grab())
+    finally:
+        cap.release()
+
+
+# ─── Proceso hijo ─────────────────────────────────────────────────────────────
+def proceso_captura(
+    id_camara: int,
+    rtsp_url: str,
+    fps_decodificacion,  # multiprocessing.RawValue("d")
+    leidos,              # multiprocessing.RawValue("q")
+    ranuras: int,
+    conexion: Connection,
+    espera_base: float,
+    espera_max: float,
+) -> None:
+    """Punto de entrada del proceso de captura de una cámara."""
+    anillo: Optional[AnilloFrames] = None
+    generacion = 0
+    backoff = BackoffExponencial(espera_base, espera_max)
+    try:
+        while True:
+            cap = abrir_captura(rtsp_url)
+            if not cap.isOpened():
+                cap.release()
+                conexion.send(("estado", False, "Desconectada"))
+                time.sleep(backoff.siguiente())
+                continue
+
+            conexion.send(("estado", True, "Activa"))
+            ultimo = 0.0
+            while True:
+                if not cap.grab():
+                    break
+                leidos.value += 1
+                backoff.reiniciar()
+                ahora = time.monotonic()
+                fps = fps_decodificacion.value
+                if fps > 0 and ahora - ultimo < 1.0 / fps:
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                ultimo = ahora
+
+                if anillo is None or anillo.forma != frame.shape:
+                    # Primer frame o cambio de resolución: anillo nuevo
+                    if anillo is not None:
+                        anillo.cerrar()
+                    generacion += 1
+                    anillo = AnilloFrames.crear(
+                        f"vescom_cam{id_camara}_{os.getpid()}_{generacion}", ranuras, frame.shape
+                    )
+                    conexion.send(("anillo", anillo.nombre, frame.shape))
+                conexion.send(("frame", anillo.escribir(frame, ahora)))
+
+            cap.release()
+            conexion.send(("estado", False, "Desconectada"))
+            time.sleep(backoff.siguiente())
+    except (BrokenPipeError, EOFError, KeyboardInterrupt):
+        # La API cerró la tubería: no hay a quién entregar frames
+        pass
+    finally:
+        if anillo is not None:
+            anillo.cerrar()
+        conexion.close()
+
+
+# ─── Lado de la API ───────────────────────────────────────────────────────────
+class ProcesoCaptura:
+    """
+    Lanza y vigila el proceso de captura de una cámara y entrega sus frames
+    copiados del anillo compartido. Se usa desde un solo hilo.
+    """
+
+    def __init__(
+        self,
+        id_camara: int,
+        rtsp_url: str,
+        espera_base: float,
+        espera_max: float,
+        al_cambiar_estado: Optional[Callable[[bool, str], None]] = None,
+        ranuras: int = RANURAS,
+    ) -> None:
+        self.id_camara = id_camara
+        self.rtsp_url = rtsp_url
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+        self._backoff = BackoffExponencial(espera_base, espera_max)
+        self.al_cambiar_estado = al_cambiar_estado
+        # Stream abierto en el hijo, según sus mensajes de estado
+        self.conectado = False
+        self.ranuras = ranuras
+        self._ctx = multiprocessing.get_context("spawn")
+        self._fps = self._ctx.RawValue("d", 0.0)
+        self._leidos = self._ctx.RawValue("q", 0)
+        self._proceso: Optional[multiprocessing.process.BaseProcess] = None
+        self._conexion: Optional[Connection] = None
+        self._anillo: Optional[AnilloFrames] = None
+        self.reinicios = 0
+        self.saltados = 0
+
+    # ── Ciclo de vida ─────────────────────────────────────────────────────────
+    def iniciar(self) -> None:
+        lectura, escritura = self._ctx.Pipe(duplex=False)
+        self._proceso = self._ctx.Process(
+            target=proceso_captura,
+            args=(
+                self.id_camara, self.rtsp_url, self._fps, self._leidos, self.ranuras,
+                escritura, self.espera_base, self.espera_max,
+            ),
+            name=f"captura-cam-{self.id_camara}",
+            daemon=True,
+        )
+        self._proceso.start()
+        # El extremo de escritura vive solo en el hijo: si muere, recv() da EOF
+        escritura.close()
+        self._conexion = lectura
+        log.info(f"[Cam#{self.id_camara}] Proceso de captura iniciado (pid={self._proceso.pid})")
+
+    def detener(self) -> None:
+        self.conectado = False
+        if self._proceso is not None and self._proceso.is_alive():
+            self._proceso.terminate()
+            self._proceso.join(2)
+            if self._proceso.is_alive():
+                self._proceso.kill()
+                self._proceso.join(1)
+        self._liberar()
+
+    def _liberar(self) -> None:
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+        if self._anillo is not None:
+            self._anillo.destruir()
+            self._anillo = None
+
+    def _reiniciar(self, exitcode: Optional[int]) -> None:
+        self.reinicios += 1
+        espera = self._backoff.siguiente()
+        log.warning(
+            f"[Cam#{self.id_camara}] Proceso de captura terminó (código {exitcode}); "
+            f"relanzando en {espera:.1f}s (reinicio #{self.reinicios})"
+        )
+        self.conectado = False
+        self._liberar()
+        time.sleep(espera)
+        self.iniciar()
+
+    def reiniciar(self) -> None:
+        """Mata y relanza el proceso (p. ej. un read() colgado en FFmpeg)."""
+        self.reinicios += 1
+        log.warning(f"[Cam#{self.id_camara}] Reiniciando proceso de captura (reinicio #{self.reinicios})")
+        self.detener()
+        self.iniciar()
+
+    # ── Consumo ───────────────────────────────────────────────────────────────
+    def solicitar_fps(self, fps: float) -> None:
+        """Frames por segundo a decodificar (0 = todos); se aplica en caliente."""
+        self._fps.value = fps
+
+    @property
+    def leidos(self) -> int:
+        return int(self._leidos.value)
+
+    def _atender(self, mensaje: tuple) -> Optional[int]:
+        tipo = mensaje[0]
+        if tipo == "frame":
+            self._backoff.reiniciar()
+            return mensaje[1]
+        if tipo == "anillo":
+            _, nombre, forma = mensaje
+            if self._anillo is not None:
+                self._anillo.destruir()
+            self._anillo = AnilloFrames.conectar(nombre, self.ranuras, forma)
+        elif tipo == "estado":
+            self.conectado = mensaje[1]
+            if self.al_cambiar_estado is not None:
+                self.al_cambiar_estado(mensaje[1], mensaje[2])
+        return None
+
+    def siguiente(self, timeout: float) -> Optional[LecturaAnillo]:
+        """
+        Espera el próximo frame y retorna su vista en el anillo (sin copia;
+        ts monotónico). Si se acumularon varios, entrega el más reciente.
+        None si no llegó ninguno en timeout o si el anillo ya lo sobrescribió
+        (cuenta como saltado).
+        """
+        assert self._conexion is not None and self._proceso is not None
+        ultimo: Optional[int] = None
+        try:
+            if not self._conexion.poll(timeout):
+                return None
+            while self._conexion.poll(0):
+                seq = self._atender(self._conexion.recv())
+                if seq is not None:
+                    if ultimo is not None:
+                        self.saltados += 1
+                    ultimo = seq
+        except (EOFError, OSError):
+            self._proceso.join(1)
+            self._reiniciar(self._proceso.exitcode)
+            return None
+
+        if ultimo is None or self._anillo is None:
+            return None
+        lectura = self._anillo.vista(ultimo)
+        if lectura is None:
+            self.saltados += 1
+        return lectura
+
+    def estado(self) -> dict:
+        return {
+            "pid":       self._proceso.pid if self._proceso is not None else None,
+            "vivo":      self._proceso is not None and self._proceso.is_alive(),
+            "conectado": self.conectado,
+            "reinicios": self.reinicios,
+            "leidos":    self.leidos,
+            "saltados":  self.saltados,
+            "anillo":    self._anillo.nombre if self._anillo is not None else None,
+        }
@@ -0,0 +1,117 @@
+"""
+Consumidores del pipeline de cámara - V-ESCOM
+=============================================
+Cada cámara tiene un solo decodificador (CameraWorker en rtsp_manager); las
+funciones que usan sus frames se enchufan como consumidores:
+
+    vista previa   MJPEG / snapshot (app.services.vista_previa)
+    grabación      archivo de video en disco (GrabadorVideo)
+    reconocimiento etapa propia del worker (movimiento → calidad → análisis)
+
+El hilo de captura pregunta a cada consumidor si quiere el frame actual
+(requiere_frame) antes de decodificarlo, y se lo entrega con procesar().
+procesar() corre en el hilo de captura y debe terminar rápido. El frame es
+el mismo objeto para todos los consumidores y no se debe modificar; en modo
+proceso es una vista de solo lectura del anillo compartido, válida solo
+durante procesar(). Un consumidor que guarde el frame para después declara
+retiene = True y recibe en su lugar una copia validada (seqlock).
+"""
+from __future__ import annotations
+
+import logging
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import cv2
+import numpy as np
+
+log = logging.getLogger("consumidores_camara")
+
+GRABACION_FPS        = float(os.getenv("GRABACION_FPS", "10"))
+DIRECTORIO_GRABACION = os.getenv("DIRECTORIO_GRABACIONES", "grabaciones")
+
+
+class ConsumidorFrames(ABC):
+    """Etapa enchufable del pipeline de una cámara. Las subclases implementan procesar()."""
+
+    nombre = "consumidor"
+    # True si el consumidor conserva el frame después de procesar()
+    retiene = False
+
+    def fps_requerido(self) -> float:
+        """Frames por segundo que necesita (0 = ninguno por ahora)."""
+        return 0.0
+
+    def requiere_frame(self, ahora: float) -> bool:
+        return False
+
+    @abstractmethod
+    def procesar(self, frame: np.ndarray, ahora: float) -> None:
+        """Recibe el frame BGR; corre en el hilo de captura."""
+
+    def cerrar(self) -> None:
+        pass
+
+    def estado(self) -> dict:
+        return {}
+
+
+class GrabadorVideo(ConsumidorFrames):
+    """Graba los frames de la cámara a GRABACION_FPS en un archivo MP4 (mp4v)."""
+
+    nombre = "grabacion"
+
+    def __init__(self, id_camara: int, fps: float = GRABACION_FPS,
+                 directorio: str = DIRECTORIO_GRABACION) -> None:
+        self.id_camara = id_camara
+        self.fps = max(fps, 0.1)
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.ruta = os.path.join(directorio, f"camara{id_camara}_{marca}.mp4")
+        self._escritor: Optional[cv2.VideoWriter] = None
+        # cerrar() llega desde el event loop mientras el hilo de captura escribe
+        self._lock = threading.Lock()
+        self._cerrado = False
+        self._ultimo = 0.0
+        self.inicio = time.time()
+        self.frames = 0
+
+    def fps_requerido(self) -> float:
+        return self.fps
+
+    def requiere_frame(self, ahora: float) -> bool:
+        return ahora - self._ultimo >= 1.0 / self.fps
+
+    def procesar(self, frame: np.ndarray, ahora: float) -> None:
+        with self._lock:
+            if self._cerrado:
+                return
+            if self._escritor is None:
+                os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+                alto, ancho = frame.shape[:2]
+                self._escritor = cv2.VideoWriter(
+                    self.ruta, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (ancho, alto)
+                )
+                log.info(f"[Cam#{self.id_camara}] Grabando en {self.ruta}")
+            self._escritor.write(frame)
+            self._ultimo = ahora
+            self.frames += 1
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._cerrado = True
+            if self._escritor is not None:
+                self._escritor.release()
+                self._escritor = None
+                log.info(f"[Cam#{self.id_camara}] Grabación cerrada: {self.ruta} ({self.frames} frames)")
+
+    def estado(self) -> dict:
+        return {
+            "ruta":     self.ruta,
+            "fps":      self.fps,
+            "frames":   self.frames,
+            "segundos": round(time.time() - self.inicio, 1),
+        }
@@ -0,0 +1,69 @@
+"""
+Escritura por lotes de camaras.activa / camaras.estado - V-ESCOM
+================================================================
+Los hilos de captura reportan cambios de estado (Activa, Desconectada,
+Apagada) en cada reconexión; abrir una sesión por cambio satura el pool de
+conexiones durante una tormenta de reconexiones. Aquí los cambios solo se
+anotan (el último por cámara gana) y el supervisor de rtsp_manager los
+vuelca cada segundo en una sola transacción.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Dict, Tuple
+
+log = logging.getLogger("estado_camaras")
+
+
+class EstadosCamara:
+    """Cambios de estado pendientes de escribir, coalescidos por cámara."""
+
+    def __init__(self) -> None:
+        self._pendientes: Dict[int, Tuple[bool, str]] = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, id_camara: int, activa: bool, estado: str) -> None:
+        """Anota el estado actual de la cámara. Seguro desde cualquier hilo."""
+        with self._lock:
+            self._pendientes[id_camara] = (activa, estado)
+
+    @property
+    def pendientes(self) -> int:
+        return len(self._pendientes)
+
+    def vaciar(self) -> int:
+        """
+        Escribe los cambios pendientes en una transacción y retorna cuántas
+        cámaras se actualizaron. Bloqueante: desde el event loop, llamarlo en
+        un executor. Si la escritura falla, los cambios vuelven a la cola
+        (sin pisar los que llegaron mientras tanto).
+        """
+        from app.bd import SessionLocal
+        from app.models.camara import Camara
+
+        with self._lock:
+            lote, self._pendientes = self._pendientes, {}
+        if not lote:
+            return 0
+
+        db = SessionLocal()
+        try:
+            camaras = db.query(Camara).filter(Camara.id_camara.in_(list(lote))).all()
+            for camara in camaras:
+                # SQLAlchemy no emite UPDATE si el valor no cambió
+                camara.activa, camara.estado = lote[camara.id_camara]
+            db.commit()
+            return len(camaras)
+        except Exception as e:
+            db.rollback()
+            log.warning(f"No se pudo escribir el estado de {len(lote)} cámara(s): {e}")
+            with self._lock:
+                for id_camara, valor in lote.items():
+                    self._pendientes.setdefault(id_camara, valor)
+            return 0
+        finally:
+            db.close()
+
+
+estados_camara = EstadosCamara()
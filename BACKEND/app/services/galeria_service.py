@@ -0,0 +1,317 @@
+"""
+Galería de Embeddings en Memoria - V-ESCOM
+==========================================
+Copia en proceso de todos los embeddings de rostros_autorizados para que la
+identificación no dependa de una ida a la BD por frame:
+
+    - Matriz contigua float32 (N, 512) con los embeddings normalizados L2.
+    - Arreglos paralelos id_rostro / id_persona y un mapa id_persona → nombre.
+    - Búsqueda de M consultas con un solo producto matricial (BLAS).
+
+Sincronización:
+    - Se carga al arrancar la API.
+    - registrar_rostro / eliminar_persona la actualizan de forma incremental.
+    - Los cambios incrementales que ocurren durante una recarga (entre su
+      SELECT y el reemplazo de la matriz) quedan en una bitácora y se
+      reaplican sobre la matriz nueva, de modo que no se pierden.
+    - Cada cambio emite NOTIFY en el canal 'galeria_rostros' dentro de la misma
+      transacción; los demás procesos (otros workers de uvicorn) escuchan con
+      LISTEN y recargan su copia.
+
+La búsqueda pgvector sigue disponible como respaldo (galería no cargada) y
+como verificación de consistencia muestreada (GALERIA_VERIFICACION_MUESTREO).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.utils.face_utils import DIM_EMBEDDING
+
+log = logging.getLogger("galeria")
+
+CANAL_NOTIFICACION       = "galeria_rostros"
+VERIFICACION_MUESTREO    = float(os.getenv("GALERIA_VERIFICACION_MUESTREO", "0.01"))
+GALERIA_HABILITADA       = os.getenv("GALERIA_HABILITADA", "true").lower() == "true"
+
+# Identifica a este proceso para ignorar sus propias notificaciones
+_ORIGEN = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class GaleriaEmbeddings:
+    """Índice en memoria de rostros autorizados. Seguro para uso entre hilos."""
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._matriz      = np.zeros((0, DIM_EMBEDDING), dtype=np.float32)
+        self._ids_rostro  = np.zeros(0, dtype=np.int64)
+        self._ids_persona = np.zeros(0, dtype=np.int64)
+        self._personas: Dict[int, Tuple[str, str]] = {}
+        # Una bitácora por recarga en curso: cambios incrementales a reaplicar
+        self._bitacoras: List[List[Tuple[str, tuple]]] = []
+        self.cargada = False
+        self._recargando = False
+        self._escucha: Optional[threading.Thread] = None
+        self._activo = False
+
+    # ── Carga completa ────────────────────────────────────────────────────────
+    def cargar(self, db: Session) -> int:
+        """Reconstruye la galería desde la BD. Retorna el número de embeddings."""
+        bitacora: List[Tuple[str, tuple]] = []
+        with self._lock:
+            self._bitacoras.append(bitacora)
+        try:
+            return self._cargar(db, bitacora)
+        finally:
+            with self._lock:
+                self._bitacoras.remove(bitacora)
+
+    def _cargar(self, db: Session, bitacora: List[Tuple[str, tuple]]) -> int:
+        filas = db.execute(
+            text(
+                """
+                SELECT r.id_rostro, r.id_persona, r.embedding, p.nombre, p.apellidos
+                FROM rostros_autorizados r
+                JOIN personas_autorizadas p ON p.id_persona = r.id_persona
+                WHERE r.embedding IS NOT NULL
+                ORDER BY r.id_rostro
+                """
+            )
+        ).all()
+
+        matriz = np.zeros((len(filas), DIM_EMBEDDING), dtype=np.float32)
+        ids_rostro = np.zeros(len(filas), dtype=np.int64)
+        ids_persona = np.zeros(len(filas), dtype=np.int64)
+        personas: Dict[int, Tuple[str, str]] = {}
+        for i, (id_rostro, id_persona, embedding, nombre, apellidos) in enumerate(filas):
+            matriz[i] = np.asarray(embedding, dtype=np.float32)
+            ids_rostro[i] = id_rostro
+            ids_persona[i] = id_persona
+            personas[id_persona] = (nombre, apellidos)
+
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        matriz = np.ascontiguousarray(matriz / normas)
+
+        with self._lock:
+            self._matriz, self._ids_rostro, self._ids_persona = matriz, ids_rostro, ids_persona
+            self._personas = personas
+            # Cambios aplicados mientras se leía la BD; el SELECT pudo verlos
+            # o no, por eso cada operación es idempotente
+            for operacion, args in bitacora:
+                getattr(self, operacion)(*args)
+            self.cargada = True
+        log.info(f"Galería cargada: {len(filas)} embeddings de {len(personas)} personas.")
+        return len(filas)
+
+    def recargar(self) -> None:
+        from app.bd import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self.cargar(db)
+        except Exception as e:
+            # Sin una copia confiable se vuelve a pgvector hasta la próxima recarga
+            with self._lock:
+                self.cargada = False
+            log.error(f"No se pudo recargar la galería, se usará pgvector: {e}")
+        finally:
+            db.close()
+
+    def recargar_en_segundo_plano(self) -> bool:
+        """
+        Lanza recargar() en un hilo si no hay otra recarga en curso.
+        Retorna False si ya había una (la petición se descarta).
+        """
+        with self._lock:
+            if self._recargando:
+                return False
+            self._recargando = True
+        threading.Thread(target=self._recargar_y_liberar, name="galeria-recarga", daemon=True).start()
+        return True
+
+    def _recargar_y_liberar(self) -> None:
+        try:
+            self.recargar()
+        finally:
+            with self._lock:
+                self._recargando = False
+
+    # ── Cambios incrementales ─────────────────────────────────────────────────
+    def agregar(
+        self,
+        id_rostro: int,
+        id_persona: int,
+        nombre: str,
+        apellidos: str,
+        embedding: np.ndarray,
+    ) -> None:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, DIM_EMBEDDING)
+        norma = np.linalg.norm(vector)
+        if norma > 0:
+            vector = vector / norma
+        with self._lock:
+            self._registrar("_agregar", (id_rostro, id_persona, nombre, apellidos, vector))
+            self._agregar(id_rostro, id_persona, nombre, apellidos, vector)
+
+    def eliminar_persona(self, id_persona: int) -> None:
+        with self._lock:
+            self._registrar("_eliminar_persona", (id_persona,))
+            self._eliminar_persona(id_persona)
+
+    def actualizar_persona(self, id_persona: int, nombre: str, apellidos: str) -> None:
+        with self._lock:
+            self._registrar("_actualizar_persona", (id_persona, nombre, apellidos))
+            self._actualizar_persona(id_persona, nombre, apellidos)
+
+    def _registrar(self, operacion: str, args: tuple) -> None:
+        for bitacora in self._bitacoras:
+            bitacora.append((operacion, args))
+
+    # Las siguientes se llaman con _lock tomado
+    def _agregar(
+        self, id_rostro: int, id_persona: int, nombre: str, apellidos: str, vector: np.ndarray
+    ) -> None:
+        self._personas[id_persona] = (nombre, apellidos)
+        if id_rostro in self._ids_rostro:
+            return
+        self._matriz = np.ascontiguousarray(np.vstack([self._matriz, vector]))
+        self._ids_rostro = np.append(self._ids_rostro, id_rostro)
+        self._ids_persona = np.append(self._ids_persona, id_persona)
+
+    def _eliminar_persona(self, id_persona: int) -> None:
+        conservar = self._ids_persona != id_persona
+        self._matriz = np.ascontiguousarray(self._matriz[conservar])
+        self._ids_rostro = self._ids_rostro[conservar]
+        self._ids_persona = self._ids_persona[conservar]
+        self._personas.pop(id_persona, None)
+
+    def _actualizar_persona(self, id_persona: int, nombre: str, apellidos: str) -> None:
+        if id_persona in self._personas:
+            self._personas[id_persona] = (nombre, apellidos)
+
+    # ── Búsqueda ──────────────────────────────────────────────────────────────
+    def buscar(
+        self,
+        embeddings: Sequence[np.ndarray],
+        excluir_persona: Optional[int] = None,
+    ) -> List[Tuple[Optional[dict], float]]:
+        """
+        Mejor coincidencia por consulta: similitudes = Q · Gᵀ en una sola
+        multiplicación. Retorna (persona | None, similitud) en el mismo orden
+        que las consultas, con el mismo formato que la búsqueda pgvector.
+        """
+        consultas = np.asarray(embeddings, dtype=np.float32).reshape(-1, DIM_EMBEDDING)
+        with self._lock:
+            matriz, ids_persona, personas = self._matriz, self._ids_persona, self._personas
+
+        if excluir_persona is not None:
+            conservar = ids_persona != excluir_persona
+            matriz, ids_persona = matriz[conservar], ids_persona[conservar]
+
+        if matriz.shape[0] == 0:
+            return [(None, -1.0) for _ in range(consultas.shape[0])]
+
+        similitudes = consultas @ matriz.T
+        mejores = np.argmax(similitudes, axis=1)
+
+        resultados: List[Tuple[Optional[dict], float]] = []
+        for fila, indice in enumerate(mejores):
+            id_persona = int(ids_persona[indice])
+            nombre, apellidos = personas.get(id_persona, ("", ""))
+            persona = {"id_persona": id_persona, "nombre": nombre, "apellidos": apellidos}
+            resultados.append((persona, float(similitudes[fila, indice])))
+        return resultados
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "cargada":    self.cargada,
+                "recargando": self._recargando,
+                "embeddings": int(self._matriz.shape[0]),
+                "personas":   len(self._personas),
+                "memoria_kb": round(self._matriz.nbytes / 1024, 1),
+            }
+
+    # ── LISTEN/NOTIFY ─────────────────────────────────────────────────────────
+    def iniciar(self) -> None:
+        """Carga inicial + hilo que escucha invalidaciones de otros procesos."""
+        if not GALERIA_HABILITADA:
+            log.info("Galería en memoria deshabilitada; se usará pgvector.")
+            return
+        self.recargar()
+        if self._escucha is None:
+            self._activo = True
+            self._escucha = threading.Thread(
+                target=self._escuchar, name="galeria-listen", daemon=True
+            )
+            self._escucha.start()
+
+    def detener(self) -> None:
+        self._activo = False
+
+    def _escuchar(self) -> None:
+        import psycopg2
+        from app.bd import engine
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        reconexion = False
+        while self._activo:
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CANAL_NOTIFICACION};")
+                # Lo ocurrido mientras no escuchábamos se cubre recargando
+                if reconexion:
+                    self.recargar()
+                reconexion = True
+
+                while self._activo:
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    externas = False
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        try:
+                            origen = json.loads(aviso.payload).get("origen")
+                        except ValueError:
+                            origen = None
+                        if origen != _ORIGEN:
+                            externas = True
+                    if externas:
+                        log.info("Cambio de galería en otro proceso, recargando ...")
+                        self.recargar()
+            except Exception as e:
+                log.warning(f"Escucha de galería interrumpida: {e}. Reintentando en 5s ...")
+                threading.Event().wait(5.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def notificar_cambio(db: Session, operacion: str, **datos) -> None:
+    """
+    Encola un NOTIFY en la transacción actual; Postgres lo entrega solo si
+    la transacción hace commit.
+    """
+    payload = json.dumps({"origen": _ORIGEN, "op": operacion, **datos})
+    db.execute(
+        text("SELECT pg_notify(:canal, :payload)"),
+        {"canal": CANAL_NOTIFICACION, "payload": payload},
+    )
+
+
+# Instancia global
+galeria = GaleriaEmbeddings()
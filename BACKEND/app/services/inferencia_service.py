@@ -0,0 +1,375 @@
+"""
+Servicio de Inferencia Facial - V-ESCOM
+=======================================
+Pool de procesos dedicado a InsightFace. Cada proceso mantiene su propia
+instancia de FaceAnalysis ya calentada, de modo que la extracción de
+embeddings nunca corre sobre el event loop de uvicorn (peticiones HTTP,
+generadores MJPEG y sockets /ws/alertas siguen respondiendo).
+
+La identificación se divide en dos etapas:
+    1. detección + alineación, un trabajo por frame;
+    2. reconocimiento ArcFace, agrupado entre todas las cámaras por el
+       AgrupadorReconocimiento (micro-lotes) para no ejecutar el modelo
+       ONNX con batch 1 una y otra vez.
+
+Cada trabajo reporta el tiempo consumido por módulo ONNX (detección,
+reconocimiento, ...) y el pool lo acumula para GET /reconocimiento/motor/perfil.
+
+Configuración (.env):
+    INFERENCIA_WORKERS=2            # procesos del pool
+    INFERENCIA_MAX_PENDIENTES=8     # detecciones en vuelo antes de rechazar
+    RECONOCIMIENTO_MAX_PENDIENTES=4 # lotes ArcFace en vuelo (cupo propio)
+    INFERENCIA_TIMEOUT_SEG=15       # tiempo máximo de espera por trabajo
+    RECONOCIMIENTO_LOTE_MAX=16      # rostros por llamada ArcFace
+    RECONOCIMIENTO_LOTE_ESPERA_MS=30  # espera máxima para completar un lote
+
+Manejo de errores:
+    - Los ValueError del motor (sin rostro, varios rostros, imagen inválida)
+      se propagan tal cual para que el llamador responda 422.
+    - InferenciaNoDisponible si la cola está llena, el trabajo excede el
+      timeout o un proceso del pool murió (el pool se recrea solo).
+
+Cupos:
+    Detección y reconocimiento llevan contadores separados: una ráfaga de
+    frames que llena INFERENCIA_MAX_PENDIENTES no rechaza los lotes ArcFace
+    de rostros ya detectados. Ambos comparten los mismos procesos, así que
+    el cupo solo decide qué se rechaza, no quién se ejecuta primero.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.utils import face_utils
+
+log = logging.getLogger("inferencia")
+
+INFERENCIA_WORKERS        = int(os.getenv("INFERENCIA_WORKERS", "2"))
+INFERENCIA_MAX_PENDIENTES = int(os.getenv("INFERENCIA_MAX_PENDIENTES", "8"))
+INFERENCIA_TIMEOUT_SEG    = float(os.getenv("INFERENCIA_TIMEOUT_SEG", "15"))
+LOTE_MAX                  = int(os.getenv("RECONOCIMIENTO_LOTE_MAX", "16"))
+LOTE_ESPERA_MS            = float(os.getenv("RECONOCIMIENTO_LOTE_ESPERA_MS", "30"))
+LOTE_MAX_PENDIENTES       = int(os.getenv("RECONOCIMIENTO_MAX_PENDIENTES", "4"))
+
+
+class InferenciaNoDisponible(RuntimeError):
+    """El pool no pudo aceptar o completar el trabajo (saturado, timeout o caído)."""
+
+
+class PoolInferencia:
+    """
+    Ejecuta funciones de face_utils en procesos separados.
+
+    - Los procesos se crean con 'spawn' para no heredar el estado de uvicorn
+      ni sesiones ONNX a medio inicializar.
+    - Cada proceso precarga el modelo en su initializer.
+    - El número de trabajos en vuelo está acotado por max_pendientes
+      (detección) y max_lotes (lotes de reconocimiento); al superarlo se
+      rechaza de inmediato en lugar de encolar sin límite. Un trabajo cuenta
+      como pendiente hasta que el proceso lo termina, aunque su llamador ya
+      haya dejado de esperarlo por timeout.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCIA_WORKERS,
+        max_pendientes: int = INFERENCIA_MAX_PENDIENTES,
+        timeout_seg: float = INFERENCIA_TIMEOUT_SEG,
+        max_lotes: int = LOTE_MAX_PENDIENTES,
+    ) -> None:
+        self.workers        = max(1, workers)
+        self.max_pendientes = max(1, max_pendientes)
+        self.max_lotes      = max(1, max_lotes)
+        self.timeout_seg    = timeout_seg
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tamanos_det: Tuple[int, ...] = ()
+        self._pendientes = 0
+        self._lotes_pendientes = 0
+        # Tiempo de inferencia por módulo ONNX, sumado de todos los procesos
+        self._perfil: Dict[str, List[float]] = {}
+
+    # ── Ciclo de vida ─────────────────────────────────────────────────────────
+    def iniciar(self, tamanos_det: Sequence[int] = ()) -> None:
+        """
+        Crea el pool. tamanos_det son los tamaños de entrada del detector a
+        calentar en cada proceso, además de FACE_DET_SIZE.
+        """
+        if self._executor is not None:
+            return
+        if tamanos_det:
+            self._tamanos_det = tuple(sorted(set(tamanos_det)))
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=face_utils.precargar_modelo,
+            initargs=(self._tamanos_det,),
+        )
+        log.info(
+            f"Pool de inferencia iniciado: workers={self.workers}, "
+            f"max_pendientes={self.max_pendientes}, timeout={self.timeout_seg}s"
+        )
+
+    def detener(self) -> None:
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        log.info("Pool de inferencia detenido.")
+
+    def _reiniciar(self) -> None:
+        log.warning("Un proceso del pool de inferencia terminó inesperadamente. Recreando pool ...")
+        self.detener()
+        self.iniciar()
+
+    async def precalentar(self, max_rondas: int = 5) -> List[dict]:
+        """
+        Fuerza el arranque de todos los procesos del pool (cada uno carga y
+        calienta el modelo en su initializer) y retorna sus tiempos.
+        Se envían rondas de trabajos triviales hasta haber visto cada proceso.
+        """
+        self.iniciar()
+        loop = asyncio.get_running_loop()
+        reportes: Dict[int, dict] = {}
+        for _ in range(max_rondas):
+            futuros = [
+                loop.run_in_executor(self._executor, face_utils.reporte_calentamiento)
+                for _ in range(self.workers)
+            ]
+            for reporte in await asyncio.gather(*futuros):
+                reportes[reporte["pid"]] = reporte
+            if len(reportes) >= self.workers:
+                break
+        return list(reportes.values())
+
+    def estado(self) -> dict:
+        return {
+            "activo":         self._executor is not None,
+            "workers":        self.workers,
+            "pendientes":     self._pendientes,
+            "max_pendientes": self.max_pendientes,
+            "lotes_pendientes": self._lotes_pendientes,
+            "max_lotes":      self.max_lotes,
+            "timeout_seg":    self.timeout_seg,
+        }
+
+    # ── Perfil por módulo ─────────────────────────────────────────────────────
+    def _acumular_perfil(self, tiempos: Dict[str, List[float]]) -> None:
+        for modulo, (total_ms, llamadas) in tiempos.items():
+            acumulado = self._perfil.setdefault(modulo, [0.0, 0])
+            acumulado[0] += total_ms
+            acumulado[1] += llamadas
+
+    def perfil(self) -> dict:
+        """Reporte de tiempo de inferencia por módulo (promedio por llamada)."""
+        modulos = {
+            modulo: {
+                "llamadas":    int(llamadas),
+                "total_ms":    round(total_ms, 1),
+                "promedio_ms": round(total_ms / llamadas, 2) if llamadas else 0.0,
+            }
+            for modulo, (total_ms, llamadas) in sorted(self._perfil.items())
+        }
+        return {
+            "modelo":   face_utils.FACE_MODELO,
+            "modulos":  face_utils.FACE_MODULOS,
+            "det_size": face_utils.FACE_DET_SIZE,
+            "tiempos":  modulos,
+        }
+
+    def reiniciar_perfil(self) -> None:
+        self._perfil.clear()
+
+    # ── Ejecución ─────────────────────────────────────────────────────────────
+    async def ejecutar(
+        self, funcion: Callable[..., Any], *args: Any, lote: bool = False
+    ) -> Any:
+        """
+        Envía funcion(*args) a un proceso del pool y espera su resultado.
+        La función y sus argumentos deben ser serializables (pickle).
+        lote=True descuenta del cupo de reconocimiento (max_lotes) en lugar
+        del de detección (max_pendientes).
+        """
+        if lote and self._lotes_pendientes >= self.max_lotes:
+            raise InferenciaNoDisponible("Cola de reconocimiento llena, intenta más tarde")
+        if not lote and self._pendientes >= self.max_pendientes:
+            raise InferenciaNoDisponible("Cola de inferencia llena, intenta más tarde")
+
+        self.iniciar()
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        self._ocupar(lote)
+        trabajo = None
+        try:
+            trabajo = executor.submit(face_utils.ejecutar_con_perfil, funcion, *args)
+            # El cupo se libera cuando el trabajo termina en el proceso, no
+            # cuando el llamador deja de esperar: tras un timeout el proceso
+            # sigue ocupado y la cola del executor no debe pasar del cupo.
+            trabajo.add_done_callback(lambda _: self._liberar_desde_hilo(loop, lote))
+            # Cancelar la espera cancela el trabajo si aún no empezó
+            resultado, tiempos = await asyncio.wait_for(
+                asyncio.wrap_future(trabajo), timeout=self.timeout_seg
+            )
+            self._acumular_perfil(tiempos)
+            return resultado
+        except asyncio.TimeoutError:
+            raise InferenciaNoDisponible(
+                f"La inferencia excedió el tiempo límite de {self.timeout_seg}s"
+            )
+        except BrokenProcessPool:
+            if self._executor is executor:
+                self._reiniciar()
+            raise InferenciaNoDisponible("El motor de inferencia se reinició, reintenta")
+        finally:
+            if trabajo is None:
+                # submit() falló: el trabajo nunca llegó al executor
+                self._liberar(lote)
+
+    def _ocupar(self, lote: bool) -> None:
+        if lote:
+            self._lotes_pendientes += 1
+        else:
+            self._pendientes += 1
+
+    def _liberar(self, lote: bool) -> None:
+        if lote:
+            self._lotes_pendientes -= 1
+        else:
+            self._pendientes -= 1
+
+    def _liberar_desde_hilo(self, loop: asyncio.AbstractEventLoop, lote: bool) -> None:
+        # Los callbacks de concurrent.futures corren en el hilo del executor;
+        # los contadores solo se tocan desde el event loop
+        try:
+            loop.call_soon_threadsafe(self._liberar, lote)
+        except RuntimeError:
+            # El loop ya se cerró (apagado): no queda nadie que use el cupo
+            pass
+
+    async def extraer_embedding(self, imagen_bytes: bytes) -> np.ndarray:
+        """Equivalente awaitable de face_utils.extraer_embedding (un solo rostro)."""
+        return await self.ejecutar(face_utils.extraer_embedding, imagen_bytes)
+
+    async def detectar_rostros(
+        self, imagen: face_utils.Imagen, perfil: Optional[dict] = None
+    ) -> List[dict]:
+        """
+        Etapa 1: detección + alineación con el perfil de detección de la
+        cámara (ver face_utils.detectar_y_alinear). Acepta bytes codificados
+        o el array BGR de la captura.
+        """
+        return await self.ejecutar(face_utils.detectar_y_alinear, imagen, perfil)
+
+
+class AgrupadorReconocimiento:
+    """
+    Micro-lotes para la etapa de reconocimiento (ArcFace).
+
+    Acumula recortes alineados de cualquier cámara hasta juntar max_lote
+    rostros o hasta que pasen max_espera_ms desde el primero en la cola,
+    y los ejecuta como una sola llamada batched en el pool. Cada llamador
+    recibe únicamente los embeddings de sus propios recortes.
+    Todo el estado vive en el event loop; no requiere locks. Las tareas de
+    los lotes en curso se guardan en _tareas para que el recolector no las
+    descarte antes de terminar.
+    """
+
+    def __init__(
+        self,
+        pool: PoolInferencia,
+        max_lote: int = LOTE_MAX,
+        max_espera_ms: float = LOTE_ESPERA_MS,
+    ) -> None:
+        self.pool          = pool
+        self.max_lote      = max(1, max_lote)
+        self.max_espera    = max(0.0, max_espera_ms) / 1000.0
+        self._cola: List[Tuple[np.ndarray, asyncio.Future]] = []
+        self._temporizador: Optional[asyncio.TimerHandle] = None
+        self._tareas: Set[asyncio.Task] = set()
+        self.lotes_ejecutados = 0
+        self.rostros_procesados = 0
+
+    async def embeber(self, alineados: List[np.ndarray]) -> List[np.ndarray]:
+        """Retorna un embedding 512-d por recorte, en el mismo orden."""
+        if not alineados:
+            return []
+        loop = asyncio.get_running_loop()
+        futuros = [loop.create_future() for _ in alineados]
+        self._cola.extend(zip(alineados, futuros))
+
+        while len(self._cola) >= self.max_lote:
+            lote, self._cola = self._cola[:self.max_lote], self._cola[self.max_lote:]
+            self._lanzar(lote)
+
+        if not self._cola:
+            self._cancelar_temporizador()
+        elif self._temporizador is None:
+            self._temporizador = loop.call_later(self.max_espera, self._vencer_espera)
+
+        # return_exceptions: un lote fallido marca todos sus futuros; se
+        # recuperan todos para que asyncio no avise de excepciones sin leer
+        resultados = await asyncio.gather(*futuros, return_exceptions=True)
+        for resultado in resultados:
+            if isinstance(resultado, BaseException):
+                raise resultado
+        return list(resultados)
+
+    def _lanzar(self, lote: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        tarea = asyncio.ensure_future(self._procesar(lote))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    def _cancelar_temporizador(self) -> None:
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def _vencer_espera(self) -> None:
+        """Venció max_espera: el lote sale aunque no esté completo."""
+        self._temporizador = None
+        if self._cola:
+            lote, self._cola = self._cola, []
+            self._lanzar(lote)
+
+    async def _procesar(self, lote: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        try:
+            embeddings = await self.pool.ejecutar(
+                face_utils.embeddings_lote, [alineado for alineado, _ in lote], lote=True
+            )
+        except Exception as e:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        self.lotes_ejecutados += 1
+        self.rostros_procesados += len(lote)
+        for (_, futuro), embedding in zip(lote, embeddings):
+            if not futuro.done():
+                futuro.set_result(embedding)
+
+    def estado(self) -> dict:
+        promedio = (
+            self.rostros_procesados / self.lotes_ejecutados
+            if self.lotes_ejecutados else 0.0
+        )
+        return {
+            "max_lote":           self.max_lote,
+            "max_espera_ms":      self.max_espera * 1000.0,
+            "en_cola":            len(self._cola),
+            "lotes_en_curso":     len(self._tareas),
+            "lotes_ejecutados":   self.lotes_ejecutados,
+            "rostros_procesados": self.rostros_procesados,
+            "promedio_por_lote":  round(promedio, 2),
+        }
+
+
+# Instancias globales
+inferencia_pool = PoolInferencia()
+agrupador_reconocimiento = AgrupadorReconocimiento(inferencia_pool)
@@ -0,0 +1,311 @@
+"""
+Ventana de De-duplicación de Intrusos - V-ESCOM
+===============================================
+Un intruso frente a una cámara genera, por cada frame analizado, un
+EventoAcceso, una PersonaNoAutorizada, una captura en disco, una Alerta, un
+SMS por destinatario y un broadcast WebSocket. Este módulo mantiene en
+memoria, por cámara, los embeddings de los intrusos vistos recientemente:
+
+    - Un rostro desconocido cuya similitud con un intruso de la ventana sea
+      >= INTRUSOS_DEDUP_SIMILITUD se considera el mismo avistamiento: se
+      incrementa el contador del evento original en lugar de crear otro.
+    - Cada avistamiento renueva la vigencia de la entrada; una entrada sin
+      avistamientos en INTRUSOS_DEDUP_VENTANA_SEG se descarta y el siguiente
+      avistamiento vuelve a generar evento y alerta.
+
+INTRUSOS_DEDUP_VENTANA_SEG=0 desactiva la de-duplicación.
+
+Los intrusos nuevos de una transacción se acumulan en una ventana pendiente
+(nueva_pendiente) que sirve para de-duplicar dentro del mismo lote y solo
+se incorpora a la ventana global (confirmar) tras el commit: la ventana
+nunca apunta a un id_evento que se deshizo con rollback. Por lo mismo,
+buscar() no modifica la entrada encontrada: los avistamientos de intrusos
+de la ventana global se anotan en la transacción y se aplican con
+confirmar(); un rollback no infla el contador ni renueva la vigencia.
+
+Re-identificación de intrusos recurrentes:
+    - Cada captura nueva de PersonaNoAutorizada se compara (k=1) contra el
+      histórico usando el índice HNSW de embedding_detectado; si la
+      similitud es >= INTRUSOS_REID_SIMILITUD hereda su id_intruso, si no
+      abre una identidad nueva (id_intruso = su propio id_pna).
+    - El job agrupar_intrusos.py re-agrupa el histórico completo y mantiene
+      un centroide por identidad en intrusos_centroides, que se consulta
+      antes que las capturas individuales.
+    - historial_intruso() resume cuántas veces y en qué cámaras se ha visto
+      una identidad con una sola consulta sobre el índice de id_intruso.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.evento import PersonaNoAutorizada
+from app.utils.vector_utils import literal_vector
+
+DEDUP_VENTANA_SEG  = float(os.getenv("INTRUSOS_DEDUP_VENTANA_SEG", "120"))
+DEDUP_SIMILITUD    = float(os.getenv("INTRUSOS_DEDUP_SIMILITUD", "0.45"))
+DEDUP_MAX_ENTRADAS = int(os.getenv("INTRUSOS_DEDUP_MAX_ENTRADAS", "64"))
+REID_SIMILITUD     = float(os.getenv("INTRUSOS_REID_SIMILITUD", "0.45"))
+
+
+@dataclass
+class IntrusoReciente:
+    """Intruso visto recientemente en una cámara."""
+    id_evento: int
+    embedding: np.ndarray
+    primer_avistamiento: float
+    ultimo_avistamiento: float
+    avistamientos: int = 1
+    id_intruso: Optional[int] = None
+
+
+class VentanaIntrusos:
+    """Intrusos recientes por cámara. Seguro para uso entre hilos."""
+
+    def __init__(
+        self,
+        ventana_seg: float = DEDUP_VENTANA_SEG,
+        similitud_min: float = DEDUP_SIMILITUD,
+        max_entradas: int = DEDUP_MAX_ENTRADAS,
+    ) -> None:
+        self.ventana_seg = ventana_seg
+        self.similitud_min = similitud_min
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self._camaras: Dict[int, List[IntrusoReciente]] = {}
+
+    @property
+    def habilitada(self) -> bool:
+        return self.ventana_seg > 0
+
+    def _vigentes(self, id_camara: int, ahora: float) -> List[IntrusoReciente]:
+        entradas = [
+            e for e in self._camaras.get(id_camara, [])
+            if ahora - e.ultimo_avistamiento <= self.ventana_seg
+        ]
+        self._camaras[id_camara] = entradas
+        return entradas
+
+    def buscar(
+        self, id_camara: int, embedding: np.ndarray, ahora: Optional[float] = None
+    ) -> Optional[IntrusoReciente]:
+        """
+        Retorna el intruso de la ventana más parecido al embedding (si supera
+        el umbral); None si es un intruso nuevo. Solo lectura: el avistamiento
+        se registra con avistar() o confirmar().
+        """
+        if not self.habilitada:
+            return None
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            entradas = self._vigentes(id_camara, ahora)
+            if not entradas:
+                return None
+            matriz = np.stack([e.embedding for e in entradas])
+            similitudes = matriz @ np.asarray(embedding, dtype=np.float32)
+            mejor = int(np.argmax(similitudes))
+            if similitudes[mejor] < self.similitud_min:
+                return None
+            return entradas[mejor]
+
+    def avistar(self, entrada: IntrusoReciente, ahora: Optional[float] = None) -> None:
+        """Cuenta un avistamiento de una entrada de buscar() y renueva su vigencia."""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._lock:
+            self._avistar(entrada, ahora)
+
+    @staticmethod
+    def _avistar(entrada: IntrusoReciente, ahora: float) -> None:
+        entrada.avistamientos += 1
+        entrada.ultimo_avistamiento = max(entrada.ultimo_avistamiento, ahora)
+
+    def registrar(
+        self,
+        id_camara: int,
+        id_evento: int,
+        embedding: np.ndarray,
+        id_intruso: Optional[int] = None,
+        ahora: Optional[float] = None,
+    ) -> None:
+        """Agrega un intruso nuevo a la ventana de la cámara."""
+        if not self.habilitada:
+            return
+        ahora = time.monotonic() if ahora is None else ahora
+        vector = np.asarray(embedding, dtype=np.float32)
+        norma = np.linalg.norm(vector)
+        if norma > 0:
+            vector = vector / norma
+        with self._lock:
+            entradas = self._vigentes(id_camara, ahora)
+            entradas.append(
+                IntrusoReciente(id_evento, vector, ahora, ahora, id_intruso=id_intruso)
+            )
+            self._acotar(entradas)
+
+    def _acotar(self, entradas: List[IntrusoReciente]) -> None:
+        # Acotar memoria: se descartan los vistos hace más tiempo
+        if len(entradas) > self.max_entradas:
+            entradas.sort(key=lambda e: e.ultimo_avistamiento)
+            del entradas[: len(entradas) - self.max_entradas]
+
+    def nueva_pendiente(self) -> "VentanaIntrusos":
+        """Ventana vacía con la misma configuración para los intrusos de una transacción."""
+        return VentanaIntrusos(self.ventana_seg, self.similitud_min, self.max_entradas)
+
+    def confirmar(
+        self,
+        pendiente: "VentanaIntrusos",
+        avistados: Sequence[Tuple[IntrusoReciente, float]] = (),
+    ) -> None:
+        """
+        Tras el commit de sus eventos: incorpora las entradas de una ventana
+        pendiente y aplica los avistamientos (entrada, instante) de intrusos
+        de esta ventana que se anotaron en la transacción.
+        """
+        if not self.habilitada:
+            return
+        with pendiente._lock:
+            camaras = {id_camara: list(e) for id_camara, e in pendiente._camaras.items()}
+        ahora = time.monotonic()
+        with self._lock:
+            for entrada, instante in avistados:
+                self._avistar(entrada, instante)
+            for id_camara, nuevas in camaras.items():
+                entradas = self._vigentes(id_camara, ahora)
+                entradas.extend(nuevas)
+                self._acotar(entradas)
+
+    def olvidar_camara(self, id_camara: int) -> None:
+        with self._lock:
+            self._camaras.pop(id_camara, None)
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "ventana_seg":   self.ventana_seg,
+                "similitud_min": self.similitud_min,
+                "intrusos":      {
+                    id_camara: len(entradas) for id_camara, entradas in self._camaras.items()
+                },
+            }
+
+
+# ─── Re-identificación sobre personas_no_autorizadas ─────────────────────────
+
+def reidentificar(db: Session, embedding: np.ndarray) -> Tuple[Optional[int], float]:
+    """
+    Intruso histórico más parecido (k-NN k=1 sobre índices HNSW).
+    Busca primero entre los centroides de intrusos_centroides (miles de
+    filas) y solo si no hay coincidencia entre las capturas individuales
+    (incluye las que llegaron después del último agrupamiento).
+    Retorna (id_intruso | None, similitud); None si no supera REID_SIMILITUD.
+    """
+    literal = literal_vector(embedding)
+    centroide = db.execute(
+        text(
+            """
+            SELECT id_intruso, embedding <=> CAST(:embedding AS vector) AS distancia
+            FROM intrusos_centroides
+            ORDER BY embedding <=> CAST(:embedding AS vector)
+            LIMIT 1
+            """
+        ),
+        {"embedding": literal},
+    ).first()
+    if centroide is not None and 1.0 - float(centroide[1]) >= REID_SIMILITUD:
+        return int(centroide[0]), 1.0 - float(centroide[1])
+
+    fila = db.execute(
+        text(
+            """
+            SELECT id_pna, id_intruso,
+                   embedding_detectado <=> CAST(:embedding AS vector) AS distancia
+            FROM personas_no_autorizadas
+            WHERE embedding_detectado IS NOT NULL
+            ORDER BY embedding_detectado <=> CAST(:embedding AS vector)
+            LIMIT 1
+            """
+        ),
+        {"embedding": literal},
+    ).first()
+    if fila is None:
+        return None, -1.0
+
+    id_pna, id_intruso, distancia = fila
+    similitud = 1.0 - float(distancia)
+    if similitud < REID_SIMILITUD:
+        return None, similitud
+    if id_intruso is None:
+        # Captura previa a la re-identificación: se vuelve raíz de su identidad
+        db.execute(
+            text("UPDATE personas_no_autorizadas SET id_intruso = id_pna WHERE id_pna = :id"),
+            {"id": id_pna},
+        )
+        id_intruso = id_pna
+    return int(id_intruso), similitud
+
+
+def asignar_identidad(
+    db: Session, pna: PersonaNoAutorizada, embedding: np.ndarray
+) -> Tuple[int, float]:
+    """
+    Agrega la captura a la sesión con su id_intruso: el del intruso
+    histórico coincidente o, si es alguien nuevo, su propio id_pna.
+    Retorna (id_intruso, similitud con el histórico).
+    """
+    id_intruso, similitud = reidentificar(db, embedding)
+    pna.id_intruso = id_intruso
+    db.add(pna)
+    db.flush()
+    if pna.id_intruso is None:
+        pna.id_intruso = pna.id_pna
+    return pna.id_intruso, similitud
+
+
+def historial_intruso(db: Session, id_intruso: int) -> Optional[dict]:
+    """
+    Resumen de avistamientos de una identidad; None si no existe.
+    Cada captura cuenta con los avistamientos que la de-duplicación sumó a su
+    evento (eventos_acceso.avistamientos); la semana se asigna por el último
+    avistamiento del evento.
+    """
+    fila = db.execute(
+        text(
+            """
+            SELECT count(*),
+                   coalesce(sum(coalesce(e.avistamientos, 1)), 0),
+                   coalesce(sum(coalesce(e.avistamientos, 1)) FILTER (
+                       WHERE coalesce(e.ultimo_avistamiento::date, p.fecha) >= CURRENT_DATE - 6
+                   ), 0),
+                   array_remove(array_agg(DISTINCT p.id_camara), NULL),
+                   min(p.fecha + p.hora),
+                   greatest(max(p.fecha + p.hora), max(e.ultimo_avistamiento))
+            FROM personas_no_autorizadas p
+            LEFT JOIN eventos_acceso e ON e.id_evento = p.id_evento
+            WHERE p.id_intruso = :id_intruso
+            """
+        ),
+        {"id_intruso": id_intruso},
+    ).first()
+    if fila is None or fila[0] == 0:
+        return None
+    _, total, semana, camaras, primero, ultimo = fila
+    return {
+        "id_intruso":           id_intruso,
+        "total_avistamientos":  int(total),
+        "avistamientos_semana": int(semana),
+        "camaras":              sorted(camaras or []),
+        "primer_avistamiento":  primero,
+        "ultimo_avistamiento":  ultimo,
+    }
+
+
+# Instancia global
+ventana_intrusos = VentanaIntrusos()
@@ -45,6 +45,7 @@ def _serializar_alerta_tiempo_real(
         "id_camara": evento.id_camara,
         "id_cubiculo": id_cubiculo,
         "similitud": evento.similitud,
+        "avistamientos": evento.avistamientos or 1,
         "fecha": str(alerta.fecha) if alerta.fecha is not None else None,
         "hora": str(alerta.hora) if alerta.hora is not None else None,
     }
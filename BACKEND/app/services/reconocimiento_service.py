@@ -3,42 +3,119 @@ Servicio de reconocimiento facial.
 Flujo:
   1. Registrar embedding de una persona autorizada (subiendo foto).
   2. Identificar un rostro contra la BD → retorna evento de acceso.
+  3. Identificar todos los rostros de un frame de cámara (modo multi-rostro):
+     un micro-lote de embeddings y una sola consulta unnest/LATERAL.
+     Con un RastreadorRostros por cámara, cada persona se reconoce una vez
+     por pista en lugar de una vez por frame.
+  4. Identificar un lote de frames (varias cámaras) en una petición:
+     detección en paralelo, un micro-lote ArcFace y un solo commit.
+  5. Identificar embeddings calculados en equipos de borde: sin decodificar
+     imágenes ni inferencia, solo búsqueda de coincidencias.
 
 Umbral de similitud: 0.40 (configurable en .env como SIMILITUD_UMBRAL).
 Con ArcFace normalizado, valores >0.4 indican la misma persona.
 
 Manejo de eventos:
+    - Un EventoAcceso por rostro identificado (por pista, en cámaras con
+      seguimiento).
     - Si no autorizado, se registra en EventoAcceso y PersonaNoAutorizada.
     - Se envía notificación de intrusión a administradores activos con teléfono registrado.
+    - Un intruso que sigue a la vista de la misma cámara dentro de la ventana
+      de de-duplicación suma avistamientos al evento original en lugar de
+      generar eventos, capturas, alertas y SMS nuevos.
+    - Cada captura de intruso recibe un id_intruso estable (re-identificación
+      contra personas_no_autorizadas) y la alerta incluye su historial.
 
 Manejo de errores:
     - 404 si la persona no existe al registrar rostro.
     - 422 para errores en extracción de embedding (ej. imagen sin rostro).
+      La regla de "un solo rostro" aplica al registro y a /identificar, no al
+      modo multi-rostro.
+    - 503 si el pool de inferencia está saturado o no respondió a tiempo.
     - En caso de error en notificación, se registra el evento pero se omite el envío de SMS.
 """
 from __future__ import annotations
 
+import asyncio
+import logging
+import math
 import os
-from typing import Optional
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Awaitable, Callable, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 from fastapi import HTTPException, UploadFile
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
 
+from app.models.camara import Camara
 from app.models.evento import EventoAcceso, PersonaNoAutorizada
 from app.models.persona_autorizada import PersonaAutorizada
 from app.models.rostro_autorizado import RostroAutorizado
 from app.schemas.reconocimiento_schema import (
     CrearPersonaAutorizada,
     DatosPersonaAutorizada,
+    HistorialIntruso,
+    ResultadoFrame,
+    ResultadoFrameLote,
+    ResultadoLote,
     ResultadoReconocimiento,
+    RostroIdentificado,
     UpdPersonaAutorizada,
 )
 from app.services import notificacion_service
+from app.services.galeria_service import VERIFICACION_MUESTREO, galeria, notificar_cambio
+from app.services.inferencia_service import (
+    InferenciaNoDisponible,
+    agrupador_reconocimiento,
+    inferencia_pool,
+)
+from app.services.intrusos_service import (
+    IntrusoReciente,
+    VentanaIntrusos,
+    asignar_identidad,
+    historial_intruso,
+    reidentificar,
+    ventana_intrusos,
+)
 from app.services.log_sistema_service import registrar_log
 from app.services.websocket_manager import alertas_ws_manager
-from app.utils.face_utils import extraer_embedding
+from app.utils.face_utils import Imagen, bgr_a_jpg, realinear_en_alta, validar_rostro_unico
+from app.utils.lote_embeddings import RostroEmbebido
+from app.utils.lote_frames import FrameLote
+from app.utils.seguimiento import Pista, RastreadorRostros
+from app.utils.vector_utils import literal_vector, literal_vectores
 
 SIMILITUD_UMBRAL = float(os.getenv("SIMILITUD_UMBRAL", "0.40"))
+# Diferencia de similitud tolerada al verificar la galería contra pgvector
+_TOLERANCIA_VERIFICACION = 1e-3
+
+# Frames por petición en /reconocimiento/identificar/lote
+LOTE_MAX_FRAMES = int(os.getenv("IDENTIFICACION_LOTE_MAX_FRAMES", "32"))
+# Rostros por petición en /reconocimiento/identificar/embeddings
+LOTE_MAX_ROSTROS = int(os.getenv("IDENTIFICACION_LOTE_MAX_ROSTROS", "128"))
+# Diferencia máxima (s) entre la marca de tiempo de un frame remoto y el reloj del servidor
+LOTE_TS_TOLERANCIA_SEG = float(os.getenv("IDENTIFICACION_TS_TOLERANCIA_SEG", "86400"))
+
+# Seguimiento de rostros en cámaras (ver app.utils.seguimiento)
+RASTREO_MARGEN          = float(os.getenv("RASTREO_MARGEN", "0.08"))
+RASTREO_MAX_REINTENTOS  = int(os.getenv("RASTREO_MAX_REINTENTOS", "3"))
+RASTREO_REVALIDAR_SEG   = float(os.getenv("RASTREO_REVALIDAR_SEG", "300"))
+RASTREO_IOU_MIN         = float(os.getenv("RASTREO_IOU_MIN", "0.3"))
+RASTREO_TTL_SEG         = float(os.getenv("RASTREO_TTL_SEG", "3"))
+RASTREO_REVALIDAR_DUDOSA_SEG = float(os.getenv("RASTREO_REVALIDAR_DUDOSA_SEG", "10"))
+RASTREO_VERIFICAR_SEG   = float(os.getenv("RASTREO_VERIFICAR_SEG", "2"))
+RASTREO_SIMILITUD_PISTA = float(os.getenv("RASTREO_SIMILITUD_PISTA", "0.5"))
+RASTREO_CAMBIO_ESCALA   = float(os.getenv("RASTREO_CAMBIO_ESCALA", "2.0"))
+
+# Proveedor del frame del stream principal (cámaras en doble stream)
+FuenteAlta = Callable[[], Awaitable[Optional[np.ndarray]]]
+
+log = logging.getLogger("reconocimiento")
 
 # ─── CRUD Personas Autorizadas ────────────────────────────────────────────────
 
@@ -67,17 +144,23 @@ def actualizar_persona(
     db: Session, id_persona: int, datos: UpdPersonaAutorizada
 ) -> PersonaAutorizada:
     persona = obtener_persona(db, id_persona)
-    for key, value in datos.model_dump(exclude_unset=True).items():
+    cambios = datos.model_dump(exclude_unset=True)
+    for key, value in cambios.items():
         setattr(persona, key, value)
+    if "nombre" in cambios or "apellidos" in cambios:
+        notificar_cambio(db, "actualizar", id_persona=id_persona)
     db.commit()
     db.refresh(persona)
+    galeria.actualizar_persona(id_persona, persona.nombre, persona.apellidos)
     return persona
 
 # Eliminar persona autorizada por ID (borrado físico)
 def eliminar_persona(db: Session, id_persona: int) -> None:
     persona = obtener_persona(db, id_persona)
     db.delete(persona)
+    notificar_cambio(db, "eliminar", id_persona=id_persona)
     db.commit()
+    galeria.eliminar_persona(id_persona)
 
 
 # ─── Registro de rostro ───────────────────────────────────────────────────────
@@ -99,7 +182,9 @@ async def registrar_rostro(
  
     # Extraer embedding
     try:
-        embedding = extraer_embedding(contenido)
+        embedding = await inferencia_pool.extraer_embedding(contenido)
+    except InferenciaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         registrar_log(
             db,
@@ -113,24 +198,31 @@ async def registrar_rostro(
  
     if not forzar:
         UMBRAL_DUPLICADO = float(os.getenv("SIMILITUD_UMBRAL", "0.40"))
-        distancia = RostroAutorizado.embedding.cosine_distance(embedding.tolist())
-        duplicado = (
-            db.query(RostroAutorizado, PersonaAutorizada, distancia.label("distancia"))
-            .join(
-                PersonaAutorizada,
-                PersonaAutorizada.id_persona == RostroAutorizado.id_persona,
-            )
-            .filter(
-                RostroAutorizado.embedding.isnot(None),
-                RostroAutorizado.id_persona != id_persona,
+        duplicado = None
+        if galeria.cargada:
+            ((similar, sim_galeria),) = galeria.buscar([embedding], excluir_persona=id_persona)
+            if similar is not None and sim_galeria >= UMBRAL_DUPLICADO:
+                duplicado = (obtener_persona(db, similar["id_persona"]), sim_galeria)
+        else:
+            distancia = RostroAutorizado.embedding.cosine_distance(embedding.tolist())
+            fila = (
+                db.query(RostroAutorizado, PersonaAutorizada, distancia.label("distancia"))
+                .join(
+                    PersonaAutorizada,
+                    PersonaAutorizada.id_persona == RostroAutorizado.id_persona,
+                )
+                .filter(
+                    RostroAutorizado.embedding.isnot(None),
+                    RostroAutorizado.id_persona != id_persona,
+                )
+                .order_by(distancia)
+                .first()
             )
-            .order_by(distancia)
-            .first()
-        )
+            if fila:
+                duplicado = (fila[1], 1.0 - float(fila[2]))
 
         if duplicado:
-            _, p_existente, distancia_duplicado = duplicado
-            sim = 1.0 - float(distancia_duplicado)
+            p_existente, sim = duplicado
             if sim >= UMBRAL_DUPLICADO:
                 registrar_log(
                     db,
@@ -185,13 +277,32 @@ async def registrar_rostro(
         tipo="Reconocimiento",
         mensaje=f"Embedding registrado para persona autorizada #{id_persona}",
     )
+    db.flush()
+    notificar_cambio(db, "agregar", id_persona=id_persona, id_rostro=rostro.id_rostro)
     db.commit()
     db.refresh(persona)
+    galeria.agregar(rostro.id_rostro, id_persona, persona.nombre, persona.apellidos, embedding)
     return _a_schema(persona, db)
 
 
 # ─── Identificación ───────────────────────────────────────────────────────────
 
+def crear_rastreador() -> RastreadorRostros:
+    """Rastreador de rostros para una cámara con la configuración del .env."""
+    return RastreadorRostros(
+        umbral=SIMILITUD_UMBRAL,
+        margen=RASTREO_MARGEN,
+        max_reintentos=RASTREO_MAX_REINTENTOS,
+        revalidar_seg=RASTREO_REVALIDAR_SEG,
+        iou_min=RASTREO_IOU_MIN,
+        ttl_seg=RASTREO_TTL_SEG,
+        revalidar_dudosa_seg=RASTREO_REVALIDAR_DUDOSA_SEG,
+        verificar_seg=RASTREO_VERIFICAR_SEG,
+        similitud_pista=RASTREO_SIMILITUD_PISTA,
+        cambio_escala_max=RASTREO_CAMBIO_ESCALA,
+    )
+
+
 async def identificar_rostro(
     db: Session,
     imagen: UploadFile,
@@ -200,11 +311,14 @@ async def identificar_rostro(
     """
     Compara el rostro de la imagen contra todos los embeddings registrados.
     Registra el evento en la BD y retorna el resultado.
+    Requiere exactamente un rostro en la imagen.
     """
     contenido = await imagen.read()
 
     try:
-        embedding_nuevo = extraer_embedding(contenido)
+        embedding_nuevo = await _embedding_identificacion(contenido)
+    except InferenciaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         registrar_log(
             db,
@@ -216,138 +330,770 @@ async def identificar_rostro(
         )
         raise HTTPException(status_code=422, detail=str(e))
 
-    # Buscar la mejor coincidencia entre personas registradas usando pgvector
-    distancia = RostroAutorizado.embedding.cosine_distance(embedding_nuevo.tolist())
-    coincidencia = (
-        db.query(RostroAutorizado, PersonaAutorizada, distancia.label("distancia"))
-        .join(
-            PersonaAutorizada,
-            PersonaAutorizada.id_persona == RostroAutorizado.id_persona,
-        )
-        .filter(RostroAutorizado.embedding.isnot(None))
-        .order_by(distancia)
-        .first()
+    resultados = await _registrar_identificaciones(
+        db, [embedding_nuevo], contenido, id_camara
     )
+    return resultados[0]
+
+
+async def identificar_rostros_frame(
+    db: Session,
+    contenido: bytes,
+    id_camara: Optional[int] = None,
+    perfil: Optional[dict] = None,
+    rastreador: Optional[RastreadorRostros] = None,
+) -> List[RostroIdentificado]:
+    """Modo multi-rostro para frames subidos como JPEG/PNG (ver _identificar_rostros)."""
+    return await _identificar_rostros(db, contenido, id_camara, perfil, rastreador)
 
-    mejor_similitud = -1.0
-    mejor_persona: Optional[PersonaAutorizada] = None
 
-    if coincidencia:
-        _, mejor_persona, mejor_distancia = coincidencia
-        mejor_similitud = 1.0 - float(mejor_distancia)
+async def identificar_rostros_bgr(
+    db: Session,
+    frame: np.ndarray,
+    id_camara: Optional[int] = None,
+    perfil: Optional[dict] = None,
+    rastreador: Optional[RastreadorRostros] = None,
+    fuente_alta: Optional[FuenteAlta] = None,
+) -> List[RostroIdentificado]:
+    """
+    API interna para los workers de captura: recibe el array BGR tal como
+    sale de OpenCV, sin codificar a JPEG. Solo se codifica si el frame se
+    guarda como captura de intruso.
+
+    fuente_alta (cámaras en doble stream): corrutina que entrega el frame
+    del stream principal más cercano a `frame`, o None. Solo se invoca si
+    hay rostros por reconocer; ArcFace usa los rostros re-alineados sobre
+    ese frame y la captura de intruso se guarda en alta resolución.
+    """
+    return await _identificar_rostros(db, frame, id_camara, perfil, rastreador, fuente_alta)
+
 
-    # Clasificar
-    if mejor_persona and mejor_similitud >= SIMILITUD_UMBRAL:
-        tipo_acceso = "Autorizado"
-        id_persona = mejor_persona.id_persona
+async def _identificar_rostros(
+    db: Session,
+    imagen: Imagen,
+    id_camara: Optional[int],
+    perfil: Optional[dict],
+    rastreador: Optional[RastreadorRostros],
+    fuente_alta: Optional[FuenteAlta] = None,
+) -> List[RostroIdentificado]:
+    """
+    Modo multi-rostro para frames de cámara.
+    Identifica todos los rostros detectados en el frame: los embeddings se
+    calculan en un solo micro-lote y las coincidencias se resuelven en una
+    sola consulta a la BD. Genera un EventoAcceso por rostro reconocido.
+    perfil es el perfil de detección de la cámara (ROI, det_size, ...).
+
+    Con rastreador (uno por cámara), solo se reconocen las pistas nuevas o
+    de similitud ambigua; el resto reutiliza la identidad en caché de su
+    pista y no genera eventos. Las re-validaciones de una pista (identidad
+    ambigua, dudosa o vencida) solo generan evento si la identidad cambió;
+    si la confirman, únicamente se refresca la caché. Las pistas en caché se
+    verifican periódicamente contra su embedding (mismo micro-lote, sin BD)
+    y se reconocen de nuevo si la persona cambió.
+    Retorna lista vacía si el frame no contiene rostros.
+    """
+    try:
+        rostros = await inferencia_pool.detectar_rostros(imagen, perfil)
+    except InferenciaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if rastreador is None:
+        pistas = [None] * len(rostros)
+        pendientes = list(range(len(rostros)))
     else:
-        tipo_acceso = "No Autorizado"
-        id_persona = None
+        ahora = time.monotonic()
+        pistas = rastreador.actualizar([r["bbox"] for r in rostros], ahora)
+        pendientes = [
+            i for i, pista in enumerate(pistas)
+            if rastreador.requiere_reconocimiento(pista, ahora)
+        ]
 
-    # Guardar evento de acceso
-    evento = EventoAcceso(
-        id_camara=id_camara,
-        id_persona=id_persona,
-        tipo_acceso=tipo_acceso,
-        similitud=round(mejor_similitud, 4),
-    )
-    db.add(evento)
+    if not rostros:
+        return []
+
+    verificar = [] if rastreador is None else [
+        i for i, pista in enumerate(pistas)
+        if i not in pendientes and rastreador.requiere_verificacion(pista, ahora)
+    ]
+
+    nuevos: dict = {}
+    if pendientes or verificar:
+        indices = pendientes + verificar
+        alineados = [rostros[i]["alineado"] for i in indices]
+        captura = imagen
+        if pendientes and fuente_alta is not None and isinstance(imagen, np.ndarray):
+            frame_alta = await fuente_alta()
+            if frame_alta is not None:
+                alineados = [
+                    realinear_en_alta(frame_alta, imagen.shape, rostros[i]["kps"], alineado.shape[0])
+                    for i, alineado in zip(indices, alineados)
+                ]
+                captura = frame_alta
 
-    if tipo_acceso == "No Autorizado":
-        embedding_detectado = embedding_nuevo.tolist()
-        ruta_captura = None
         try:
-            directorio_intrusos = os.getenv("DIRECTORIO_INTRUSOS", "capturas_intrusos")
-            os.makedirs(directorio_intrusos, exist_ok=True)
- 
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-            nombre_archivo = f"intruso_{timestamp}.jpg"
-            ruta_captura = os.path.join(directorio_intrusos, nombre_archivo)
- 
-            with open(ruta_captura, "wb") as f:
-                f.write(contenido)
- 
-            registrar_log(
-                db,
-                nivel="INFO",
-                origen="Motor_IA",
-                tipo="Reconocimiento",
-                mensaje=f"Imagen de intruso guardada en: {ruta_captura}",
+            embeddings = dict(zip(indices, await agrupador_reconocimiento.embeber(alineados)))
+        except InferenciaNoDisponible as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        # Pistas en caché cuyo embedding ya no coincide: otra persona tomó la caja
+        cambiadas = [i for i in verificar if not rastreador.verificar(pistas[i], embeddings[i], ahora)]
+        pendientes += cambiadas
+        registrar: List[int] = []
+        if pendientes:
+            coincidencias = dict(zip(
+                pendientes, _buscar_coincidencias(db, [embeddings[i] for i in pendientes])
+            ))
+            for i in pendientes:
+                pista = pistas[i]
+                if (
+                    i not in cambiadas and pista is not None and pista.resultado is not None
+                    and _misma_identidad(rastreador, pista, embeddings[i], coincidencias[i])
+                ):
+                    # Re-validación que confirma la identidad: solo se refresca la caché
+                    similitud = coincidencias[i][1]
+                    resultado = pista.resultado.model_copy(update={"similitud": round(similitud, 4)})
+                    pista.asignar_resultado(resultado, similitud, ahora, embeddings[i])
+                else:
+                    registrar.append(i)
+        if registrar:
+            resultados = await _registrar_identificaciones(
+                db, [embeddings[i] for i in registrar], captura, id_camara,
+                [coincidencias[i] for i in registrar],
+            )
+            for i, resultado in zip(registrar, resultados):
+                nuevos[i] = resultado
+                if pistas[i] is not None:
+                    pistas[i].asignar_resultado(resultado, resultado.similitud, ahora, embeddings[i])
+
+    identificados: List[RostroIdentificado] = []
+    for i, (rostro, pista) in enumerate(zip(rostros, pistas)):
+        resultado = nuevos[i] if i in nuevos else pista.resultado
+        identificados.append(
+            RostroIdentificado(
+                **resultado.model_dump(),
+                bbox=[round(float(v), 1) for v in rostro["bbox"]],
+                det_score=round(rostro["det_score"], 4),
+                id_pista=pista.id_pista if pista is not None else None,
+                reconocido=i in nuevos,
             )
-        except Exception as e_img:
-            registrar_log(
-                db,
-                nivel="WARNING",
-                origen="Motor_IA",
-                tipo="Reconocimiento",
-                mensaje=f"No se pudo guardar la imagen del intruso: {e_img}",
+        )
+    return identificados
+
+
+def _misma_identidad(
+    rastreador: RastreadorRostros,
+    pista: Pista,
+    embedding: np.ndarray,
+    coincidencia: Tuple[Optional[dict], float],
+) -> bool:
+    """True si la re-validación de la pista da la identidad que ya tenía en caché."""
+    persona, similitud = coincidencia
+    id_persona = persona["id_persona"] if persona and similitud >= SIMILITUD_UMBRAL else None
+    if id_persona != pista.resultado.id_persona:
+        return False
+    if id_persona is not None:
+        return True
+    # Todos los intrusos comparten id_persona=None: además debe ser el mismo rostro
+    return (
+        pista.embedding is not None
+        and float(np.dot(embedding, pista.embedding)) >= rastreador.similitud_pista
+    )
+
+
+def validar_origen_lote(db: Session, entradas: Sequence) -> None:
+    """
+    Valida cámara y marca de tiempo de los frames / rostros de un lote remoto
+    (FrameLote, RostroEmbebido) antes de registrar nada: 422 si un ts no es
+    finito o se aleja más de LOTE_TS_TOLERANCIA_SEG del reloj del servidor,
+    o si un id_camara no existe. Sin esto el lote completo fallaría con 500
+    en datetime.fromtimestamp o en la llave foránea de los eventos.
+    """
+    ahora = time.time()
+    for indice, entrada in enumerate(entradas):
+        ts = entrada.ts
+        if ts is not None and not (math.isfinite(ts) and abs(ts - ahora) <= LOTE_TS_TOLERANCIA_SEG):
+            raise HTTPException(
+                status_code=422, detail=f"Marca de tiempo inválida en la entrada #{indice}: {ts}"
             )
-            ruta_captura = None
 
-        pna = PersonaNoAutorizada(
-            embedding_detectado=embedding_detectado,
-            ruta_imagen_captura=ruta_captura,   # ← campo ahora poblado
+    ids_camara = {e.id_camara for e in entradas if e.id_camara is not None}
+    if ids_camara:
+        existentes = {
+            id_camara for (id_camara,) in
+            db.query(Camara.id_camara).filter(Camara.id_camara.in_(ids_camara)).all()
+        }
+        faltantes = sorted(ids_camara - existentes)
+        if faltantes:
+            raise HTTPException(status_code=422, detail=f"Cámaras inexistentes: {faltantes}")
+
+
+async def identificar_lote(
+    db: Session,
+    frames: Sequence[FrameLote],
+    perfiles: Optional[dict] = None,
+) -> ResultadoLote:
+    """
+    Modo multi-rostro para varios frames (de una o varias cámaras) en una
+    sola petición, p. ej. desde equipos remotos:
+      1. detección de todos los frames en paralelo en el pool;
+      2. un micro-lote ArcFace con los rostros de todos los frames;
+      3. una consulta de coincidencias y un solo commit para los eventos.
+    perfiles: {id_camara: perfil de detección}.
+    Los eventos llevan la hora de captura del frame (ts) si se indicó.
+    Un frame con imagen inválida se reporta en su campo error sin afectar al
+    resto; si el pool de inferencia no está disponible no se registra nada
+    (503). Los resultados respetan el orden de envío.
+    """
+    perfiles = perfiles or {}
+    detecciones = await asyncio.gather(
+        *(inferencia_pool.detectar_rostros(f.contenido, perfiles.get(f.id_camara)) for f in frames),
+        return_exceptions=True,
+    )
+    for deteccion in detecciones:
+        if isinstance(deteccion, InferenciaNoDisponible):
+            raise HTTPException(status_code=503, detail=str(deteccion))
+        if isinstance(deteccion, BaseException) and not isinstance(deteccion, ValueError):
+            raise deteccion
+
+    rostros_por_frame = [d if isinstance(d, list) else [] for d in detecciones]
+    try:
+        embeddings = await agrupador_reconocimiento.embeber(
+            [r["alineado"] for rostros in rostros_por_frame for r in rostros]
         )
-        db.add(pna)
+    except InferenciaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    coincidencias = _buscar_coincidencias(db, embeddings) if embeddings else []
 
-    registrar_log(
-        db,
-        nivel="INFO",
-        origen="Motor_IA",
-        tipo="Reconocimiento",
-        mensaje=(
-            f"Evento de acceso generado. tipo={tipo_acceso}, "
-            f"id_persona={id_persona}, camara={id_camara}, similitud={round(mejor_similitud, 4)}"
-        ),
+    # Un solo commit para los eventos de todos los frames
+    registros_por_frame: List[List[_Registro]] = []
+    inicio = 0
+    with _transaccion(db) as tx:
+        for frame, rostros in zip(frames, rostros_por_frame):
+            fin = inicio + len(rostros)
+            momento = datetime.fromtimestamp(frame.ts) if frame.ts else None
+            registros_por_frame.append(
+                _preparar_identificaciones(
+                    db, embeddings[inicio:fin], coincidencias[inicio:fin],
+                    frame.contenido, frame.id_camara, tx, momento,
+                ) if rostros else []
+            )
+            inicio = fin
+
+    resultados: List[ResultadoFrameLote] = []
+    for indice, (frame, deteccion, rostros, registros) in enumerate(
+        zip(frames, detecciones, rostros_por_frame, registros_por_frame)
+    ):
+        identificaciones = await _publicar_identificaciones(db, registros, frame.id_camara)
+        identificados = [
+            RostroIdentificado(
+                **resultado.model_dump(),
+                bbox=[round(float(v), 1) for v in rostro["bbox"]],
+                det_score=round(rostro["det_score"], 4),
+            )
+            for rostro, resultado in zip(rostros, identificaciones)
+        ]
+        resultados.append(
+            ResultadoFrameLote(
+                indice=indice,
+                id_camara=frame.id_camara,
+                ts=frame.ts,
+                total_rostros=len(identificados),
+                rostros=identificados,
+                error=str(deteccion) if isinstance(deteccion, ValueError) else None,
+            )
+        )
+    return ResultadoLote(
+        total_frames=len(resultados),
+        total_rostros=sum(r.total_rostros for r in resultados),
+        frames=resultados,
     )
 
-    db.commit()
-    db.refresh(evento)
 
-    if tipo_acceso == "No Autorizado":
-        try:
-            alerta_ws = notificacion_service.notificar_intrusion(db, evento)
-            await alertas_ws_manager.broadcast_json({
-                "type": "alerta_nueva",
-                "data": alerta_ws,
-            })
-            registrar_log(
-                db,
-                nivel="INFO",
-                origen="Motor_IA",
-                tipo="Notificacion",
-                id_evento=evento.id_evento,
-                mensaje="Notificacion de intrusion disparada correctamente",
-                commit=True,
+async def identificar_embeddings(
+    db: Session, rostros: Sequence[RostroEmbebido]
+) -> ResultadoFrame:
+    """
+    Identifica rostros que un equipo de borde ya detectó y embebió: no hay
+    decodificación ni inferencia, el costo es una búsqueda de coincidencias
+    para todo el lote y un solo commit. El recorte JPEG de cada rostro (si
+    viene) se guarda como captura cuando es intruso. Resultados en orden.
+    """
+    embeddings = [r.embedding for r in rostros]
+    coincidencias = _buscar_coincidencias(db, embeddings) if embeddings else []
+
+    registros_por_rostro: List[List[_Registro]] = []
+    with _transaccion(db) as tx:
+        for rostro, embedding, coincidencia in zip(rostros, embeddings, coincidencias):
+            momento = datetime.fromtimestamp(rostro.ts) if rostro.ts else None
+            registros_por_rostro.append(
+                _preparar_identificaciones(
+                    db, [embedding], [coincidencia], rostro.recorte, rostro.id_camara, tx, momento
+                )
             )
-        except Exception as e:
-            import traceback
-            db.rollback()
-            log_msg = f"Fallo notificacion: {e}\n{traceback.format_exc()}"
-            print(log_msg)
-            registrar_log(
-                db,
-                nivel="ERROR",
-                origen="Motor_IA",
-                tipo="Notificacion",
+
+    identificados: List[RostroIdentificado] = []
+    for rostro, registros in zip(rostros, registros_por_rostro):
+        (resultado,) = await _publicar_identificaciones(db, registros, rostro.id_camara)
+        identificados.append(
+            RostroIdentificado(
+                **resultado.model_dump(),
+                bbox=[round(float(v), 1) for v in rostro.bbox],
+                det_score=round(float(rostro.det_score), 4),
+            )
+        )
+    return ResultadoFrame(total_rostros=len(identificados), rostros=identificados)
+
+
+def _buscar_coincidencias(
+    db: Session, embeddings: Sequence[np.ndarray]
+) -> List[Tuple[Optional[dict], float]]:
+    """
+    Mejor coincidencia para cada embedding.
+    Usa la galería en memoria si está cargada; si no, pgvector. Una fracción
+    GALERIA_VERIFICACION_MUESTREO de las búsquedas se repite en pgvector para
+    detectar divergencias (que provocan una recarga de la galería).
+    """
+    if not galeria.cargada:
+        return _buscar_coincidencias_pgvector(db, embeddings)
+
+    coincidencias = galeria.buscar(embeddings)
+    if VERIFICACION_MUESTREO > 0 and random.random() < VERIFICACION_MUESTREO:
+        referencia = _buscar_coincidencias_pgvector(db, embeddings)
+        for embedding, (p_gal, sim_gal), (p_bd, sim_bd) in zip(embeddings, coincidencias, referencia):
+            if _galeria_desactualizada(db, embedding, p_gal, sim_gal, sim_bd):
+                id_gal = p_gal["id_persona"] if p_gal else None
+                id_bd = p_bd["id_persona"] if p_bd else None
+                log.warning(
+                    f"Galería inconsistente con pgvector: galeria=({id_gal}, {sim_gal:.4f}) "
+                    f"pgvector=({id_bd}, {sim_bd:.4f}). Recargando galería."
+                )
+                galeria.recargar_en_segundo_plano()
+                return referencia
+    return coincidencias
+
+
+def _galeria_desactualizada(
+    db: Session,
+    embedding: np.ndarray,
+    persona_galeria: Optional[dict],
+    sim_galeria: float,
+    sim_bd: float,
+) -> bool:
+    """
+    Decide si una diferencia entre galería y pgvector indica una galería vieja.
+    Ambas guardan float32; la única diferencia legítima es que el índice HNSW
+    es aproximado y puede perder al vecino más cercano, es decir, pgvector
+    puede quedar por debajo de la galería (búsqueda exacta) pero nunca por
+    encima con los mismos datos:
+        - pgvector supera a la galería: a la galería le falta un rostro.
+        - la galería supera a pgvector: fallo de HNSW o un rostro que ya no
+          existe; se confirma con el puntaje exacto (sin índice) de esa persona.
+    """
+    if sim_bd > sim_galeria + _TOLERANCIA_VERIFICACION:
+        return True
+    if persona_galeria is None or sim_galeria <= sim_bd + _TOLERANCIA_VERIFICACION:
+        return False
+    exacta = db.execute(
+        text(
+            """
+            SELECT MAX(1 - (embedding <=> CAST(:consulta AS vector)))
+            FROM rostros_autorizados
+            WHERE id_persona = :id_persona AND embedding IS NOT NULL
+            """
+        ),
+        {"consulta": literal_vector(embedding), "id_persona": persona_galeria["id_persona"]},
+    ).scalar()
+    return exacta is None or abs(float(exacta) - sim_galeria) > _TOLERANCIA_VERIFICACION
+
+
+def _buscar_coincidencias_pgvector(
+    db: Session, embeddings: Sequence[np.ndarray]
+) -> List[Tuple[Optional[dict], float]]:
+    """
+    Mejor coincidencia para cada embedding en una sola ida a la BD:
+    unnest() del lote de consultas + LATERAL con búsqueda k-NN (k=1) sobre
+    el índice HNSW de rostros_autorizados.
+    Retorna, en el mismo orden, (persona | None, similitud).
+    """
+    filas = db.execute(
+        text(
+            """
+            SELECT q.idx, m.id_persona, m.nombre, m.apellidos, m.distancia
+            FROM unnest(CAST(:consultas AS vector[])) WITH ORDINALITY AS q(embedding, idx)
+            LEFT JOIN LATERAL (
+                SELECT p.id_persona, p.nombre, p.apellidos,
+                       r.embedding <=> q.embedding AS distancia
+                FROM rostros_autorizados r
+                JOIN personas_autorizadas p ON p.id_persona = r.id_persona
+                WHERE r.embedding IS NOT NULL
+                ORDER BY r.embedding <=> q.embedding
+                LIMIT 1
+            ) m ON TRUE
+            ORDER BY q.idx
+            """
+        ),
+        {"consultas": literal_vectores(embeddings)},
+    ).all()
+
+    coincidencias: List[Tuple[Optional[dict], float]] = []
+    for _, id_persona, nombre, apellidos, distancia in filas:
+        if id_persona is None:
+            coincidencias.append((None, -1.0))
+            continue
+        persona = {"id_persona": id_persona, "nombre": nombre, "apellidos": apellidos}
+        coincidencias.append((persona, 1.0 - float(distancia)))
+    return coincidencias
+
+
+def _guardar_captura_intruso(db: Session, imagen: Imagen) -> Optional[str]:
+    """
+    Guarda el frame del intruso en disco. Retorna la ruta o None si falla.
+    Los frames de captura llegan como array BGR y se codifican solo aquí.
+    """
+    try:
+        contenido = bgr_a_jpg(imagen) if isinstance(imagen, np.ndarray) else imagen
+        directorio_intrusos = os.getenv("DIRECTORIO_INTRUSOS", "capturas_intrusos")
+        os.makedirs(directorio_intrusos, exist_ok=True)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        nombre_archivo = f"intruso_{timestamp}.jpg"
+        ruta_captura = os.path.join(directorio_intrusos, nombre_archivo)
+
+        with open(ruta_captura, "wb") as f:
+            f.write(contenido)
+
+        registrar_log(
+            db,
+            nivel="INFO",
+            origen="Motor_IA",
+            tipo="Reconocimiento",
+            mensaje=f"Imagen de intruso guardada en: {ruta_captura}",
+        )
+        return ruta_captura
+    except Exception as e_img:
+        registrar_log(
+            db,
+            nivel="WARNING",
+            origen="Motor_IA",
+            tipo="Reconocimiento",
+            mensaje=f"No se pudo guardar la imagen del intruso: {e_img}",
+        )
+        return None
+
+
+async def _notificar_intrusion(
+    db: Session, evento: EventoAcceso, id_intruso: Optional[int] = None
+) -> None:
+    """
+    Crea la alerta, envía SMS y difunde por WebSocket. Nunca lanza.
+    Si el intruso es recurrente, el mensaje WebSocket incluye su historial.
+    """
+    try:
+        alerta_ws = notificacion_service.notificar_intrusion(db, evento)
+        if id_intruso is not None:
+            historial = historial_intruso(db, id_intruso)
+            if historial is not None:
+                alerta_ws["intruso"] = HistorialIntruso(**historial).model_dump(mode="json")
+        await alertas_ws_manager.broadcast_json({
+            "type": "alerta_nueva",
+            "data": alerta_ws,
+        })
+        registrar_log(
+            db,
+            nivel="INFO",
+            origen="Motor_IA",
+            tipo="Notificacion",
+            id_evento=evento.id_evento,
+            mensaje="Notificacion de intrusion disparada correctamente",
+            commit=True,
+        )
+    except Exception as e:
+        import traceback
+        db.rollback()
+        log_msg = f"Fallo notificacion: {e}\n{traceback.format_exc()}"
+        print(log_msg)
+        registrar_log(
+            db,
+            nivel="ERROR",
+            origen="Motor_IA",
+            tipo="Notificacion",
+            id_evento=evento.id_evento,
+            mensaje=log_msg,
+            commit=True,
+        )
+
+
+async def _notificar_avistamiento(id_camara: int, intruso: IntrusoReciente) -> None:
+    """Avisa al panel que un intruso ya alertado sigue a la vista. Nunca lanza."""
+    try:
+        await alertas_ws_manager.broadcast_json({
+            "type": "alerta_actualizada",
+            "data": {
+                "id_evento":     intruso.id_evento,
+                "id_camara":     id_camara,
+                "avistamientos": intruso.avistamientos,
+                "ultimo_avistamiento": datetime.now().isoformat(timespec="seconds"),
+            },
+        })
+    except Exception as e:
+        log.warning(f"No se pudo difundir el avistamiento del evento #{intruso.id_evento}: {e}")
+
+
+async def _registrar_identificaciones(
+    db: Session,
+    embeddings: Sequence[np.ndarray],
+    contenido: Imagen,
+    id_camara: Optional[int],
+    coincidencias: Optional[Sequence[tuple]] = None,
+) -> List[ResultadoReconocimiento]:
+    """
+    Clasifica cada embedding (coincidencias, si el llamador ya las buscó), registra un EventoAcceso por rostro (y su
+    PersonaNoAutorizada si aplica) en una sola transacción y dispara las
+    notificaciones de intrusión. La captura del frame se guarda una sola vez
+    aunque haya varios intrusos en él.
+
+    En cámaras, un intruso que ya está en la ventana de de-duplicación
+    (ver intrusos_service) no genera evento, captura, alerta ni SMS: se suma
+    un avistamiento al evento original.
+    """
+    if coincidencias is None:
+        coincidencias = _buscar_coincidencias(db, embeddings)
+    with _transaccion(db) as tx:
+        registros = _preparar_identificaciones(db, embeddings, coincidencias, contenido, id_camara, tx)
+    return await _publicar_identificaciones(db, registros, id_camara)
+
+
+@dataclass
+class _Transaccion:
+    """Efectos de _preparar_identificaciones que dependen del commit."""
+    ventana: VentanaIntrusos
+    capturas: List[str] = field(default_factory=list)
+    # Avistamientos de intrusos de la ventana global: (entrada, monotonic)
+    avistados: List[Tuple[IntrusoReciente, float]] = field(default_factory=list)
+
+
+@contextmanager
+def _transaccion(db: Session) -> Iterator[_Transaccion]:
+    """
+    Confirma los eventos preparados en el bloque. Tras el commit, los
+    intrusos nuevos entran a la ventana de de-duplicación y se cuentan los
+    avistamientos de los que ya estaban; si algo falla, rollback y se borran
+    las capturas guardadas, de modo que no quedan entradas de la ventana,
+    contadores inflados ni archivos apuntando a eventos inexistentes.
+    """
+    tx = _Transaccion(ventana_intrusos.nueva_pendiente())
+    try:
+        yield tx
+        db.commit()
+    except Exception:
+        db.rollback()
+        for ruta in tx.capturas:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        raise
+    ventana_intrusos.confirmar(tx.ventana, tx.avistados)
+
+
+# Por rostro: (evento nuevo | None, intruso repetido | None, id_intruso, clasificación)
+_Registro = Tuple[Optional[EventoAcceso], Optional[IntrusoReciente], Optional[int], tuple]
+
+
+def _preparar_identificaciones(
+    db: Session,
+    embeddings: Sequence[np.ndarray],
+    coincidencias: Sequence[tuple],
+    contenido: Imagen,
+    id_camara: Optional[int],
+    tx: "_Transaccion",
+    momento: Optional[datetime] = None,
+) -> List[_Registro]:
+    """
+    Agrega a la sesión los eventos de un frame sin confirmar la transacción,
+    para que varios frames (ver identificar_lote) compartan un solo commit.
+    Los efectos fuera de la BD (ventana de intrusos, capturas) se anotan en
+    tx y dependen del resultado del commit (ver _transaccion).
+    momento: hora de captura del frame; sin él, la BD usa la hora actual.
+    """
+    registros: List[_Registro] = []
+    ruta_captura: Optional[str] = None
+    captura_guardada = False
+
+    for embedding_nuevo, (mejor_persona, mejor_similitud) in zip(embeddings, coincidencias):
+        # Clasificar
+        if mejor_persona and mejor_similitud >= SIMILITUD_UMBRAL:
+            tipo_acceso = "Autorizado"
+            id_persona = mejor_persona["id_persona"]
+        else:
+            tipo_acceso = "No Autorizado"
+            id_persona = None
+        clasificacion = (tipo_acceso, mejor_persona, mejor_similitud)
+
+        if tipo_acceso == "No Autorizado" and id_camara is not None:
+            ahora = time.monotonic()
+            repetido = ventana_intrusos.buscar(id_camara, embedding_nuevo, ahora)
+            if repetido is not None:
+                # La entrada global se actualiza tras el commit; el resultado
+                # lleva el conteo con los avistamientos de esta transacción
+                tx.avistados.append((repetido, ahora))
+                propios = sum(1 for entrada, _ in tx.avistados if entrada is repetido)
+                repetido = replace(repetido, avistamientos=repetido.avistamientos + propios)
+            else:
+                # Intrusos nuevos de esta misma transacción (p. ej. frames previos del lote)
+                repetido = tx.ventana.buscar(id_camara, embedding_nuevo, ahora)
+                if repetido is not None:
+                    tx.ventana.avistar(repetido, ahora)
+            if repetido is not None:
+                db.query(EventoAcceso).filter(
+                    EventoAcceso.id_evento == repetido.id_evento
+                ).update(
+                    {
+                        EventoAcceso.avistamientos: EventoAcceso.avistamientos + 1,
+                        # Los frames de un lote pueden llegar desordenados
+                        EventoAcceso.ultimo_avistamiento: func.greatest(
+                            EventoAcceso.ultimo_avistamiento, momento or func.now()
+                        ),
+                    },
+                    synchronize_session=False,
+                )
+                registros.append((None, repetido, repetido.id_intruso, clasificacion))
+                continue
+
+        # Guardar evento de acceso
+        evento = EventoAcceso(
+            id_camara=id_camara,
+            id_persona=id_persona,
+            tipo_acceso=tipo_acceso,
+            similitud=round(mejor_similitud, 4),
+        )
+        if momento is not None:
+            evento.fecha, evento.hora = momento.date(), momento.time()
+            evento.ultimo_avistamiento = momento
+        db.add(evento)
+        id_intruso: Optional[int] = None
+
+        if tipo_acceso == "No Autorizado":
+            if not captura_guardada and contenido is not None:
+                ruta_captura = _guardar_captura_intruso(db, contenido)
+                captura_guardada = True
+                if ruta_captura is not None:
+                    tx.capturas.append(ruta_captura)
+            db.flush()  # id_evento para enlazar la captura
+            pna = PersonaNoAutorizada(
+                embedding_detectado=embedding_nuevo.tolist(),
+                ruta_imagen_captura=ruta_captura,
+                id_camara=id_camara,
                 id_evento=evento.id_evento,
-                mensaje=log_msg,
-                commit=True,
             )
+            if momento is not None:
+                pna.fecha, pna.hora = momento.date(), momento.time()
+            id_intruso, _ = asignar_identidad(db, pna, embedding_nuevo)
+            if id_camara is not None:
+                # Pasa a la ventana global solo si la transacción se confirma
+                tx.ventana.registrar(
+                    id_camara, evento.id_evento, embedding_nuevo, id_intruso=id_intruso
+                )
+        registros.append((evento, None, id_intruso, clasificacion))
+
+        registrar_log(
+            db,
+            nivel="INFO",
+            origen="Motor_IA",
+            tipo="Reconocimiento",
+            mensaje=(
+                f"Evento de acceso generado. tipo={tipo_acceso}, "
+                f"id_persona={id_persona}, camara={id_camara}, similitud={round(mejor_similitud, 4)}"
+            ),
+        )
+    return registros
 
-    return ResultadoReconocimiento(
-        tipo_acceso=tipo_acceso,
-        similitud=round(mejor_similitud, 4),
-        id_persona=mejor_persona.id_persona if mejor_persona and tipo_acceso == "Autorizado" else None,
-        nombre=mejor_persona.nombre if mejor_persona and tipo_acceso == "Autorizado" else None,
-        apellidos=mejor_persona.apellidos if mejor_persona and tipo_acceso == "Autorizado" else None,
-        id_evento=evento.id_evento,
-    )
+
+async def _publicar_identificaciones(
+    db: Session,
+    registros: Sequence[_Registro],
+    id_camara: Optional[int],
+) -> List[ResultadoReconocimiento]:
+    """Tras el commit: notificaciones de intrusión / avistamiento y resultados."""
+    for evento, _, _, _ in registros:
+        if evento is not None:
+            db.refresh(evento)
+
+    for evento, repetido, id_intruso, _ in registros:
+        if repetido is not None:
+            log.debug(
+                f"Intruso repetido en camara {id_camara}: evento #{repetido.id_evento}, "
+                f"{repetido.avistamientos} avistamientos"
+            )
+            await _notificar_avistamiento(id_camara, repetido)
+        elif evento.tipo_acceso == "No Autorizado":
+            await _notificar_intrusion(db, evento, id_intruso)
+
+    resultados: List[ResultadoReconocimiento] = []
+    for evento, repetido, id_intruso, (tipo_acceso, mejor_persona, mejor_similitud) in registros:
+        autorizado = mejor_persona is not None and tipo_acceso == "Autorizado"
+        resultados.append(
+            ResultadoReconocimiento(
+                tipo_acceso=tipo_acceso,
+                similitud=round(mejor_similitud, 4),
+                id_persona=mejor_persona["id_persona"] if autorizado else None,
+                nombre=mejor_persona["nombre"] if autorizado else None,
+                apellidos=mejor_persona["apellidos"] if autorizado else None,
+                id_evento=repetido.id_evento if repetido else evento.id_evento,
+                avistamientos=repetido.avistamientos if repetido else 1,
+                id_intruso=id_intruso,
+            )
+        )
+    return resultados
+
+
+# ─── Intrusos recurrentes ─────────────────────────────────────────────────────
+
+def obtener_historial_intruso(db: Session, id_intruso: int) -> HistorialIntruso:
+    historial = historial_intruso(db, id_intruso)
+    if historial is None:
+        raise HTTPException(status_code=404, detail="Intruso no encontrado")
+    return HistorialIntruso(**historial)
+
+
+async def buscar_intruso(db: Session, imagen: UploadFile) -> HistorialIntruso:
+    """
+    Busca el rostro de la imagen entre los intrusos históricos (índice HNSW)
+    y retorna el historial de la identidad coincidente. No registra eventos.
+    """
+    contenido = await imagen.read()
+    try:
+        embedding = await _embedding_identificacion(contenido)
+    except InferenciaNoDisponible as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    id_intruso, similitud = reidentificar(db, embedding)
+    if id_intruso is None:
+        raise HTTPException(
+            status_code=404, detail="El rostro no coincide con ningún intruso registrado"
+        )
+    historial = historial_intruso(db, id_intruso)
+    db.commit()  # reidentificar puede fijar el id_intruso de capturas antiguas
+    return HistorialIntruso(**historial, similitud=round(similitud, 4))
 
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
 
+async def _embedding_identificacion(contenido: bytes):
+    """
+    Detección en el pool + reconocimiento vía micro-lotes compartidos
+    entre todas las cámaras (ver AgrupadorReconocimiento).
+    """
+    rostros = await inferencia_pool.detectar_rostros(contenido)
+    validar_rostro_unico(rostros)
+    (embedding,) = await agrupador_reconocimiento.embeber([rostros[0]["alineado"]])
+    return embedding
+
+
 def _a_schema(persona: PersonaAutorizada, db: Optional[Session] = None) -> DatosPersonaAutorizada:
     tiene_embedding = False
     if db is not None:
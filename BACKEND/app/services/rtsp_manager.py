@@ -1,7 +1,17 @@
 """
 Servicio de Gestión de Workers RTSP - V-ESCOM
 =============================================
+Motor único de captura: un CameraWorker por cámara, con un solo decodificador
+sin importar cuántas funciones usen sus frames.
+    - Reconocimiento: etapa del propio worker. Varias rutas pueden pedirlo
+      (/rtsp/iniciar, /stream/{id}/iniciar, arranque automático); cada una
+      se registra como "origen" y la cámara se analiza una sola vez.
+    - Vista previa / snapshot / grabación: consumidores enchufables
+      (ver consumidores_camara) que se adjuntan al worker en ejecución.
+El worker se detiene cuando no le quedan orígenes ni consumidores activos.
+
 Usa threading para OpenCV (bloqueante) + asyncio para el análisis de IA.
+La inferencia de InsightFace se delega al pool de procesos (inferencia_service).
 """
 from __future__ import annotations
 
@@ -11,28 +21,80 @@ import os
 import queue
 import threading
 import time
-from typing import Dict, Optional
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
 
-import cv2
+from app.services.captura_proceso import ProcesoCaptura, abrir_captura, probar_captura
+from app.services.consumidores_camara import ConsumidorFrames
+from app.services.estado_camaras import estados_camara
+from app.utils.alta_resolucion import BufferAltaResolucion
+from app.utils.anillo_frames import LecturaAnillo
+from app.utils.backoff import BackoffExponencial
+from app.utils.calidad import BufferMejorFrame, puntuar_frame
+from app.services.vista_previa import VistaPrevia
+from app.utils.movimiento import DetectorMovimiento
 
 log = logging.getLogger("rtsp_manager")
 
 INTERVALO_SEG  = float(os.getenv("RTSP_INTERVALO_SEG", "1"))
-MAX_REINTENTOS = int(os.getenv("RTSP_REINTENTOS", "5"))
-ESPERA_RETRY   = 8
-
 
-def _actualizar_estado_camara(id_camara: int, activa: bool, estado: str) -> None:
+# Reconexión sin límite de intentos: espera exponencial con jitter entre
+# ESPERA_RETRY_SEG y ESPERA_RETRY_MAX_SEG (ver app.utils.backoff)
+ESPERA_RETRY_SEG     = float(os.getenv("RTSP_ESPERA_RETRY_SEG", "2"))
+ESPERA_RETRY_MAX_SEG = float(os.getenv("RTSP_ESPERA_RETRY_MAX_SEG", "60"))
+# Supervisor: segundos sin leer frames de un stream abierto antes de darlo
+# por colgado y reiniciar su captura; periodo de revisión y de escritura
+# por lotes del estado de las cámaras
+WATCHDOG_SEG         = float(os.getenv("RTSP_WATCHDOG_SEG", "20"))
+SUPERVISOR_SEG       = float(os.getenv("RTSP_SUPERVISOR_SEG", "1"))
+
+# Muestreo por movimiento (ver app.utils.movimiento)
+SENSIBILIDAD_MOVIMIENTO  = float(os.getenv("RTSP_SENSIBILIDAD_MOVIMIENTO", "0.5"))
+INTERVALO_MOVIMIENTO_SEG = float(os.getenv("RTSP_INTERVALO_MOVIMIENTO_SEG", "0.33"))
+RETENCION_MOVIMIENTO_SEG = float(os.getenv("RTSP_RETENCION_MOVIMIENTO_SEG", "3"))
+# 0 = en reposo no se analiza nada; >0 = un frame de control cada N segundos
+INTERVALO_REPOSO_SEG     = float(os.getenv("RTSP_INTERVALO_REPOSO_SEG", "0"))
+
+# Frames por segundo que el hilo de captura entrega (retrieve: conversión a
+# BGR y copia); el resto solo pasa por grab(), que con FFmpeg igual decodifica
+# el paquete. 0 = entregar todos. Se puede fijar por cámara.
+FPS_DECODIFICACION       = float(os.getenv("RTSP_FPS_DECODIFICACION", "10"))
+
+# Decodificar cada cámara en su propio proceso (anillo en memoria compartida)
+CAPTURA_PROCESOS         = os.getenv("RTSP_CAPTURA_PROCESOS", "false").lower() == "true"
+
+# Doble stream: detección en el sub-stream, ArcFace y evidencia en el principal
+# (ver app.utils.alta_resolucion). RTSP_URL_ALTA_<id> fuerza la URL principal.
+DOBLE_STREAM        = os.getenv("RTSP_DOBLE_STREAM", "false").lower() == "true"
+STREAM_SUB          = os.getenv("RTSP_STREAM_SUB", "stream2")
+STREAM_PRINCIPAL    = os.getenv("RTSP_STREAM_PRINCIPAL", "stream1")
+ALTA_FPS_MAX        = float(os.getenv("RTSP_ALTA_FPS_MAX", "8"))
+ALTA_BUFFER         = int(os.getenv("RTSP_ALTA_BUFFER", "6"))
+ALTA_TOLERANCIA_SEG = float(os.getenv("RTSP_ALTA_TOLERANCIA_SEG", "0.25"))
+ALTA_ESPERA_SEG     = float(os.getenv("RTSP_ALTA_ESPERA_SEG", "0.5"))
+# Segundos sin movimiento antes de cerrar el stream principal (0 = nunca cerrarlo)
+ALTA_CIERRE_SEG     = float(os.getenv("RTSP_ALTA_CIERRE_SEG", "10"))
+
+# Segundos que se recuerda el resultado de sondear una cámara antes de iniciarla
+SONDEO_TTL_SEG      = float(os.getenv("RTSP_SONDEO_TTL_SEG", "10"))
+
+
+def url_stream_principal(rtsp_url: str) -> Optional[str]:
+    """URL del stream principal a partir de la del sub-stream (.../stream2 → .../stream1)."""
+    base, _, stream = rtsp_url.rpartition("/")
+    if not base or stream != STREAM_SUB:
+        return None
+    return f"{base}/{STREAM_PRINCIPAL}"
+
+
+def _cargar_perfil_camara(id_camara: int) -> Optional[dict]:
     from app.bd import SessionLocal
-    from app.models.camara import Camara
+    from app.services.camara_service import obtener_perfil_deteccion
 
     db = SessionLocal()
     try:
-        camara = db.query(Camara).filter(Camara.id_camara == id_camara).first()
-        if camara is not None:
-            camara.activa = activa
-            camara.estado = estado
-            db.commit()
+        return obtener_perfil_deteccion(db, id_camara)
     finally:
         db.close()
 
@@ -41,138 +103,484 @@ class CameraWorker:
     """
     Worker de captura RTSP.
     - Thread de captura: Lee frames con OpenCV (bloqueante) en hilo separado.
-    - Task asyncio de análisis: Toma frames de la queue y llama a InsightFace.
+      Todos los frames pasan por grab() para drenar la conexión (con FFmpeg
+      grab() ya decodifica el paquete: el costo del códec se paga siempre),
+      pero solo se convierten a BGR y copian (retrieve) los que caben en el
+      presupuesto de fps_decodificacion o los que pide la vista previa; el
+      detector de movimiento, el puntaje de calidad y el análisis trabajan
+      sobre esos, así que el presupuesto ahorra la conversión y todo el
+      trabajo por frame posterior, no la decodificación.
+      Con RTSP_CAPTURA_PROCESOS=true el decodificador corre en un proceso
+      propio y este hilo lee vistas (sin copia) del anillo en memoria
+      compartida; solo se copia el frame que se conserva.
+      Un detector de movimiento decide qué frames van a análisis: nada
+      mientras la escena está quieta y uno cada INTERVALO_MOVIMIENTO_SEG
+      mientras hay movimiento (y RETENCION_MOVIMIENTO_SEG después).
+      Con sensibilidad 0 se vuelve al muestreo fijo cada INTERVALO_SEG.
+      Dentro de cada intervalo se envía el frame de mejor calidad (nitidez y
+      exposición en las zonas de los últimos rostros detectados), no el que
+      coincide con el vencimiento del intervalo.
+    - Thread del stream principal (solo en doble stream): abre el 2K solo
+      mientras hay movimiento (y ALTA_CIERRE_SEG después) y lo cierra en
+      reposo, porque grab() ya lo decodifica; el análisis re-alinea los
+      rostros sobre el frame 2K más cercano en el tiempo.
+    - Task asyncio de análisis: Toma frames de la queue y los envía al pool de inferencia.
+    Las reconexiones no se rinden nunca (espera exponencial con jitter); si
+    un read() se cuelga con el stream abierto, el supervisor de RTSPManager
+    lo detecta por la marca de la última lectura y llama reiniciar_captura().
     """
 
-    def __init__(self, id_camara: int, rtsp_url: str) -> None:
+    def __init__(
+        self,
+        id_camara: int,
+        rtsp_url: str,
+        perfil: Optional[dict] = None,
+        rtsp_url_alta: Optional[str] = None,
+        intervalo_seg: float = INTERVALO_SEG,
+    ) -> None:
         self.id_camara            = id_camara
         self.rtsp_url             = rtsp_url
+        self.rtsp_url_alta        = rtsp_url_alta
+        # Perfil de detección (ROI, det_size, tamaño mínimo, máx. rostros)
+        self.perfil: Optional[dict] = perfil
         self.activo               = False
         self.ultimo_resultado: Optional[dict] = None
         self.ultimo_frame_ts: float = 0.0
         self._frame_queue: queue.Queue = queue.Queue(maxsize=2)
         self._capture_thread: Optional[threading.Thread] = None
+        self._alta_thread: Optional[threading.Thread] = None
+        self._alta: Optional[BufferAltaResolucion] = (
+            BufferAltaResolucion(ALTA_BUFFER, ALTA_FPS_MAX) if rtsp_url_alta else None
+        )
         self._analysis_task: Optional[asyncio.Task] = None
-        self.ultimo_jpg: Optional[bytes] = None
+        # JPEG de vista previa: solo se codifica con espectadores suscritos
+        self.vista = VistaPrevia()
+        # Etapas enchufables que reciben frames decodificados (nombre → consumidor)
+        self._consumidores: Dict[str, ConsumidorFrames] = {self.vista.nombre: self.vista}
+        # Rutas/servicios que pidieron reconocimiento en esta cámara
+        self.origenes: Set[str] = set()
+        # Muestreo fijo cuando el detector de movimiento está desactivado
+        self.intervalo_seg = intervalo_seg
+        self._rastreador = None
+        self.ultimo_movimiento: float = 0.0
+        self.frames_analizados = 0
+        self.frames_leidos = 0
+        self.frames_decodificados = 0
+        # Vistas del anillo sobrescritas mientras se procesaban (modo proceso)
+        self.frames_rasgados = 0
+        self._ultimo_decodificado: float = 0.0
+        self._ultimo_analisis: float = 0.0
+        self._proceso: Optional[ProcesoCaptura] = None
+        # Parada inmediata de las esperas de reconexión
+        self._parada = threading.Event()
+        # Cada reinicio del watchdog abre una generación nueva de captura; un
+        # hilo colgado de la generación anterior sale solo al despertar
+        self._generacion = 0
+        self._reinicio_pedido = False
+        self.conectado = False
+        self.ultima_lectura: float = 0.0
+        self.reinicios_watchdog = 0
+        self._detector = DetectorMovimiento(self._sensibilidad_movimiento())
+        self._mejor_frame = BufferMejorFrame()
+        # Cajas y det_score del último análisis, para puntuar la calidad
+        self._rostros_recientes: list = []
+        self._rostros_recientes_ts: float = 0.0
+        self.ultimo_puntaje_calidad: float = 0.0
+
+    def _rostros_para_calidad(self, ahora: float) -> list:
+        if ahora - self._rostros_recientes_ts > RETENCION_MOVIMIENTO_SEG:
+            return []
+        return self._rostros_recientes
+
+    @property
+    def ultimo_jpg(self) -> Optional[bytes]:
+        return self.vista.jpg
+
+    @property
+    def reconociendo(self) -> bool:
+        return bool(self.origenes)
+
+    # ── Consumidores ──────────────────────────────────────────────────────────
+    def adjuntar_consumidor(self, consumidor: ConsumidorFrames) -> None:
+        anterior = self._consumidores.get(consumidor.nombre)
+        self._consumidores[consumidor.nombre] = consumidor
+        if anterior is not None and anterior is not consumidor:
+            anterior.cerrar()
+
+    def soltar_consumidor(self, nombre: str) -> Optional[ConsumidorFrames]:
+        if nombre == self.vista.nombre:
+            return None
+        consumidor = self._consumidores.pop(nombre, None)
+        if consumidor is not None:
+            consumidor.cerrar()
+        return consumidor
+
+    def consumidor(self, nombre: str) -> Optional[ConsumidorFrames]:
+        return self._consumidores.get(nombre)
+
+    @property
+    def en_uso(self) -> bool:
+        """True si algún origen o consumidor (aparte de la vista previa) lo necesita."""
+        return self.reconociendo or self.vista.activa or len(self._consumidores) > 1
+
+    def _fps_consumidores(self) -> float:
+        return max((c.fps_requerido() for c in tuple(self._consumidores.values())), default=0.0)
+
+    def _sensibilidad_movimiento(self) -> float:
+        valor = (self.perfil or {}).get("sensibilidad_movimiento")
+        return SENSIBILIDAD_MOVIMIENTO if valor is None else float(valor)
+
+    def _fps_decodificacion(self) -> float:
+        valor = (self.perfil or {}).get("fps_decodificacion")
+        return FPS_DECODIFICACION if valor is None else float(valor)
+
+    def _debe_decodificar(self, ahora: float) -> bool:
+        """
+        Decide si el frame recién leído con grab() (ya decodificado por
+        FFmpeg) pasa por retrieve(), es decir, se convierte a BGR y se procesa.
+        """
+        if any(c.requiere_frame(ahora) for c in tuple(self._consumidores.values())):
+            return True
+        if not self.reconociendo:
+            return False
+        presupuesto = self._fps_decodificacion()
+        if presupuesto <= 0:
+            return True
+        return ahora - self._ultimo_decodificado >= 1.0 / presupuesto
+
+    def _intervalo_analisis(self, frame, ahora: float) -> Optional[float]:
+        """Segundos entre análisis para este frame; None = no analizar."""
+        self._detector.ajustar_sensibilidad(self._sensibilidad_movimiento())
+        if not self._detector.habilitado:
+            return self.intervalo_seg
+        if self._detector.hay_movimiento(frame):
+            self.ultimo_movimiento = ahora
+        if ahora - self.ultimo_movimiento <= RETENCION_MOVIMIENTO_SEG:
+            return INTERVALO_MOVIMIENTO_SEG
+        return INTERVALO_REPOSO_SEG if INTERVALO_REPOSO_SEG > 0 else None
 
     # ── Thread de captura (OpenCV) ────────────────────────────────────────────
-    def _capture_loop(self) -> None:
-        """Corre en un thread OS — lee frames y los mete en la queue."""
-        reintentos = 0
-        os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
-
-        while self.activo and reintentos <= MAX_REINTENTOS:
+    def _capture_loop(self, generacion: int) -> None:
+        """
+        Corre en un thread OS. grab() lee y decodifica cada paquete (FFmpeg);
+        retrieve() solo convierte a BGR y copia los frames que pide
+        _debe_decodificar, que luego van a _procesar_frame.
+        """
+        backoff = BackoffExponencial(ESPERA_RETRY_SEG, ESPERA_RETRY_MAX_SEG)
+
+        def vigente() -> bool:
+            return self.activo and generacion == self._generacion
+
+        while vigente():
             log.info(f"[Cam#{self.id_camara}] Conectando a {self.rtsp_url} ...")
-            cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)  # type: ignore
-            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # type: ignore
+            cap = abrir_captura(self.rtsp_url)
 
             if not cap.isOpened():
-                _actualizar_estado_camara(self.id_camara, False, "Desconectada")
-                reintentos += 1
+                cap.release()
+                estados_camara.registrar(self.id_camara, False, "Desconectada")
+                espera = backoff.siguiente()
                 log.warning(
                     f"[Cam#{self.id_camara}] No se pudo abrir stream "
-                    f"(intento {reintentos}/{MAX_REINTENTOS})"
+                    f"(intento {backoff.intentos}); reintentando en {espera:.1f}s"
                 )
-                time.sleep(ESPERA_RETRY)
+                self._parada.wait(espera)
                 continue
 
-            reintentos = 0
-            ultimo_analisis = 0.0
+            self._ultimo_analisis = 0.0
+            self.ultima_lectura = time.monotonic()
+            self.conectado = True
+            estados_camara.registrar(self.id_camara, True, "Activa")
             log.info(f"[Cam#{self.id_camara}] ✓ Stream abierto")
 
-            while self.activo:
-                ret, frame = cap.read()
-                if not ret:
+            while vigente():
+                if not cap.grab():
                     log.warning(f"[Cam#{self.id_camara}] Frame perdido.")
                     break
+                if not vigente():
+                    # El watchdog ya lanzó otra generación mientras grab() colgaba
+                    break
+                ahora = time.monotonic()
+                self.ultima_lectura = ahora
+                self.frames_leidos += 1
+                backoff.reiniciar()
+                if not self._debe_decodificar(ahora):
+                    continue
+                ret, frame = cap.retrieve()
+                if not ret:
+                    log.warning(f"[Cam#{self.id_camara}] Frame no decodificable.")
+                    break
+                self._ultimo_decodificado = ahora
+                self.frames_decodificados += 1
 
                 try:
-                    ok, buf = cv2.imencode(  # type: ignore
-                        ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70]
-                    )
-                    if not ok:
-                        continue
-                    jpg = buf.tobytes()
-
-                    # Siempre actualizar ultimo_jpg para el MJPEG (sin límite de tiempo)
-                    self.ultimo_jpg = jpg
-
-                    # Solo enviar a la queue de análisis cada INTERVALO_SEG
-                    ahora = time.monotonic()
-                    if ahora - ultimo_analisis >= INTERVALO_SEG:
-                        ultimo_analisis = ahora
-                        if self._frame_queue.full():
-                            try:
-                                self._frame_queue.get_nowait()
-                            except queue.Empty:
-                                pass
-                        self._frame_queue.put_nowait(jpg)
-
+                    self._procesar_frame(frame, ahora)
                 except Exception as e:
-                    log.debug(f"[Cam#{self.id_camara}] Error encode: {e}")
+                    log.debug(f"[Cam#{self.id_camara}] Error procesando frame: {e}")
 
             cap.release()
-            if self.activo:
-                reintentos += 1
+            if vigente():
+                self.conectado = False
+                estados_camara.registrar(self.id_camara, False, "Desconectada")
+                espera = backoff.siguiente()
+                log.warning(f"[Cam#{self.id_camara}] Reintentando en {espera:.1f}s ...")
+                self._parada.wait(espera)
+
+        if generacion == self._generacion:
+            self.conectado = False
+            estados_camara.registrar(self.id_camara, False, "Apagada")
+        log.info(f"[Cam#{self.id_camara}] Thread de captura finalizado (generación {generacion}).")
+
+    def _procesar_frame(
+        self, frame, ahora: float, lectura: Optional[LecturaAnillo] = None
+    ) -> None:
+        """
+        Trabajo por frame decodificado: consumidores (vista previa,
+        grabación, ...) y, si algún origen lo pidió, movimiento, calidad y
+        envío a análisis. lectura: frame es una vista del anillo compartido;
+        solo se copia para quien lo conserva (retiene / mejor frame).
+        """
+        copia: Optional[np.ndarray] = None
+        for consumidor in tuple(self._consumidores.values()):
+            if consumidor.requiere_frame(ahora):
+                entrega = frame
+                if lectura is not None and consumidor.retiene:
+                    if copia is None:
+                        copia = lectura.retener()
+                    if copia is None:
+                        continue
+                    entrega = copia
+                try:
+                    consumidor.procesar(entrega, ahora)
+                except Exception as e:
+                    log.debug(f"[Cam#{self.id_camara}] Error en consumidor {consumidor.nombre}: {e}")
+
+        if not self.reconociendo:
+            self._mejor_frame.tomar()
+            return
+
+        # Enviar a la queue de análisis según el movimiento en escena,
+        # eligiendo el mejor frame visto durante el intervalo
+        intervalo = self._intervalo_analisis(frame, ahora)
+        if intervalo is None:
+            # Escena quieta: descartar candidatos viejos
+            self._mejor_frame.tomar()
+            return
+        if self._alta is not None:
+            # Hay movimiento: mantener frames recientes del stream principal
+            # para que el primer análisis con rostros ya encuentre uno
+            self._alta.armar(ahora + RETENCION_MOVIMIENTO_SEG)
+        rostros = self._rostros_para_calidad(ahora)
+        self._mejor_frame.ofrecer(
+            frame, puntuar_frame(frame, rostros), ahora,
+            retener=lectura.retener if lectura is not None else None,
+        )
+        if ahora - self._ultimo_analisis >= intervalo:
+            self._ultimo_analisis = ahora
+            mejor, self.ultimo_puntaje_calidad, ts_mejor = self._mejor_frame.tomar()
+            self.frames_analizados += 1
+            # El análisis recibe el array BGR tal cual (sin JPEG)
+            if self._frame_queue.full():
+                try:
+                    self._frame_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            self._frame_queue.put_nowait((ts_mejor, mejor))
+
+    # ── Proceso de captura (RTSP_CAPTURA_PROCESOS) ────────────────────────────
+    def _capture_proceso_loop(self) -> None:
+        """
+        Variante de _capture_loop con el decodificador en un proceso aparte
+        (ver captura_proceso). Este hilo consume vistas de solo lectura del
+        anillo compartido y solo copia (validando la secuencia) el frame que
+        se conserva; si el proceso muere, ProcesoCaptura lo relanza.
+        """
+        proceso = ProcesoCaptura(
+            self.id_camara,
+            self.rtsp_url,
+            ESPERA_RETRY_SEG,
+            ESPERA_RETRY_MAX_SEG,
+            al_cambiar_estado=lambda activa, estado: estados_camara.registrar(
+                self.id_camara, activa, estado
+            ),
+        )
+        self._proceso = proceso
+        self._ultimo_analisis = 0.0
+        log.info(f"[Cam#{self.id_camara}] Conectando a {self.rtsp_url} (proceso de captura) ...")
+        proceso.iniciar()
+        try:
+            while self.activo:
+                if self._reinicio_pedido:
+                    self._reinicio_pedido = False
+                    proceso.reiniciar()
+                presupuesto = self._fps_decodificacion() if self.reconociendo else 0.0
+                if self.reconociendo and presupuesto <= 0:
+                    proceso.solicitar_fps(0.0)  # todos los frames
+                else:
+                    # Sin demanda se decodifica al mínimo para mantener el anillo vivo
+                    proceso.solicitar_fps(max(presupuesto, self._fps_consumidores(), 0.2))
+                lectura = proceso.siguiente(timeout=1.0)
+                # El hijo cuenta cada grab(): si avanza, el stream está vivo
+                # aunque no se haya pedido decodificar nada
+                if proceso.conectado and not self.conectado:
+                    self.ultima_lectura = time.monotonic()
+                self.conectado = proceso.conectado
+                if proceso.leidos != self.frames_leidos:
+                    self.frames_leidos = proceso.leidos
+                    self.ultima_lectura = time.monotonic()
+                if lectura is None:
+                    continue
+                self.frames_decodificados += 1
+                try:
+                    self._procesar_frame(lectura.frame, lectura.ts, lectura)
+                except Exception as e:
+                    log.debug(f"[Cam#{self.id_camara}] Error procesando frame: {e}")
+                if not lectura.vigente():
+                    # El escritor dio la vuelta mientras se procesaba la vista:
+                    # los consumidores sin copia pudieron ver un frame mezclado
+                    self.frames_rasgados += 1
+        finally:
+            proceso.detener()
+
+        self.conectado = False
+        estados_camara.registrar(self.id_camara, False, "Apagada")
+        log.info(f"[Cam#{self.id_camara}] Consumidor del proceso de captura finalizado.")
+
+    # ── Thread del stream principal (doble stream) ────────────────────────────
+    def _captura_alta_loop(self) -> None:
+        """
+        Abre el stream principal solo mientras el buffer de alta está armado
+        (movimiento en el sub-stream) y lo cierra tras ALTA_CIERRE_SEG sin
+        movimiento: con FFmpeg grab() decodifica cada paquete, así que un 2K
+        abierto en reposo costaría un decodificador de alta resolución
+        permanente. Abierto, lee con grab() para no acumular retraso y solo
+        convierte a BGR y copia (retrieve) hasta ALTA_FPS_MAX.
+        Si el stream principal falla, el análisis sigue con los frames SD.
+        """
+        assert self._alta is not None
+        alta = self._alta
+        backoff = BackoffExponencial(ESPERA_RETRY_SEG, ESPERA_RETRY_MAX_SEG)
+        while self.activo:
+            if not alta.esperar_armado(1.0):
+                continue
+            cap = abrir_captura(self.rtsp_url_alta)
+            if not cap.isOpened():
+                cap.release()
+                espera = backoff.siguiente()
                 log.warning(
-                    f"[Cam#{self.id_camara}] Reintentando en {ESPERA_RETRY}s ..."
+                    f"[Cam#{self.id_camara}] No se pudo abrir el stream principal; "
+                    f"reintentando en {espera:.1f}s"
                 )
-                time.sleep(ESPERA_RETRY)
+                self._parada.wait(espera)
+                continue
 
-        self.activo = False
-        _actualizar_estado_camara(self.id_camara, False, "Apagada")
-        log.info(f"[Cam#{self.id_camara}] Thread de captura finalizado.")
+            alta.abierto = True
+            alta.aperturas += 1
+            log.debug(f"[Cam#{self.id_camara}] Stream principal abierto (movimiento)")
+            ultimo_armado = time.monotonic()
+            fallo = False
+            while self.activo:
+                if not cap.grab():
+                    log.warning(f"[Cam#{self.id_camara}] Frame perdido en stream principal.")
+                    fallo = True
+                    break
+                ahora = time.monotonic()
+                backoff.reiniciar()
+                if alta.requiere_frame(ahora):
+                    ok, frame = cap.retrieve()
+                    if ok:
+                        alta.agregar(ahora, frame)
+                if alta.armado(ahora):
+                    ultimo_armado = ahora
+                elif ALTA_CIERRE_SEG > 0 and ahora - ultimo_armado >= ALTA_CIERRE_SEG:
+                    log.debug(f"[Cam#{self.id_camara}] Stream principal cerrado (reposo)")
+                    break
+
+            cap.release()
+            alta.abierto = False
+            alta.vaciar()
+            if fallo and self.activo:
+                self._parada.wait(backoff.siguiente())
+        log.info(f"[Cam#{self.id_camara}] Thread del stream principal finalizado.")
 
-    # ── Task asyncio de análisis (InsightFace) ────────────────────────────────
+    # ── Task asyncio de análisis (pool de inferencia) ─────────────────────────
     async def _analysis_loop(self) -> None:
-        """Corre en el loop de asyncio — toma frames y llama al servicio de IA."""
+        """
+        Corre en el loop de asyncio — toma frames y llama al servicio de IA.
+        InsightFace corre en el pool de procesos; aquí solo se espera el resultado.
+        """
         from app.bd import SessionLocal
-        from app.services.reconocimiento_service import identificar_rostro
+        from app.services.reconocimiento_service import (
+            crear_rastreador,
+            identificar_rostros_bgr,
+        )
 
+        # Una pista por persona: se reconoce al aparecer y se reutiliza después
+        self._rastreador = crear_rastreador()
         log.info(f"[Cam#{self.id_camara}] Task de análisis iniciada.")
 
         while self.activo:
             # Esperar frame sin bloquear el loop
             try:
-                jpg = await asyncio.get_event_loop().run_in_executor(
+                ts_frame, frame = await asyncio.get_event_loop().run_in_executor(
                     None, lambda: self._frame_queue.get(timeout=2)
                 )
             except queue.Empty:
                 await asyncio.sleep(0.1)
                 continue
 
+            fuente_alta = None
+            if self._alta is not None:
+                alta = self._alta
+                fuente_alta = lambda: alta.obtener(ts_frame, ALTA_TOLERANCIA_SEG, ALTA_ESPERA_SEG)  # noqa: E731
+
             self.ultimo_frame_ts = time.time()
             log.info(f"[Cam#{self.id_camara}] Analizando frame...")
 
-            class _FakeUpload:
-                filename = "frame.jpg"
-                content_type = "image/jpeg"
-                _data = jpg
-
-                async def read(self):
-                    return self._data
-
             db = SessionLocal()
             try:
-                resultado = await identificar_rostro(
-                    db, _FakeUpload(), id_camara=self.id_camara
+                rostros = await identificar_rostros_bgr(
+                    db,
+                    frame,
+                    id_camara=self.id_camara,
+                    perfil=self.perfil,
+                    rastreador=self._rastreador,
+                    fuente_alta=fuente_alta,
+                )
+                self._rostros_recientes = [(r.bbox, r.det_score) for r in rostros]
+                self._rostros_recientes_ts = time.monotonic()
+                if not rostros:
+                    log.debug(f"[Cam#{self.id_camara}] Sin rostro detectable.")
+                    continue
+
+                # Para el panel se resume el frame con el rostro más relevante:
+                # primero intrusos, luego la mayor similitud.
+                principal = max(
+                    rostros,
+                    key=lambda r: (r.tipo_acceso == "No Autorizado", r.similitud),
                 )
                 self.ultimo_resultado = {
-                    "tipo_acceso": resultado.tipo_acceso,
-                    "similitud":   resultado.similitud,
-                    "nombre":      resultado.nombre,
-                    "apellidos":   resultado.apellidos,
-                    "id_evento":   resultado.id_evento,
+                    "tipo_acceso":   principal.tipo_acceso,
+                    "similitud":     principal.similitud,
+                    "nombre":        principal.nombre,
+                    "apellidos":     principal.apellidos,
+                    "id_evento":     principal.id_evento,
+                    "total_rostros": len(rostros),
                 }
-                nivel = "✓" if resultado.tipo_acceso == "Autorizado" else "⚠"
-                log.info(
-                    f"[Cam#{self.id_camara}] {nivel} {resultado.tipo_acceso} "
-                    f"sim={resultado.similitud:.3f} evento=#{resultado.id_evento}"
-                )
+                for resultado in rostros:
+                    if not resultado.reconocido:
+                        continue
+                    nivel = "✓" if resultado.tipo_acceso == "Autorizado" else "⚠"
+                    log.info(
+                        f"[Cam#{self.id_camara}] {nivel} {resultado.tipo_acceso} "
+                        f"sim={resultado.similitud:.3f} evento=#{resultado.id_evento} "
+                        f"pista={resultado.id_pista}"
+                    )
             except Exception as e:
                 msg = str(e)
                 if "422" in msg or "rostro" in msg.lower() or "No se detectó" in msg:
                     log.debug(f"[Cam#{self.id_camara}] Sin rostro detectable.")
+                elif "503" in msg:
+                    log.debug(f"[Cam#{self.id_camara}] Inferencia saturada, frame descartado.")
                 else:
                     import traceback
                     log.warning(f"[Cam#{self.id_camara}] Error en identificación: {e}\n{traceback.format_exc()}")
@@ -186,24 +594,63 @@ class CameraWorker:
         if self.activo:
             return
         self.activo = True
+        self._parada.clear()
 
         # Arrancar thread de captura
-        self._capture_thread = threading.Thread(
-            target=self._capture_loop,
-            name=f"rtsp-cam-{self.id_camara}",
-            daemon=True,
-        )
-        self._capture_thread.start()
+        self._lanzar_captura()
+        if self._alta is not None:
+            self._alta_thread = threading.Thread(
+                target=self._captura_alta_loop,
+                name=f"rtsp-cam-{self.id_camara}-alta",
+                daemon=True,
+            )
+            self._alta_thread.start()
 
         # Arrancar task de análisis en el loop actual
         self._analysis_task = asyncio.create_task(self._analysis_loop())
         await asyncio.sleep(0)  # ceder control para que la task arranque
         log.info(f"[Cam#{self.id_camara}] Worker completo iniciado.")
 
+    def _lanzar_captura(self) -> None:
+        if CAPTURA_PROCESOS:
+            objetivo, argumentos = self._capture_proceso_loop, ()
+        else:
+            objetivo, argumentos = self._capture_loop, (self._generacion,)
+        self._capture_thread = threading.Thread(
+            target=objetivo,
+            args=argumentos,
+            name=f"rtsp-cam-{self.id_camara}-g{self._generacion}",
+            daemon=True,
+        )
+        self._capture_thread.start()
+
+    def captura_colgada(self, ahora: float) -> bool:
+        """True si el stream está abierto pero no entrega frames hace WATCHDOG_SEG."""
+        return self.activo and self.conectado and ahora - self.ultima_lectura > WATCHDOG_SEG
+
+    def reiniciar_captura(self) -> None:
+        """
+        Abandona una captura colgada. En modo proceso se mata y relanza el
+        proceso; en modo hilo no se puede interrumpir un read() de OpenCV, así
+        que se lanza un hilo de una generación nueva y el anterior termina
+        (soltando su VideoCapture) cuando el read() retorne.
+        """
+        self.reinicios_watchdog += 1
+        self.conectado = False
+        estados_camara.registrar(self.id_camara, False, "Desconectada")
+        if CAPTURA_PROCESOS:
+            self._reinicio_pedido = True
+            return
+        self._generacion += 1
+        self._lanzar_captura()
+
     def detener(self) -> None:
         self.activo = False
+        self._parada.set()
         if self._analysis_task:
             self._analysis_task.cancel()
+        for nombre in list(self._consumidores):
+            self.soltar_consumidor(nombre)
         # El thread se detendrá solo al ver activo=False
         log.info(f"[Cam#{self.id_camara}] Worker detenido.")
 
@@ -214,23 +661,207 @@ class RTSPManager:
     def __init__(self) -> None:
         self._workers: Dict[int, CameraWorker] = {}
         self._token: str = ""
+        # { id_camara: (url, accesible, monotonic) }
+        self._sondeos: Dict[int, Tuple[str, bool, float]] = {}
+        self._sondeos_en_curso: Dict[Tuple[int, str], asyncio.Future] = {}
+        # Serializa los arranques/reinicios de cada cámara
+        self._bloqueos: Dict[int, asyncio.Lock] = {}
+        self._supervisor: Optional[asyncio.Task] = None
+        # Auto-arranque de cámaras, en espera de la fase de arranque del motor
+        self._arranque: Optional[asyncio.Task] = None
 
     def set_token(self, token: str) -> None:
         self._token = token
 
-    async def iniciar_camara(self, id_camara: int, rtsp_url: str) -> None:
-        if id_camara in self._workers:
-            self._workers[id_camara].detener()
+    # ── Supervisor ────────────────────────────────────────────────────────────
+    def _asegurar_supervisor(self) -> None:
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = asyncio.create_task(self._supervisar())
+
+    async def _supervisar(self) -> None:
+        """
+        Cada SUPERVISOR_SEG: reinicia las capturas colgadas (stream abierto
+        sin lecturas hace WATCHDOG_SEG) y vuelca en una sola transacción los
+        cambios de estado que reportaron los hilos de captura.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            ahora = time.monotonic()
+            for worker in list(self._workers.values()):
+                if worker.captura_colgada(ahora):
+                    log.warning(
+                        f"[Cam#{worker.id_camara}] Sin frames hace "
+                        f"{ahora - worker.ultima_lectura:.0f}s con el stream abierto; "
+                        f"reiniciando captura"
+                    )
+                    worker.reiniciar_captura()
+            if estados_camara.pendientes:
+                try:
+                    await loop.run_in_executor(None, estados_camara.vaciar)
+                except Exception as e:
+                    log.warning(f"Supervisor: error al escribir estados: {e}")
+            await asyncio.sleep(SUPERVISOR_SEG)
+
+    def obtener_worker(self, id_camara: int) -> Optional[CameraWorker]:
+        """Worker en ejecución de la cámara, o None."""
+        worker = self._workers.get(id_camara)
+        return worker if worker is not None and worker.activo else None
+
+    async def sondear_camara(self, id_camara: int, rtsp_url: str) -> bool:
+        """
+        True si la cámara entrega frames. El intento corre en un hilo (con
+        los plazos de abrir_captura) para no congelar el event loop; el
+        resultado se recuerda SONDEO_TTL_SEG y los sondeos simultáneos de la
+        misma cámara comparten un solo intento.
+        """
+        worker = self.obtener_worker(id_camara)
+        if worker is not None and worker.rtsp_url == rtsp_url and worker.frames_decodificados:
+            return True
+
+        ahora = time.monotonic()
+        cache = self._sondeos.get(id_camara)
+        if cache is not None and cache[0] == rtsp_url and ahora - cache[2] < SONDEO_TTL_SEG:
+            return cache[1]
+
+        clave = (id_camara, rtsp_url)
+        en_curso = self._sondeos_en_curso.get(clave)
+        if en_curso is None:
+            en_curso = asyncio.get_event_loop().run_in_executor(None, probar_captura, rtsp_url)
+            self._sondeos_en_curso[clave] = en_curso
+
+            def _guardar(futuro: asyncio.Future) -> None:
+                self._sondeos_en_curso.pop(clave, None)
+                if not futuro.cancelled() and futuro.exception() is None:
+                    self._sondeos[id_camara] = (rtsp_url, futuro.result(), time.monotonic())
+
+            en_curso.add_done_callback(_guardar)
+        # shield: si el cliente se desconecta, el sondeo sigue para los demás
+        return await asyncio.shield(en_curso)
+
+    async def iniciar_camara(
+        self,
+        id_camara: int,
+        rtsp_url: str,
+        rtsp_url_alta: Optional[str] = None,
+        origen: str = "rtsp",
+        intervalo_seg: Optional[float] = None,
+    ) -> CameraWorker:
+        """
+        Adjunta `origen` como usuario del reconocimiento de la cámara.
+        Si ya hay un worker con la misma URL, se reutiliza (un solo
+        decodificador); si la URL cambió, se reinicia conservando sus
+        orígenes y consumidores.
+
+        rtsp_url_alta: stream principal para el modo doble stream. Si no se
+        indica, se usa RTSP_URL_ALTA_<id> o, con RTSP_DOBLE_STREAM=true, la
+        URL derivada del sub-stream.
+        intervalo_seg: muestreo fijo sin detector de movimiento; con varios
+        orígenes se usa el menor.
+
+        Los arranques de una misma cámara se serializan: entre que se retira
+        el worker anterior y se registra el nuevo hay awaits, y dos llamadas
+        simultáneas crearían dos workers sobre el mismo stream.
+        """
+        bloqueo = self._bloqueos.setdefault(id_camara, asyncio.Lock())
+        async with bloqueo:
+            return await self._iniciar_camara(
+                id_camara, rtsp_url, rtsp_url_alta, origen, intervalo_seg
+            )
+
+    async def _iniciar_camara(
+        self,
+        id_camara: int,
+        rtsp_url: str,
+        rtsp_url_alta: Optional[str],
+        origen: str,
+        intervalo_seg: Optional[float],
+    ) -> CameraWorker:
+        rtsp_url_alta = rtsp_url_alta or os.getenv(f"RTSP_URL_ALTA_{id_camara}")
+        if not rtsp_url_alta and DOBLE_STREAM:
+            rtsp_url_alta = url_stream_principal(rtsp_url)
+
+        actual = self.obtener_worker(id_camara)
+        if actual is not None and actual.rtsp_url == rtsp_url and (
+            not rtsp_url_alta or actual.rtsp_url_alta == rtsp_url_alta
+        ):
+            actual.origenes.add(origen)
+            if intervalo_seg is not None:
+                actual.intervalo_seg = min(actual.intervalo_seg, intervalo_seg)
+            log.info(f"[Cam#{id_camara}] '{origen}' adjuntado al worker existente")
+            return actual
+
+        origenes: Set[str] = {origen}
+        consumidores: list = []
+        anterior = self._workers.pop(id_camara, None)
+        if anterior is not None:
+            origenes |= anterior.origenes
+            consumidores = [
+                c for c in anterior._consumidores.values() if c is not anterior.vista
+            ]
+            # Los consumidores pasan al worker nuevo sin cerrarse
+            anterior._consumidores = {anterior.vista.nombre: anterior.vista}
+            anterior.detener()
             await asyncio.sleep(0.5)  # dar tiempo para limpiar
-        worker = CameraWorker(id_camara, rtsp_url)
+
+        self._asegurar_supervisor()
+        perfil = await asyncio.get_event_loop().run_in_executor(
+            None, _cargar_perfil_camara, id_camara
+        )
+        worker = CameraWorker(
+            id_camara, rtsp_url, perfil, rtsp_url_alta,
+            intervalo_seg=INTERVALO_SEG if intervalo_seg is None else intervalo_seg,
+        )
+        worker.origenes = origenes
+        for consumidor in consumidores:
+            worker.adjuntar_consumidor(consumidor)
         self._workers[id_camara] = worker
         await worker.iniciar_async(self._token)
+        return worker
+
+    def soltar_origen(self, id_camara: int, origen: str) -> bool:
+        """
+        Retira `origen` del reconocimiento de la cámara. El worker se detiene
+        si ya nadie lo usa. Retorna False si el origen no estaba adjunto.
+        """
+        worker = self._workers.get(id_camara)
+        if worker is None or origen not in worker.origenes:
+            return False
+        worker.origenes.discard(origen)
+        self._detener_si_libre(id_camara)
+        return True
+
+    def adjuntar_consumidor(self, id_camara: int, consumidor: ConsumidorFrames) -> bool:
+        """Enchufa un consumidor al worker en ejecución. False si no hay worker."""
+        worker = self.obtener_worker(id_camara)
+        if worker is None:
+            return False
+        worker.adjuntar_consumidor(consumidor)
+        return True
+
+    def soltar_consumidor(self, id_camara: int, nombre: str) -> Optional[ConsumidorFrames]:
+        worker = self._workers.get(id_camara)
+        if worker is None:
+            return None
+        consumidor = worker.soltar_consumidor(nombre)
+        self._detener_si_libre(id_camara)
+        return consumidor
+
+    def _detener_si_libre(self, id_camara: int) -> None:
+        worker = self._workers.get(id_camara)
+        if worker is not None and not worker.en_uso:
+            self.detener_camara(id_camara)
+
+    def actualizar_perfil(self, id_camara: int, perfil: Optional[dict]) -> None:
+        """Aplica un perfil de detección editado a un worker en ejecución."""
+        worker = self._workers.get(id_camara)
+        if worker is not None:
+            worker.perfil = perfil
 
     def detener_camara(self, id_camara: int) -> None:
         if id_camara in self._workers:
             self._workers[id_camara].detener()
             del self._workers[id_camara]
-            _actualizar_estado_camara(id_camara, False, "Apagada")
+            estados_camara.registrar(id_camara, False, "Apagada")
 
     def detener_todas(self) -> None:
         for w in self._workers.values():
@@ -243,8 +874,36 @@ class RTSPManager:
                 "id_camara":          wid,
                 "activo":             w.activo,
                 "rtsp_url":           w.rtsp_url,
+                "rtsp_url_alta":      w.rtsp_url_alta,
+                "origenes":           sorted(w.origenes),
+                "consumidores":       {
+                    nombre: c.estado()
+                    for nombre, c in tuple(w._consumidores.items())
+                    if c is not w.vista
+                },
                 "ultimo_frame_ts":    w.ultimo_frame_ts,
                 "ultimo_resultado":   w.ultimo_resultado,
+                "perfil":             w.perfil,
+                "en_movimiento":      (
+                    time.monotonic() - w.ultimo_movimiento <= RETENCION_MOVIMIENTO_SEG
+                ),
+                "conectado":          w.conectado,
+                "seg_sin_lectura":    (
+                    round(time.monotonic() - w.ultima_lectura, 1) if w.conectado else None
+                ),
+                "reinicios_watchdog": w.reinicios_watchdog,
+                "frames_analizados":  w.frames_analizados,
+                "frames_leidos":      w.frames_leidos,
+                "frames_decodificados": w.frames_decodificados,
+                "frames_rasgados":      w.frames_rasgados,
+                "fps_decodificacion": w._fps_decodificacion(),
+                "calidad_ultimo_frame": round(w.ultimo_puntaje_calidad, 3),
+                "vista_previa":       w.vista.estado(),
+                "proceso_captura":    w._proceso.estado() if w._proceso else None,
+                "alta_resolucion":    w._alta.estado() if w._alta else None,
+                "pistas_activas":     (
+                    w._rastreador.pistas_activas() if w._rastreador else 0
+                ),
             }
             for wid, w in self._workers.items()
         ]
@@ -252,12 +911,34 @@ class RTSPManager:
     def inicializar(self, app) -> None:  # type: ignore[type-arg]
         @app.on_event("startup")
         async def _startup() -> None:
-            await self._arrancar_camaras_activas()
+            self._asegurar_supervisor()
+            self._arranque = asyncio.get_running_loop().create_task(
+                self._arrancar_tras_preparacion()
+            )
 
         @app.on_event("shutdown")
         async def _shutdown() -> None:
+            if self._supervisor is not None:
+                self._supervisor.cancel()
+            if self._arranque is not None:
+                self._arranque.cancel()
+            # Se vuelca antes de detener: el "Apagada" de los hilos que salen
+            # no debe llegar a la BD, o el próximo arranque no las levantaría
+            await asyncio.get_event_loop().run_in_executor(None, estados_camara.vaciar)
             self.detener_todas()
 
+    async def _arrancar_tras_preparacion(self) -> None:
+        """Auto-arranque de cámaras una vez que el motor está listo."""
+        from app.services import arranque_service
+
+        if not await arranque_service.esperar_listo():
+            log.error(
+                "Fase de arranque fallida: no se auto-arrancan cámaras "
+                "(ver GET /listo); se pueden iniciar manualmente al corregirla."
+            )
+            return
+        await self._arrancar_camaras_activas()
+
     async def _arrancar_camaras_activas(self) -> None:
         """Auto-arranca workers para cámaras activas con IP configurada."""
         from app.bd import SessionLocal
@@ -288,15 +969,15 @@ class RTSPManager:
                     user = os.getenv("RTSP_USER", "admin")
                     pwd  = os.getenv("RTSP_PASS", "")
                     rtsp_url = (
-                        f"rtsp://{user}:{pwd}@{cam.direccion_ip}:554/stream2"
+                        f"rtsp://{user}:{pwd}@{cam.direccion_ip}:554/{STREAM_SUB}"
                         if pwd else
-                        f"rtsp://{cam.direccion_ip}:554/stream2"
+                        f"rtsp://{cam.direccion_ip}:554/{STREAM_SUB}"
                     )
                 if rtsp_url:
                     log.info(
                         f"Auto-arrancando cámara #{cam.id_camara} → {rtsp_url}"
                     )
-                    await self.iniciar_camara(cam.id_camara, rtsp_url)
+                    await self.iniciar_camara(cam.id_camara, rtsp_url, origen="arranque")
 
         except Exception as e:
             log.error(f"Error al arrancar workers: {e}")
@@ -0,0 +1,136 @@
+"""
+Vista Previa de Cámaras - V-ESCOM
+=================================
+Codificación JPEG bajo demanda para /rtsp/mjpeg y /rtsp/snapshot.
+
+El hilo de captura solo codifica mientras haya suscriptores:
+    - A la mayor tasa (fps) pedida por cualquiera de ellos.
+    - Al mayor ancho pedido (reducido con INTER_AREA), acotado por
+      PREVIA_ANCHO_MAX; sin ancho explícito se usa la resolución nativa.
+    - Un único JPEG por frame, compartido por todos los espectadores.
+Sin suscriptores no se codifica nada.
+
+Cada JPEG se publica en un DifusorFrames: los clientes MJPEG esperan la
+siguiente versión en lugar de consultar la ranura periódicamente.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.consumidores_camara import ConsumidorFrames
+from app.utils.difusion import DifusorFrames
+
+PREVIA_FPS_DEFECTO = float(os.getenv("PREVIA_FPS", "15"))
+PREVIA_ANCHO_MAX   = int(os.getenv("PREVIA_ANCHO_MAX", "0"))      # 0 = sin límite
+PREVIA_CALIDAD     = int(os.getenv("PREVIA_CALIDAD_JPEG", "70"))
+
+
+class VistaPrevia(ConsumidorFrames):
+    """Suscripciones de espectadores y último JPEG de una cámara."""
+
+    nombre = "vista_previa"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # id → (fps, ancho | None)
+        self._suscriptores: Dict[int, Tuple[float, Optional[int]]] = {}
+        self._ultima_codificacion = 0.0
+        self.difusor: DifusorFrames[bytes] = DifusorFrames()
+        self.jpg_ts: float = 0.0
+        self.codificados = 0
+
+    @property
+    def jpg(self) -> Optional[bytes]:
+        return self.difusor.datos
+
+    @property
+    def version(self) -> int:
+        return self.difusor.version
+
+    # ── Suscripciones ─────────────────────────────────────────────────────────
+    def suscribir(self, fps: float = PREVIA_FPS_DEFECTO, ancho: Optional[int] = None) -> int:
+        with self._lock:
+            id_suscriptor = next(self._ids)
+            self._suscriptores[id_suscriptor] = (max(fps, 0.1), ancho)
+            return id_suscriptor
+
+    def desuscribir(self, id_suscriptor: int) -> None:
+        with self._lock:
+            self._suscriptores.pop(id_suscriptor, None)
+            vacia = not self._suscriptores
+        if vacia:
+            # Un espectador nuevo no debe recibir un frame viejo
+            self.difusor.publicar(None)
+
+    @property
+    def activa(self) -> bool:
+        return bool(self._suscriptores)
+
+    def _parametros(self) -> Optional[Tuple[float, Optional[int]]]:
+        with self._lock:
+            if not self._suscriptores:
+                return None
+            fps = max(f for f, _ in self._suscriptores.values())
+            anchos = [a for _, a in self._suscriptores.values()]
+        ancho = None if any(a is None for a in anchos) else max(anchos)
+        if PREVIA_ANCHO_MAX > 0:
+            ancho = min(ancho or PREVIA_ANCHO_MAX, PREVIA_ANCHO_MAX)
+        return fps, ancho
+
+    # ── Hilo de captura ───────────────────────────────────────────────────────
+    def fps_requerido(self) -> float:
+        """Mayor fps pedido por los espectadores (0 sin espectadores)."""
+        parametros = self._parametros()
+        return parametros[0] if parametros is not None else 0.0
+
+    def requiere_frame(self, ahora: float) -> bool:
+        """True si un frame leído ahora se codificaría (el hilo debe decodificarlo)."""
+        parametros = self._parametros()
+        return parametros is not None and ahora - self._ultima_codificacion >= 1.0 / parametros[0]
+
+    def publicar_si_toca(self, frame: np.ndarray, ahora: Optional[float] = None) -> bool:
+        """
+        Codifica el frame si hay espectadores y ya pasó 1/fps desde el último.
+        Retorna True si se publicó un JPEG nuevo.
+        """
+        parametros = self._parametros()
+        if parametros is None:
+            return False
+        ahora = time.monotonic() if ahora is None else ahora
+        fps, ancho = parametros
+        if ahora - self._ultima_codificacion < 1.0 / fps:
+            return False
+
+        alto_nativo, ancho_nativo = frame.shape[:2]
+        if ancho and ancho < ancho_nativo:
+            alto = max(1, int(alto_nativo * ancho / ancho_nativo))
+            frame = cv2.resize(frame, (ancho, alto), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, PREVIA_CALIDAD])
+        if not ok:
+            return False
+
+        self._ultima_codificacion = ahora
+        self.jpg_ts = time.time()
+        self.codificados += 1
+        self.difusor.publicar(buf.tobytes())
+        return True
+
+    def procesar(self, frame: np.ndarray, ahora: float) -> None:
+        self.publicar_si_toca(frame, ahora)
+
+    def estado(self) -> dict:
+        with self._lock:
+            suscriptores = len(self._suscriptores)
+        return {
+            "espectadores": suscriptores,
+            "jpg_codificados": self.codificados,
+            "version": self.version,
+        }
@@ -0,0 +1,140 @@
+"""
+Frames del stream principal para cámaras en modo doble stream.
+
+La detección corre sobre el sub-stream (SD, barato); el stream principal
+(2K) solo se usa para los rostros encontrados:
+    - El buffer se "arma" mientras hay movimiento en el sub-stream (y
+      RETENCION_MOVIMIENTO_SEG después) o cuando el análisis pide un frame.
+      Armar con el movimiento, y no con los rostros ya reconocidos, deja
+      frames de alta listos para la primera detección.
+    - El hilo del stream principal solo tiene la conexión abierta mientras
+      el buffer está armado (y RTSP_ALTA_CIERRE_SEG después): con FFmpeg,
+      grab() decodifica cada paquete, así que mantenerlo abierto en reposo
+      decodificaría el 2K de forma continua. Abierto, hace grab() de cada
+      paquete y retrieve() (conversión a BGR) solo hasta ALTA_FPS_MAX.
+      El costo es la latencia de reapertura (conexión RTSP + siguiente
+      fotograma clave) al empezar cada episodio de movimiento; mientras
+      tanto el análisis usa los frames SD.
+    - El análisis pide el frame de alta con la marca de tiempo más cercana
+      a la del frame SD donde detectó los rostros; si todavía no hay uno
+      dentro de la tolerancia, arma el buffer y espera el siguiente.
+Las marcas de tiempo son time.monotonic() al leer cada frame, comparables
+entre ambos hilos de captura de la misma cámara.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+import numpy as np
+
+from app.utils.difusion import DifusorFrames
+
+
+class BufferAltaResolucion:
+    """Últimos frames BGR del stream principal con su marca de tiempo."""
+
+    def __init__(self, capacidad: int, fps_max: float) -> None:
+        self._lock = threading.Lock()
+        self._frames: Deque[Tuple[float, np.ndarray]] = deque(maxlen=max(1, capacidad))
+        self._armado_hasta = 0.0
+        self._evento_armado = threading.Event()
+        self._ultimo_decodificado = 0.0
+        self._intervalo = 1.0 / fps_max if fps_max > 0 else 0.0
+        # Avisa (con la marca de tiempo) cada frame nuevo a quien espera
+        self.difusor: DifusorFrames[float] = DifusorFrames()
+        self.decodificados = 0
+        self.abierto = False
+        self.aperturas = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    # ── Hilo del stream principal ─────────────────────────────────────────────
+    def armar(self, hasta: float) -> None:
+        """Decodificar frames de alta hasta el instante monotónico `hasta`."""
+        with self._lock:
+            self._armado_hasta = max(self._armado_hasta, hasta)
+            self._evento_armado.set()
+
+    def armado(self, ahora: float) -> bool:
+        return ahora < self._armado_hasta
+
+    def esperar_armado(self, timeout: float) -> bool:
+        """Bloquea hasta que el buffer se arme o venza el timeout. True si está armado."""
+        self._evento_armado.wait(timeout)
+        with self._lock:
+            armado = time.monotonic() < self._armado_hasta
+            if not armado:
+                self._evento_armado.clear()
+        return armado
+
+    def requiere_frame(self, ahora: float) -> bool:
+        """True si el frame recién leído con grab() debe convertirse a BGR (retrieve())."""
+        return (
+            ahora < self._armado_hasta
+            and ahora - self._ultimo_decodificado >= self._intervalo
+        )
+
+    def agregar(self, ts: float, frame: np.ndarray) -> None:
+        with self._lock:
+            self._frames.append((ts, frame))
+            self._ultimo_decodificado = ts
+            self.decodificados += 1
+        self.difusor.publicar(ts)
+
+    def vaciar(self) -> None:
+        with self._lock:
+            self._frames.clear()
+
+    # ── Análisis ──────────────────────────────────────────────────────────────
+    def cercano(self, ts: float, tolerancia: float) -> Optional[np.ndarray]:
+        """Frame con la marca más cercana a ts, o None si ninguno cae en la tolerancia."""
+        with self._lock:
+            mejor = min(self._frames, key=lambda f: abs(f[0] - ts), default=None)
+        if mejor is None or abs(mejor[0] - ts) > tolerancia:
+            return None
+        return mejor[1]
+
+    async def obtener(self, ts: float, tolerancia: float, espera: float) -> Optional[np.ndarray]:
+        """
+        Frame de alta para un frame SD capturado en ts. Si no hay uno en el
+        buffer, lo arma y espera hasta `espera` segundos un frame dentro de
+        la tolerancia. None si no llega (se usa el frame SD).
+        """
+        frame = self.cercano(ts, tolerancia)
+        if frame is None:
+            ahora = time.monotonic()
+            self.armar(ahora + espera)
+            version = self.difusor.version
+            limite = ahora + espera
+            while frame is None:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                ts_nuevo, version = await self.difusor.esperar(version, timeout=restante)
+                if ts_nuevo is None:
+                    break
+                frame = self.cercano(ts, tolerancia)
+                if frame is None and ts_nuevo > ts + tolerancia:
+                    # Los frames nuevos ya quedaron fuera de la tolerancia
+                    break
+
+        if frame is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return frame
+
+    def estado(self) -> dict:
+        with self._lock:
+            en_buffer = len(self._frames)
+        return {
+            "abierto":       self.abierto,
+            "aperturas":     self.aperturas,
+            "decodificados": self.decodificados,
+            "en_buffer":     en_buffer,
+            "aciertos":      self.aciertos,
+            "fallos":        self.fallos,
+        }
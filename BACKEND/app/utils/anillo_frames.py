@@ -0,0 +1,166 @@
+"""
+Anillo de frames en memoria compartida entre un proceso de captura y la API.
+
+Distribución del segmento (multiprocessing.shared_memory):
+    [seq por ranura: int64 × N][ts por ranura: float64 × N][escrito: int64]
+    [relleno hasta 64 bytes][frame 0][frame 1] ... [frame N-1]
+Todos los frames tienen la misma forma (alto, ancho, 3) uint8; si el stream
+cambia de resolución, el proceso de captura crea un anillo nuevo.
+
+Protocolo (un solo escritor):
+    - El escritor marca la ranura con seq = -1, copia el frame, escribe su
+      ts y publica seq; al final actualiza `escrito`.
+    - El lector recibe la secuencia por la tubería de control y toma una
+      vista de solo lectura de la ranura, sin copiarla (vista()). Los
+      consumidores trabajan sobre la vista; solo quien conserva el frame
+      (el mejor frame del intervalo, consumidores con retiene=True) toma
+      una copia y vuelve a comprobar la secuencia después (seqlock): si el
+      escritor dio la vuelta mientras se copiaba, la copia se descarta.
+      Una vista cuya ranura se reutilizó durante el procesamiento se
+      detecta con vigente() al terminar. Los pixeles no pasan por la
+      tubería.
+
+El proceso de la API es el dueño del ciclo de vida: el escritor crea el
+segmento y lo desregistra de su resource_tracker, y la API lo destruye
+(destruir()) cuando el proceso de captura termina o anuncia otro anillo.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+ALINEACION = 64
+
+
+def _tamano_cabecera(ranuras: int) -> int:
+    crudo = 16 * ranuras + 8
+    return (crudo + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+class AnilloFrames:
+    """Ranuras de frames BGR con número de secuencia en memoria compartida."""
+
+    def __init__(
+        self,
+        shm: shared_memory.SharedMemory,
+        ranuras: int,
+        forma: Tuple[int, int, int],
+        escritor: bool,
+    ) -> None:
+        self._shm = shm
+        self.nombre = shm.name
+        self.ranuras = ranuras
+        self.forma = tuple(forma)
+        self.escritor = escritor
+        buf = shm.buf
+        self._seqs = np.ndarray((ranuras,), dtype=np.int64, buffer=buf, offset=0)
+        self._ts = np.ndarray((ranuras,), dtype=np.float64, buffer=buf, offset=8 * ranuras)
+        self._escrito = np.ndarray((1,), dtype=np.int64, buffer=buf, offset=16 * ranuras)
+        self._frames = np.ndarray(
+            (ranuras, *self.forma), dtype=np.uint8, buffer=buf, offset=_tamano_cabecera(ranuras)
+        )
+        if not escritor:
+            self._frames.flags.writeable = False
+
+    # ── Creación / conexión ───────────────────────────────────────────────────
+    @classmethod
+    def crear(cls, nombre: str, ranuras: int, forma: Tuple[int, int, int]) -> "AnilloFrames":
+        """Lo llama el proceso de captura con la forma del primer frame."""
+        tamano = _tamano_cabecera(ranuras) + ranuras * int(np.prod(forma))
+        shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        # La API decide cuándo destruirlo, aunque este proceso muera
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        anillo = cls(shm, ranuras, forma, escritor=True)
+        anillo._seqs[:] = 0
+        anillo._escrito[0] = 0
+        return anillo
+
+    @classmethod
+    def conectar(cls, nombre: str, ranuras: int, forma: Tuple[int, int, int]) -> "AnilloFrames":
+        """Vista de solo lectura desde el proceso de la API."""
+        return cls(shared_memory.SharedMemory(name=nombre), ranuras, forma, escritor=False)
+
+    # ── Escritor ──────────────────────────────────────────────────────────────
+    def escribir(self, frame: np.ndarray, ts: float) -> int:
+        """Copia el frame a la siguiente ranura y retorna su secuencia."""
+        seq = int(self._escrito[0]) + 1
+        ranura = seq % self.ranuras
+        self._seqs[ranura] = -1
+        self._frames[ranura][...] = frame
+        self._ts[ranura] = ts
+        self._seqs[ranura] = seq
+        self._escrito[0] = seq
+        return seq
+
+    # ── Lector ────────────────────────────────────────────────────────────────
+    @property
+    def escrito(self) -> int:
+        return int(self._escrito[0])
+
+    def vista(self, seq: int) -> Optional["LecturaAnillo"]:
+        """
+        Vista de solo lectura (sin copia) del frame seq, o None si la ranura
+        ya se sobrescribió. La vista sigue apuntando a la ranura: ver
+        LecturaAnillo.vigente / retener.
+        """
+        ranura = seq % self.ranuras
+        if self._seqs[ranura] != seq:
+            return None
+        frame = self._frames[ranura]
+        ts = float(self._ts[ranura])
+        if self._seqs[ranura] != seq:
+            return None
+        return LecturaAnillo(frame, ts, seq, self)
+
+    def vigente(self, seq: int) -> bool:
+        # False también si el anillo ya se cerró (lo reemplazó uno nuevo)
+        seqs = self._seqs
+        return seqs is not None and seqs[seq % self.ranuras] == seq
+
+    # ── Ciclo de vida ─────────────────────────────────────────────────────────
+    def cerrar(self) -> None:
+        # Las vistas numpy deben soltarse antes de cerrar el segmento
+        self._seqs = self._ts = self._escrito = self._frames = None  # type: ignore[assignment]
+        try:
+            self._shm.close()
+        except BufferError:
+            # Aún hay vistas vivas (p. ej. un frame en análisis); el segmento
+            # se libera cuando se recolecten
+            pass
+
+    def destruir(self) -> None:
+        self.cerrar()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass(frozen=True)
+class LecturaAnillo:
+    """
+    Frame entregado por el anillo: vista de solo lectura de su ranura.
+    Es válida mientras vigente() sea True; quien conserve el frame más allá
+    de la entrega debe tomar una copia con retener().
+    """
+    frame: np.ndarray
+    ts: float
+    seq: int
+    anillo: AnilloFrames
+
+    def vigente(self) -> bool:
+        """False si el escritor ya empezó a reutilizar la ranura."""
+        return self.anillo.vigente(self.seq)
+
+    def retener(self) -> Optional[np.ndarray]:
+        """
+        Copia propia del frame, o None si la ranura se sobrescribió antes o
+        durante la copia (seqlock: la secuencia se comprueba después).
+        """
+        if not self.vigente():
+            return None
+        copia = self.frame.copy()
+        return copia if self.vigente() else None
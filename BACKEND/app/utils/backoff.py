@@ -0,0 +1,38 @@
+"""
+Espera exponencial con jitter para reconexiones.
+
+Cada fallo duplica el techo de espera (base, 2·base, 4·base ... hasta
+maximo) y la espera real se sortea en [techo/2, techo]: tras un corte de red
+las cámaras no reintentan todas en el mismo instante, pero tampoco más
+rápido que la mitad del techo. Un éxito (reiniciar) vuelve a la base.
+"""
+from __future__ import annotations
+
+import random
+from typing import Optional
+
+
+class BackoffExponencial:
+    """Secuencia de esperas para un bucle de reconexión sin límite de intentos."""
+
+    def __init__(
+        self,
+        base: float,
+        maximo: float,
+        factor: float = 2.0,
+        rng: Optional[random.Random] = None,
+    ) -> None:
+        self.base = base
+        self.maximo = max(maximo, base)
+        self.factor = factor
+        self.intentos = 0
+        self._rng = rng or random.Random()
+
+    def siguiente(self) -> float:
+        """Segundos a esperar antes del próximo intento."""
+        techo = min(self.maximo, self.base * self.factor ** self.intentos)
+        self.intentos += 1
+        return techo / 2 + self._rng.uniform(0, techo / 2)
+
+    def reiniciar(self) -> None:
+        self.intentos = 0
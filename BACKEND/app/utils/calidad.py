@@ -0,0 +1,107 @@
+"""
+Puntaje de calidad de frames para elegir cuál enviar a reconocimiento.
+
+Se calcula en el hilo de captura sobre una copia reducida en grises:
+    - Nitidez: varianza del Laplaciano (un frame movido tiene pocos bordes).
+    - Exposición: penaliza brillo medio lejos de gris medio y píxeles
+      saturados o negros.
+    - Rostros: si hay cajas del detector del análisis anterior, la nitidez
+      y la exposición se miden dentro de ellas, ponderadas por área y
+      det_score; así se elige el frame donde los rostros se ven mejor, no
+      el fondo.
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+ANCHO_CALIDAD = 320
+# Varianza del Laplaciano a partir de la cual un recorte se considera nítido
+NITIDEZ_REFERENCIA = 300.0
+
+
+def _calidad_region(gris: np.ndarray) -> float:
+    if gris.size == 0:
+        return 0.0
+    nitidez = float(cv2.Laplacian(gris, cv2.CV_64F).var())
+    nitidez = min(nitidez / NITIDEZ_REFERENCIA, 1.0)
+
+    media = float(gris.mean())
+    exposicion = 1.0 - abs(media - 128.0) / 128.0
+    recortados = float(np.count_nonzero((gris < 8) | (gris > 247))) / gris.size
+    exposicion *= 1.0 - recortados
+    return nitidez * max(exposicion, 0.0)
+
+
+def puntuar_frame(
+    frame_bgr: np.ndarray,
+    rostros: Optional[Sequence[Tuple[Sequence[float], float]]] = None,
+) -> float:
+    """
+    Puntaje 0-1 del frame. rostros: [(bbox [x1, y1, x2, y2] en píxeles del
+    frame completo, det_score), ...] del análisis anterior.
+    """
+    alto, ancho = frame_bgr.shape[:2]
+    escala = min(1.0, ANCHO_CALIDAD / float(ancho))
+    reducido = cv2.resize(
+        frame_bgr,
+        (max(1, int(ancho * escala)), max(1, int(alto * escala))),
+        interpolation=cv2.INTER_AREA,
+    )
+    gris = cv2.cvtColor(reducido, cv2.COLOR_BGR2GRAY)
+
+    if not rostros:
+        return _calidad_region(gris)
+
+    alto_r, ancho_r = gris.shape
+    total, pesos = 0.0, 0.0
+    for bbox, det_score in rostros:
+        x1, y1, x2, y2 = (int(round(v * escala)) for v in bbox)
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, ancho_r), min(y2, alto_r)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            continue
+        peso = (x2 - x1) * (y2 - y1) * max(float(det_score), 0.0)
+        total += peso * _calidad_region(gris[y1:y2, x1:x2])
+        pesos += peso
+    return total / pesos if pesos > 0 else _calidad_region(gris)
+
+
+class BufferMejorFrame:
+    """Conserva el frame de mayor puntaje visto desde el último tomar()."""
+
+    def __init__(self) -> None:
+        self._frame: Optional[np.ndarray] = None
+        self._puntaje = -1.0
+        self._ts = 0.0
+        self.candidatos = 0
+
+    def ofrecer(
+        self,
+        frame: np.ndarray,
+        puntaje: float,
+        ts: float = 0.0,
+        retener: Optional[Callable[[], Optional[np.ndarray]]] = None,
+    ) -> None:
+        """
+        ts: instante de captura del frame (time.monotonic).
+        retener: si frame es una vista prestada (ranura del anillo
+        compartido), entrega una copia validada o None; solo se llama si el
+        frame pasa a ser el mejor, y si la ranura ya cambió se descarta.
+        """
+        self.candidatos += 1
+        if puntaje > self._puntaje:
+            if retener is not None:
+                frame = retener()
+                if frame is None:
+                    return
+            self._frame = frame
+            self._puntaje, self._ts = puntaje, ts
+
+    def tomar(self) -> Tuple[Optional[np.ndarray], float, float]:
+        """Retorna (frame, puntaje, ts) del mejor candidato y vacía el buffer."""
+        frame, puntaje, ts = self._frame, self._puntaje, self._ts
+        self._frame, self._puntaje, self._ts, self.candidatos = None, -1.0, 0.0, 0
+        return frame, puntaje, ts
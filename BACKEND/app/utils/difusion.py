@@ -0,0 +1,92 @@
+"""
+Difusión de frames a muchos consumidores asyncio.
+
+DifusorFrames es una ranura "último frame" versionada:
+    - publicar() se llama desde cualquier hilo (p. ej. el de captura) y
+      despierta a los consumidores con un solo call_soon_threadsafe por
+      frame, sin importar cuántos haya.
+    - esperar() suspende al consumidor hasta que exista una versión más
+      nueva que la que ya vio. Si el consumidor va atrasado recibe
+      directamente la más reciente (los frames intermedios se saltan).
+Nadie hace polling: un espectador solo despierta cuando hay un frame nuevo.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Generic, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class DifusorFrames(Generic[T]):
+    """Último valor publicado + aviso a las corrutinas en espera."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._datos: Optional[T] = None
+        self._version = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._evento: Optional[asyncio.Event] = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def datos(self) -> Optional[T]:
+        return self._datos
+
+    def _enlazar_loop(self) -> asyncio.Event:
+        """Crea el evento en el loop de los consumidores (se llama desde él)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._evento is None:
+            self._loop = loop
+            self._evento = asyncio.Event()
+        return self._evento
+
+    def publicar(self, datos: Optional[T]) -> int:
+        """Publica un valor nuevo desde cualquier hilo. Retorna su versión."""
+        with self._lock:
+            self._datos = datos
+            self._version += 1
+            version = self._version
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._avisar)
+            except RuntimeError:
+                # El loop se cerró entre la verificación y la llamada
+                pass
+        return version
+
+    def _avisar(self) -> None:
+        # Corre en el loop: se reemplaza el evento y se activa el anterior,
+        # así cada espera despierta exactamente una vez por publicación.
+        evento = self._evento
+        self._evento = asyncio.Event()
+        if evento is not None:
+            evento.set()
+
+    async def esperar(
+        self, version_vista: int, timeout: Optional[float] = None
+    ) -> Tuple[Optional[T], int]:
+        """
+        Espera un valor con versión > version_vista y retorna (valor, versión)
+        del más reciente. Si vence el timeout retorna (None, version_vista).
+        """
+        loop = asyncio.get_running_loop()
+        limite = None if timeout is None else loop.time() + timeout
+        while True:
+            evento = self._enlazar_loop()
+            with self._lock:
+                datos, version = self._datos, self._version
+            if version > version_vista and datos is not None:
+                return datos, version
+            restante = None if limite is None else limite - loop.time()
+            if restante is not None and restante <= 0:
+                return None, version_vista
+            try:
+                await asyncio.wait_for(evento.wait(), restante)
+            except asyncio.TimeoutError:
+                return None, version_vista
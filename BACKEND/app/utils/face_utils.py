@@ -1,23 +1,112 @@
 """
 Utilidades de reconocimiento facial usando InsightFace (ArcFace).
+
+Configuración del motor (.env):
+    FACE_MODELO=buffalo_l                 # buffalo_l | buffalo_s | antelopev2
+    FACE_MODULOS=detection,recognition    # módulos ONNX a cargar
+    FACE_DET_SIZE=640                     # tamaño de entrada del detector
+    FACE_MODELOS_DIR=~/.insightface       # raíz local de los modelos
+    FACE_PERMITIR_DESCARGA=false          # si es false, nunca se descargan modelos
+
+Los modelos se buscan en <FACE_MODELOS_DIR>/models/<FACE_MODELO>/*.onnx.
+Algunos paquetes (antelopev2) se descomprimen con una carpeta extra
+(models/antelopev2/antelopev2/*.onnx); se acepta cualquier subcarpeta y se
+usa la menos profunda que contenga archivos .onnx.
+
+V-ESCOM solo usa la caja/landmarks del detector y el embedding ArcFace, por
+lo que por defecto no se cargan landmark_3d_68, landmark_2d_106 ni genderage
+(cada uno corre una inferencia extra por rostro).
 """
 from __future__ import annotations
 
-from typing import Optional
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import cv2
 import numpy as np
 
+DIM_EMBEDDING = 512
+
+# Imagen de entrada: bytes JPEG/PNG o array BGR decodificado
+Imagen = Union[bytes, np.ndarray]
+
+FACE_MODELO = os.getenv("FACE_MODELO", "buffalo_l")
+FACE_DET_SIZE = int(os.getenv("FACE_DET_SIZE", "640"))
+# Detección y reconocimiento son obligatorios para el pipeline
+FACE_MODULOS = sorted(
+    {m.strip() for m in os.getenv("FACE_MODULOS", "detection,recognition").split(",") if m.strip()}
+    | {"detection", "recognition"}
+)
+
+FACE_MODELOS_DIR = os.path.expanduser(os.getenv("FACE_MODELOS_DIR", "~/.insightface"))
+FACE_PERMITIR_DESCARGA = os.getenv("FACE_PERMITIR_DESCARGA", "false").lower() == "true"
+
+# Tiempo acumulado por módulo en este proceso: {modulo: [total_ms, llamadas]}
+_tiempos_ms: Dict[str, List[float]] = {}
+
+# Tiempos de carga/calentamiento de este proceso (ver precargar_modelo)
+_calentamiento_ms: Dict[str, float] = {}
+
+
+def _cronometrar(modulo: str, metodo: Callable[..., Any]) -> Callable[..., Any]:
+    """Envuelve un método de un modelo ONNX para acumular su tiempo de inferencia."""
+    def _medido(*args: Any, **kwargs: Any) -> Any:
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args, **kwargs)
+        finally:
+            acumulado = _tiempos_ms.setdefault(modulo, [0.0, 0])
+            acumulado[0] += (time.perf_counter() - inicio) * 1000.0
+            acumulado[1] += 1
+    return _medido
+
+
+def _ubicar_modelo(raiz: str, modelo: str) -> Optional[str]:
+    """
+    Ruta del paquete de modelos relativa a <raiz>/models: la carpeta menos
+    profunda bajo <raiz>/models/<modelo> que contiene archivos .onnx
+    (p. ej. "antelopev2/antelopev2"). None si no hay ninguno.
+    """
+    base = os.path.join(raiz, "models")
+    candidatas = [
+        os.path.relpath(actual, base)
+        for actual, _, archivos in os.walk(os.path.join(base, modelo))
+        if any(f.endswith(".onnx") for f in archivos)
+    ]
+    return min(candidatas, key=lambda ruta: (ruta.count(os.sep), ruta), default=None)
+
+
 try:
     from insightface.app import FaceAnalysis
+    from insightface.utils import face_align
 
     _face_app: Optional[FaceAnalysis] = None
 
     def _get_face_app() -> FaceAnalysis:
         global _face_app
         if _face_app is None:
-            _face_app = FaceAnalysis(name="buffalo_l")
-            _face_app.prepare(ctx_id=-1, det_size=(640, 640))
+            nombre = _ubicar_modelo(FACE_MODELOS_DIR, FACE_MODELO)
+            if nombre is None and not FACE_PERMITIR_DESCARGA:
+                # FaceAnalysis descargaría el paquete en este punto
+                directorio = os.path.join(FACE_MODELOS_DIR, "models", FACE_MODELO)
+                raise RuntimeError(
+                    f"No se encontraron los modelos '{FACE_MODELO}' (*.onnx) en {directorio} "
+                    "ni en sus subcarpetas. Cópialos a FACE_MODELOS_DIR o define "
+                    "FACE_PERMITIR_DESCARGA=true"
+                )
+            # FaceAnalysis solo lee los .onnx de <root>/models/<name>; con el
+            # paquete anidado se le pasa la subcarpeta como nombre
+            app = FaceAnalysis(
+                name=nombre or FACE_MODELO, root=FACE_MODELOS_DIR, allowed_modules=FACE_MODULOS
+            )
+            app.prepare(ctx_id=-1, det_size=(FACE_DET_SIZE, FACE_DET_SIZE))
+            # Instrumentar el punto de entrada de cada módulo (sin doble conteo:
+            # ArcFaceONNX.get llama internamente a get_feat).
+            for modulo, modelo in app.models.items():
+                metodo = {"detection": "detect", "recognition": "get_feat"}.get(modulo, "get")
+                setattr(modelo, metodo, _cronometrar(modulo, getattr(modelo, metodo)))
+            _face_app = app
         return _face_app
 
     INSIGHTFACE_DISPONIBLE = True
@@ -32,6 +121,59 @@ except ImportError:
         )
 
 
+def ejecutar_con_perfil(funcion: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, List[float]]]:
+    """
+    Ejecuta funcion(*args) y retorna (resultado, tiempos por módulo de esta llamada).
+    Lo usa el pool de inferencia para agregar el perfil de todos sus procesos.
+    """
+    _tiempos_ms.clear()
+    resultado = funcion(*args)
+    return resultado, {m: list(v) for m, v in _tiempos_ms.items()}
+
+
+def precargar_modelo(tamanos_det: Sequence[int] = ()) -> None:
+    """
+    Carga y calienta el modelo en el proceso actual.
+    Se usa como initializer de los procesos del pool de inferencia.
+
+    Ejecuta una inferencia de prueba del detector en cada tamaño de entrada
+    configurado (global + perfiles de cámara) y una del reconocedor, para que
+    ONNX Runtime reserve memoria y elija kernels antes del primer frame real.
+    """
+    if not INSIGHTFACE_DISPONIBLE:
+        return
+    inicio = time.perf_counter()
+    app = _get_face_app()
+    _calentamiento_ms["carga"] = (time.perf_counter() - inicio) * 1000.0
+
+    for tamano in sorted(set(tamanos_det) | {FACE_DET_SIZE}):
+        inicio = time.perf_counter()
+        app.det_model.detect(
+            np.zeros((tamano, tamano, 3), dtype=np.uint8),
+            input_size=(tamano, tamano),
+            max_num=0,
+            metric="default",
+        )
+        _calentamiento_ms[f"deteccion_{tamano}"] = (time.perf_counter() - inicio) * 1000.0
+
+    rec = app.models["recognition"]
+    lado = rec.input_size[0]
+    inicio = time.perf_counter()
+    rec.get_feat([np.zeros((lado, lado, 3), dtype=np.uint8)])
+    _calentamiento_ms["reconocimiento"] = (time.perf_counter() - inicio) * 1000.0
+
+    # El calentamiento no debe contar en el perfil de inferencia
+    _tiempos_ms.clear()
+
+
+def reporte_calentamiento() -> Dict[str, Any]:
+    """Tiempos de carga/calentamiento del proceso que ejecuta la llamada."""
+    return {
+        "pid": os.getpid(),
+        "tiempos_ms": {k: round(v, 1) for k, v in _calentamiento_ms.items()},
+    }
+
+
 def bytes_a_bgr(imagen_bytes: bytes) -> np.ndarray:
     """Convierte bytes de imagen (JPEG/PNG) a array BGR de OpenCV."""
     array = np.frombuffer(imagen_bytes, dtype=np.uint8)
@@ -41,12 +183,39 @@ def bytes_a_bgr(imagen_bytes: bytes) -> np.ndarray:
     return img
 
 
+def a_bgr(imagen: Imagen) -> np.ndarray:
+    """
+    Bytes codificados (subidas HTTP) o array BGR ya decodificado (frames de
+    captura, que así se ahorran el ciclo imencode/imdecode).
+    """
+    if isinstance(imagen, np.ndarray):
+        return imagen
+    return bytes_a_bgr(imagen)
+
+
+def bgr_a_jpg(img_bgr: np.ndarray, calidad: int = 90) -> bytes:
+    ok, buf = cv2.imencode(".jpg", img_bgr, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+    if not ok:
+        raise ValueError("No se pudo codificar la imagen como JPEG")
+    return buf.tobytes()
+
+
 def normalizar_l2(vector: np.ndarray) -> np.ndarray:
     """Normalización L2 para comparación por distancia coseno."""
     norma = np.linalg.norm(vector)
     return vector / norma if norma > 0 else vector
 
 
+def validar_rostro_unico(rostros: list) -> None:
+    """Lanza ValueError si la lista no contiene exactamente un rostro."""
+    if len(rostros) == 0:
+        raise ValueError("No se detectó ningún rostro en la imagen")
+    if len(rostros) > 1:
+        raise ValueError(
+            f"Se detectaron {len(rostros)} rostros. Envía una imagen con un solo rostro"
+        )
+
+
 def extraer_embedding(imagen_bytes: bytes) -> np.ndarray:
     """
     Recibe los bytes de una imagen y retorna el embedding ArcFace (512-d).
@@ -55,18 +224,141 @@ def extraer_embedding(imagen_bytes: bytes) -> np.ndarray:
     img_bgr = bytes_a_bgr(imagen_bytes)
     app = _get_face_app()
     rostros = app.get(img_bgr)
-
-    if len(rostros) == 0:
-        raise ValueError("No se detectó ningún rostro en la imagen")
-    if len(rostros) > 1:
-        raise ValueError(
-            f"Se detectaron {len(rostros)} rostros. Envía una imagen con un solo rostro"
-        )
+    validar_rostro_unico(rostros)
 
     embedding = rostros[0].normed_embedding
     return embedding.astype(np.float32)
 
 
+def recortar_roi(img_bgr: np.ndarray, roi: Optional[dict]) -> Tuple[np.ndarray, int, int]:
+    """
+    Aplica la región de interés de una cámara antes de la detección.
+
+    roi usa coordenadas normalizadas (0-1) para ser independiente de la
+    resolución del stream:
+        {"rect": [x1, y1, x2, y2]}  o  {"poligono": [[x, y], [x, y], ...]}
+    Con polígono se recorta a su rectángulo envolvente y se enmascara el
+    exterior. Retorna (imagen, dx, dy) con el desplazamiento del recorte.
+    """
+    if not roi:
+        return img_bgr, 0, 0
+    alto, ancho = img_bgr.shape[:2]
+
+    if roi.get("poligono"):
+        puntos = np.array(
+            [[x * ancho, y * alto] for x, y in roi["poligono"]], dtype=np.int32
+        )
+        x1, y1 = puntos.min(axis=0)
+        x2, y2 = puntos.max(axis=0)
+    elif roi.get("rect"):
+        puntos = None
+        x1, y1, x2, y2 = roi["rect"]
+        x1, x2 = x1 * ancho, x2 * ancho
+        y1, y2 = y1 * alto, y2 * alto
+    else:
+        return img_bgr, 0, 0
+
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(ancho, int(x2)), min(alto, int(y2))
+    if x2 <= x1 or y2 <= y1:
+        return img_bgr, 0, 0
+
+    recorte = img_bgr[y1:y2, x1:x2]
+    if puntos is not None:
+        mascara = np.zeros(recorte.shape[:2], dtype=np.uint8)
+        cv2.fillPoly(mascara, [puntos - np.array([x1, y1], dtype=np.int32)], 255)
+        recorte = cv2.bitwise_and(recorte, recorte, mask=mascara)
+    return recorte, x1, y1
+
+
+def detectar_y_alinear(imagen: Imagen, perfil: Optional[dict] = None) -> List[dict]:
+    """
+    Etapa 1 del pipeline: detección + alineación, sin ejecutar ArcFace.
+    Retorna por cada rostro su bbox, score, landmarks y el recorte alineado
+    listo para el modelo de reconocimiento (ver embeddings_lote).
+
+    perfil (opcional, por cámara):
+        roi            región donde buscar rostros (ver recortar_roi)
+        det_size       tamaño de entrada del detector (múltiplo de 32)
+        min_rostro_px  lado mínimo del rostro en píxeles del frame
+        max_rostros    máximo de rostros a conservar (mayor score primero)
+    Las coordenadas retornadas siempre están en el frame completo.
+    """
+    perfil = perfil or {}
+    img_bgr = a_bgr(imagen)
+    app = _get_face_app()
+    tamano = app.models["recognition"].input_size[0]
+
+    region, dx, dy = recortar_roi(img_bgr, perfil.get("roi"))
+    det_size = perfil.get("det_size")
+    bboxes, kpss = app.det_model.detect(
+        region,
+        input_size=(det_size, det_size) if det_size else None,
+        max_num=0,
+        metric="default",
+    )
+
+    rostros: List[dict] = []
+    if kpss is None:
+        return rostros
+
+    desplazamiento = np.array([dx, dy], dtype=np.float32)
+    min_px = perfil.get("min_rostro_px") or 0
+    candidatos: List[Tuple[np.ndarray, float, np.ndarray]] = []
+    for i in range(bboxes.shape[0]):
+        bbox = bboxes[i, 0:4].astype(np.float32) + np.tile(desplazamiento, 2)
+        if min(bbox[2] - bbox[0], bbox[3] - bbox[1]) < min_px:
+            # Rostros diminutos: ArcFace los identificaría mal de todos modos
+            continue
+        candidatos.append((bbox, float(bboxes[i, 4]), kpss[i].astype(np.float32) + desplazamiento))
+
+    max_rostros = perfil.get("max_rostros")
+    if max_rostros:
+        candidatos.sort(key=lambda c: c[1], reverse=True)
+        candidatos = candidatos[:max_rostros]
+
+    # La alineación usa el frame completo (el enmascarado del ROI no la afecta)
+    for bbox, det_score, kps in candidatos:
+        rostros.append({
+            "bbox":      bbox,
+            "det_score": det_score,
+            "kps":       kps,
+            "alineado":  face_align.norm_crop(img_bgr, landmark=kps, image_size=tamano),
+        })
+    return rostros
+
+
+def realinear_en_alta(
+    frame_alta: np.ndarray, forma_base: Tuple[int, ...], kps: np.ndarray, tamano: int
+) -> np.ndarray:
+    """
+    Alinea sobre frame_alta un rostro detectado en un frame de menor
+    resolución (forma_base = shape de ese frame), escalando sus landmarks.
+    norm_crop solo muestrea la región del rostro: el frame de alta no se
+    copia ni se reduce completo.
+    """
+    if not INSIGHTFACE_DISPONIBLE:
+        raise RuntimeError("InsightFace no está instalado")
+    alto_base, ancho_base = forma_base[:2]
+    alto_alta, ancho_alta = frame_alta.shape[:2]
+    escala = np.array([ancho_alta / ancho_base, alto_alta / alto_base], dtype=np.float32)
+    return face_align.norm_crop(frame_alta, landmark=kps * escala, image_size=tamano)
+
+
+def embeddings_lote(alineados: List[np.ndarray]) -> np.ndarray:
+    """
+    Etapa 2 del pipeline: ArcFace sobre N recortes alineados en una sola
+    llamada ONNX. Retorna una matriz (N, 512) float32 normalizada L2.
+    """
+    if not alineados:
+        return np.zeros((0, DIM_EMBEDDING), dtype=np.float32)
+    rec = _get_face_app().models["recognition"]
+    feats = rec.get_feat(alineados).astype(np.float32)
+    normas = np.linalg.norm(feats, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return feats / normas
+
+
 def similitud_coseno(vec_a: np.ndarray, vec_b: np.ndarray) -> float:
     """
     Similitud coseno entre dos vectores normalizados.
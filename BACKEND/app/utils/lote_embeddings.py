@@ -0,0 +1,97 @@
+"""
+Formato binario de rostros ya embebidos para POST /reconocimiento/identificar/embeddings.
+
+Los equipos de borde (rtsp_worker.py --edge) corren InsightFace junto a la
+cámara y envían solo los embeddings ArcFace: el servidor no decodifica
+imágenes ni ejecuta inferencia, solo busca coincidencias.
+
+    Content-Type: application/octet-stream
+    Cuerpo: una o más entradas consecutivas, little-endian
+        cabecera   36 bytes ("<Id5fI")
+                   id_camara  uint32        0 = sin cámara
+                   ts         float64       epoch de captura; 0 = sin marca
+                   bbox       float32 × 4   x1, y1, x2, y2 en el frame
+                   det_score  float32
+                   longitud   uint32        bytes del recorte JPEG (0 = sin recorte)
+        embedding  512 × float32            ArcFace del mismo FACE_MODELO que el servidor
+        recorte    `longitud` bytes         JPEG del rostro, evidencia si es intruso
+
+    Cabecera HTTP X-Face-Modelo: FACE_MODELO con que se calcularon los
+    embeddings. Embeddings de modelos distintos no son comparables, así que
+    el servidor responde 422 si falta o no coincide con el suyo.
+"""
+from __future__ import annotations
+
+import math
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Igual a face_utils.DIM_EMBEDDING (sin importar InsightFace en el borde)
+DIMENSION = 512
+CABECERA = struct.Struct("<Id5fI")
+CABECERA_MODELO = "X-Face-Modelo"
+_BYTES_EMBEDDING = DIMENSION * 4
+
+
+@dataclass
+class RostroEmbebido:
+    """Un rostro detectado y embebido en el borde."""
+    embedding: np.ndarray
+    bbox: List[float]
+    det_score: float
+    id_camara: Optional[int] = None
+    ts: Optional[float] = None
+    recorte: Optional[bytes] = None
+
+
+def decodificar_embeddings(cuerpo: bytes, max_rostros: int) -> List[RostroEmbebido]:
+    """
+    Separa el cuerpo en rostros. Los embeddings se re-normalizan (L2).
+    ValueError si el cuerpo está truncado, excede max_rostros o trae
+    valores no finitos.
+    """
+    rostros: List[RostroEmbebido] = []
+    vista = memoryview(cuerpo)
+    pos = 0
+    while pos < len(vista):
+        if len(rostros) >= max_rostros:
+            raise ValueError(f"El lote excede {max_rostros} rostros")
+        if pos + CABECERA.size + _BYTES_EMBEDDING > len(vista):
+            raise ValueError(f"Rostro #{len(rostros)} truncado")
+        id_camara, ts, x1, y1, x2, y2, det_score, longitud = CABECERA.unpack_from(vista, pos)
+        if not all(math.isfinite(v) for v in (ts, x1, y1, x2, y2, det_score)):
+            raise ValueError(f"Cabecera del rostro #{len(rostros)} con valores no finitos")
+        pos += CABECERA.size
+        embedding = np.frombuffer(vista, dtype="<f4", count=DIMENSION, offset=pos).astype(np.float32)
+        pos += _BYTES_EMBEDDING
+        if pos + longitud > len(vista):
+            raise ValueError(f"Recorte del rostro #{len(rostros)} truncado")
+        norma = float(np.linalg.norm(embedding))
+        if not np.isfinite(norma) or norma == 0:
+            raise ValueError(f"Embedding del rostro #{len(rostros)} inválido")
+        rostros.append(RostroEmbebido(
+            embedding=embedding / norma,
+            bbox=[x1, y1, x2, y2],
+            det_score=det_score,
+            id_camara=id_camara or None,
+            ts=ts or None,
+            recorte=bytes(vista[pos:pos + longitud]) if longitud else None,
+        ))
+        pos += longitud
+    return rostros
+
+
+def codificar_embeddings(rostros: Sequence[RostroEmbebido]) -> bytes:
+    """Inverso de decodificar_embeddings (lo usa rtsp_worker en modo borde)."""
+    partes: List[bytes] = []
+    for rostro in rostros:
+        recorte = rostro.recorte or b""
+        partes.append(CABECERA.pack(
+            rostro.id_camara or 0, rostro.ts or 0.0, *rostro.bbox, rostro.det_score, len(recorte)
+        ))
+        partes.append(np.asarray(rostro.embedding, dtype="<f4").tobytes())
+        partes.append(recorte)
+    return b"".join(partes)
@@ -0,0 +1,61 @@
+"""
+Formato binario de lotes de frames para POST /reconocimiento/identificar/lote.
+
+Alternativa a multipart para equipos remotos: sin boundaries ni cabeceras
+por parte, el servidor solo recorre cabeceras de tamaño fijo.
+
+    Content-Type: application/octet-stream
+    Cuerpo: una o más entradas consecutivas
+        cabecera  16 bytes, little-endian ("<IdI"), como lote_embeddings
+                  id_camara  uint32   0 = sin cámara
+                  ts         float64  epoch en segundos; 0 = sin marca
+                  longitud   uint32   bytes de la imagen
+        imagen    `longitud` bytes (JPEG / PNG)
+"""
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+CABECERA = struct.Struct("<IdI")
+
+
+@dataclass
+class FrameLote:
+    """Un frame del lote con su cámara y la marca de tiempo de captura."""
+    contenido: bytes
+    id_camara: Optional[int] = None
+    ts: Optional[float] = None
+
+
+def decodificar_lote(cuerpo: bytes, max_frames: int) -> List[FrameLote]:
+    """Separa el cuerpo en frames. ValueError si está truncado o excede max_frames."""
+    frames: List[FrameLote] = []
+    vista = memoryview(cuerpo)
+    pos = 0
+    while pos < len(vista):
+        if len(frames) >= max_frames:
+            raise ValueError(f"El lote excede {max_frames} frames")
+        if pos + CABECERA.size > len(vista):
+            raise ValueError(f"Cabecera truncada en el byte {pos}")
+        id_camara, ts, longitud = CABECERA.unpack_from(vista, pos)
+        pos += CABECERA.size
+        if longitud == 0 or pos + longitud > len(vista):
+            raise ValueError(f"Imagen #{len(frames)} vacía o truncada")
+        frames.append(FrameLote(
+            contenido=bytes(vista[pos:pos + longitud]),
+            id_camara=id_camara or None,
+            ts=ts or None,
+        ))
+        pos += longitud
+    return frames
+
+
+def codificar_lote(frames: Sequence[FrameLote]) -> bytes:
+    """Inverso de decodificar_lote (lo usan los clientes, p. ej. rtsp_worker)."""
+    partes: List[bytes] = []
+    for frame in frames:
+        partes.append(CABECERA.pack(frame.id_camara or 0, frame.ts or 0.0, len(frame.contenido)))
+        partes.append(frame.contenido)
+    return b"".join(partes)
@@ -0,0 +1,70 @@
+"""
+Detector de movimiento ligero para el hilo de captura.
+
+Diferencia cada frame (reducido a escala de grises de ANCHO_ANALISIS px)
+contra un fondo de promedio móvil. Cuesta una fracción de milisegundo por
+frame, frente a decenas de milisegundos de una inferencia de InsightFace, y
+permite que las cámaras sin actividad no envíen nada al motor.
+
+Sensibilidad (0-1, por cámara):
+    0    → detector desactivado (siempre "hay movimiento").
+    0.5  → ~1% del cuadro debe cambiar.
+    1    → basta con ~0.1% del cuadro.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+ANCHO_ANALISIS = 160
+# Diferencia mínima de intensidad (0-255) para contar un píxel como cambiado
+UMBRAL_PIXEL = 25
+# Peso del frame nuevo en el fondo de promedio móvil
+APRENDIZAJE_FONDO = 0.05
+
+
+def _fraccion_minima(sensibilidad: float) -> float:
+    """Fracción de píxeles cambiados requerida: de 10% (sens≈0) a 0.1% (sens=1)."""
+    sensibilidad = min(max(sensibilidad, 0.0), 1.0)
+    return 10 ** (-1 - 2 * sensibilidad)
+
+
+class DetectorMovimiento:
+    """Diferencia contra fondo adaptativo sobre un frame reducido."""
+
+    def __init__(self, sensibilidad: float) -> None:
+        self.sensibilidad = sensibilidad
+        self._fondo: Optional[np.ndarray] = None
+        self.ultima_fraccion = 0.0
+
+    @property
+    def habilitado(self) -> bool:
+        return self.sensibilidad > 0
+
+    def ajustar_sensibilidad(self, sensibilidad: float) -> None:
+        self.sensibilidad = sensibilidad
+
+    def hay_movimiento(self, frame_bgr: np.ndarray) -> bool:
+        if not self.habilitado:
+            return True
+
+        alto, ancho = frame_bgr.shape[:2]
+        escala = ANCHO_ANALISIS / float(ancho)
+        reducido = cv2.resize(
+            frame_bgr,
+            (ANCHO_ANALISIS, max(1, int(alto * escala))),
+            interpolation=cv2.INTER_AREA,
+        )
+        gris = cv2.cvtColor(reducido, cv2.COLOR_BGR2GRAY)
+        gris = cv2.GaussianBlur(gris, (5, 5), 0).astype(np.float32)
+
+        if self._fondo is None or self._fondo.shape != gris.shape:
+            self._fondo = gris
+            return True
+
+        diferencia = cv2.absdiff(gris, self._fondo)
+        cv2.accumulateWeighted(gris, self._fondo, APRENDIZAJE_FONDO)
+        self.ultima_fraccion = float(np.count_nonzero(diferencia > UMBRAL_PIXEL)) / diferencia.size
+        return self.ultima_fraccion >= _fraccion_minima(self.sensibilidad)
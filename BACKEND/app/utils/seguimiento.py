@@ -0,0 +1,224 @@
+"""
+Seguimiento de rostros entre frames (tracker ligero por cámara).
+
+Asocia las cajas del detector de un frame con las del anterior por IoU y,
+si el solapamiento es bajo (la persona se movió entre muestras), por
+distancia entre centros relativa al tamaño del rostro. Cada pista conserva
+la identidad obtenida en su primer reconocimiento, de modo que una persona
+que permanece frente a la cámara se reconoce una sola vez.
+
+La asociación solo mira cajas: si dos personas se cruzan, la pista puede
+pasar de una a otra. Por eso la identidad en caché se verifica cada
+verificar_seg (o ante un cambio brusco de tamaño de la caja) comparando un
+embedding nuevo con el de la pista, sin ir a la BD; si no coincide, el
+rostro se reconoce de nuevo.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersección sobre unión de dos cajas [x1, y1, x2, y2]."""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    interseccion = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    union = area_a + area_b - interseccion
+    return float(interseccion / union) if union > 0 else 0.0
+
+
+def _area(bbox: np.ndarray) -> float:
+    return float(max(bbox[2] - bbox[0], 0.0) * max(bbox[3] - bbox[1], 0.0))
+
+
+def _distancia_centros(a: np.ndarray, b: np.ndarray) -> float:
+    """Distancia entre centros normalizada por el lado mayor de la caja a."""
+    centro_a = np.array([(a[0] + a[2]) / 2, (a[1] + a[3]) / 2])
+    centro_b = np.array([(b[0] + b[2]) / 2, (b[1] + b[3]) / 2])
+    lado = max(a[2] - a[0], a[3] - a[1], 1.0)
+    return float(np.linalg.norm(centro_a - centro_b) / lado)
+
+
+class Pista:
+    """Un rostro seguido a través de varios frames."""
+
+    def __init__(self, id_pista: int, bbox: np.ndarray, ahora: float) -> None:
+        self.id_pista = id_pista
+        self.bbox = bbox
+        self.ultimo_visto = ahora
+        self.frames = 1
+        # Identidad en caché (resultado del último reconocimiento)
+        self.resultado: Any = None
+        self.similitud: float = -1.0
+        self.reconocimientos = 0
+        self.ultimo_reconocimiento = 0.0
+        # Embedding de referencia y última verificación contra él
+        self.embedding: Optional[np.ndarray] = None
+        self.ultima_verificacion = 0.0
+        self.area_verificada = _area(bbox)
+
+    def asignar_resultado(
+        self,
+        resultado: Any,
+        similitud: float,
+        ahora: float,
+        embedding: Optional[np.ndarray] = None,
+    ) -> None:
+        self.resultado = resultado
+        self.similitud = similitud
+        self.reconocimientos += 1
+        self.ultimo_reconocimiento = ahora
+        self.embedding = embedding
+        self.ultima_verificacion = ahora
+        self.area_verificada = _area(self.bbox)
+
+
+class RastreadorRostros:
+    """
+    Tracker IoU/centroide de una cámara.
+
+    Política de reconocimiento (requiere_reconocimiento):
+        - Pista nueva → se reconoce.
+        - Similitud ambigua (|sim - umbral| < margen) → se reintenta hasta
+          max_reintentos veces.
+        - Identidad no confiable (sim < umbral + margen, incluye "No
+          Autorizado") → se reconoce de nuevo cada revalidar_dudosa_seg.
+        - Cada revalidar_seg se vuelve a confirmar la identidad por seguridad.
+        - En otro caso se reutiliza la identidad en caché.
+    Un nuevo reconocimiento de una pista que ya tenía identidad solo genera
+    evento si la identidad cambió; si la confirma, el llamador refresca la
+    caché con asignar_resultado (ver reconocimiento_service).
+
+    Política de verificación (requiere_verificacion / verificar): cada
+    verificar_seg, o si el área de la caja cambió más de cambio_escala_max
+    veces, se compara un embedding nuevo con el de la pista; por debajo de
+    similitud_pista la pista pertenece a otra persona y se reconoce.
+    """
+
+    def __init__(
+        self,
+        umbral: float,
+        margen: float = 0.08,
+        max_reintentos: int = 3,
+        revalidar_seg: float = 300.0,
+        iou_min: float = 0.3,
+        distancia_max: float = 0.6,
+        ttl_seg: float = 3.0,
+        revalidar_dudosa_seg: float = 10.0,
+        verificar_seg: float = 2.0,
+        similitud_pista: float = 0.5,
+        cambio_escala_max: float = 2.0,
+    ) -> None:
+        self.umbral = umbral
+        self.margen = margen
+        self.max_reintentos = max_reintentos
+        self.revalidar_seg = revalidar_seg
+        self.iou_min = iou_min
+        self.distancia_max = distancia_max
+        self.ttl_seg = ttl_seg
+        self.revalidar_dudosa_seg = revalidar_dudosa_seg
+        self.verificar_seg = verificar_seg
+        self.similitud_pista = similitud_pista
+        self.cambio_escala_max = cambio_escala_max
+        self._pistas: Dict[int, Pista] = {}
+        self._siguiente_id = 1
+
+    def actualizar(
+        self, bboxes: Sequence[np.ndarray], ahora: Optional[float] = None
+    ) -> List[Pista]:
+        """
+        Asocia las cajas del frame actual con las pistas existentes.
+        Retorna una pista por caja, en el mismo orden; las cajas sin pareja
+        abren pistas nuevas y las pistas no vistas en ttl_seg se descartan.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        self._pistas = {
+            id_pista: p for id_pista, p in self._pistas.items()
+            if ahora - p.ultimo_visto <= self.ttl_seg
+        }
+
+        # Candidatos (costo, pista, caja) ordenados: primero IoU alto,
+        # luego cercanía de centros. Asignación voraz (pocos rostros por frame).
+        candidatos: List[Tuple[float, int, int]] = []
+        for id_pista, pista in self._pistas.items():
+            for j, bbox in enumerate(bboxes):
+                solapamiento = iou(pista.bbox, bbox)
+                if solapamiento >= self.iou_min:
+                    candidatos.append((-solapamiento, id_pista, j))
+                    continue
+                distancia = _distancia_centros(pista.bbox, bbox)
+                if distancia <= self.distancia_max:
+                    candidatos.append((distancia, id_pista, j))
+        candidatos.sort()
+
+        asignadas: Dict[int, Pista] = {}
+        usadas = set()
+        for _, id_pista, j in candidatos:
+            if j in asignadas or id_pista in usadas:
+                continue
+            pista = self._pistas[id_pista]
+            pista.bbox = np.asarray(bboxes[j], dtype=np.float32)
+            pista.ultimo_visto = ahora
+            pista.frames += 1
+            asignadas[j] = pista
+            usadas.add(id_pista)
+
+        resultado: List[Pista] = []
+        for j, bbox in enumerate(bboxes):
+            pista = asignadas.get(j)
+            if pista is None:
+                pista = Pista(self._siguiente_id, np.asarray(bbox, dtype=np.float32), ahora)
+                self._pistas[pista.id_pista] = pista
+                self._siguiente_id += 1
+            resultado.append(pista)
+        return resultado
+
+    def requiere_reconocimiento(self, pista: Pista, ahora: Optional[float] = None) -> bool:
+        ahora = time.monotonic() if ahora is None else ahora
+        if pista.resultado is None:
+            return True
+        transcurrido = ahora - pista.ultimo_reconocimiento
+        if transcurrido >= self.revalidar_seg:
+            return True
+        if pista.similitud < self.umbral + self.margen and transcurrido >= self.revalidar_dudosa_seg:
+            return True
+        ambigua = abs(pista.similitud - self.umbral) < self.margen
+        return ambigua and pista.reconocimientos <= self.max_reintentos
+
+    def requiere_verificacion(self, pista: Pista, ahora: Optional[float] = None) -> bool:
+        """True si la identidad en caché debe confirmarse con un embedding nuevo."""
+        ahora = time.monotonic() if ahora is None else ahora
+        if pista.embedding is None:
+            return False
+        if ahora - pista.ultima_verificacion >= self.verificar_seg:
+            return True
+        area = _area(pista.bbox)
+        if area <= 0 or pista.area_verificada <= 0:
+            return True
+        escala = area / pista.area_verificada
+        return max(escala, 1.0 / escala) >= self.cambio_escala_max
+
+    def verificar(
+        self, pista: Pista, embedding: np.ndarray, ahora: Optional[float] = None
+    ) -> bool:
+        """
+        Compara un embedding nuevo (normalizado L2) con el de la pista.
+        True si es la misma persona (la caché sigue vigente); False si la
+        pista debe reconocerse de nuevo.
+        """
+        ahora = time.monotonic() if ahora is None else ahora
+        if pista.embedding is None:
+            return False
+        if float(np.dot(embedding, pista.embedding)) < self.similitud_pista:
+            return False
+        pista.ultima_verificacion = ahora
+        pista.area_verificada = _area(pista.bbox)
+        return True
+
+    def pistas_activas(self) -> int:
+        return len(self._pistas)
@@ -0,0 +1,23 @@
+"""
+Serialización de embeddings para consultas SQL con pgvector.
+
+Las consultas con text() reciben los vectores como literales y los
+convierten con CAST(:param AS vector) o CAST(:param AS vector[]):
+    - literal_vector:   '[x1,x2,...]'
+    - literal_vectores: '{"[...]","[...]"}' (arreglo Postgres de vectores)
+"""
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+
+def literal_vector(embedding: np.ndarray) -> str:
+    """Serializa un embedding como literal pgvector '[x1,x2,...]'."""
+    return "[" + ",".join(f"{float(v):.7g}" for v in embedding) + "]"
+
+
+def literal_vectores(embeddings: Sequence[np.ndarray]) -> str:
+    """Serializa embeddings como literal de arreglo Postgres 'vector[]'."""
+    return "{" + ",".join(f'"{literal_vector(emb)}"' for emb in embeddings) + "}"
@@ -0,0 +1,145 @@
+"""
+Benchmark de difusión MJPEG - V-ESCOM
+=====================================
+Compara, con N espectadores simulados de una misma cámara:
+
+  polling    Cada cliente revisa la ranura del último JPEG cada 67 ms
+             (comportamiento anterior de /rtsp/mjpeg).
+  difusor    Cada cliente espera en DifusorFrames y despierta solo cuando
+             el hilo de captura publica un frame nuevo.
+
+Un hilo productor publica frames a --fps. Una fracción de los clientes es
+"lenta" (cada envío tarda --lento-ms) para mostrar que el difusor les salta
+los frames intermedios en lugar de acumularlos.
+
+Métricas por modo: despertares totales, frames entregados, frames saltados
+por los clientes lentos, latencia media publicación→entrega y tiempo de CPU.
+
+Uso (desde BACKEND/):
+  python benchmarks/bench_difusion_mjpeg.py
+  python benchmarks/bench_difusion_mjpeg.py --clientes 50 --fps 15 --segundos 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.difusion import DifusorFrames  # noqa: E402
+
+TAMANO_JPG = 60_000
+
+
+class RanuraPolling:
+    """Ranura sin aviso, como el antiguo worker.ultimo_jpg."""
+
+    def __init__(self) -> None:
+        self.datos = None
+        self.version = 0
+
+    def publicar(self, datos) -> None:
+        self.datos = datos
+        self.version += 1
+
+
+def productor(ranura, fps: float, segundos: float, fin: threading.Event) -> None:
+    cuerpo = b"\xff" * TAMANO_JPG
+    periodo = 1.0 / fps
+    limite = time.monotonic() + segundos
+    siguiente = time.monotonic()
+    while time.monotonic() < limite:
+        ranura.publicar((time.monotonic(), cuerpo))
+        siguiente += periodo
+        time.sleep(max(0.0, siguiente - time.monotonic()))
+    fin.set()
+
+
+async def cliente_polling(ranura: RanuraPolling, fin: threading.Event, lento: float, m: dict) -> None:
+    vista = 0
+    while not fin.is_set():
+        m["despertares"] += 1
+        if ranura.version != vista and ranura.datos is not None:
+            if vista and lento:
+                m["saltados"] += ranura.version - vista - 1
+            vista = ranura.version
+            publicado, _ = ranura.datos
+            m["latencias"].append(time.monotonic() - publicado)
+            m["entregados"] += 1
+            if lento:
+                await asyncio.sleep(lento)
+        await asyncio.sleep(0.067)
+
+
+async def cliente_difusor(difusor: DifusorFrames, fin: threading.Event, lento: float, m: dict) -> None:
+    vista = difusor.version
+    while not fin.is_set():
+        datos, nueva = await difusor.esperar(vista, timeout=0.5)
+        m["despertares"] += 1
+        if datos is None:
+            continue
+        if lento:
+            m["saltados"] += max(0, nueva - vista - 1)
+        vista = nueva
+        publicado, _ = datos
+        m["latencias"].append(time.monotonic() - publicado)
+        m["entregados"] += 1
+        if lento:
+            await asyncio.sleep(lento)
+
+
+async def ejecutar(modo: str, args) -> dict:
+    ranura = RanuraPolling() if modo == "polling" else DifusorFrames()
+    cliente = cliente_polling if modo == "polling" else cliente_difusor
+    fin = threading.Event()
+    m = {"despertares": 0, "entregados": 0, "saltados": 0, "latencias": []}
+    lentos = int(args.clientes * args.fraccion_lentos)
+
+    cpu = time.process_time()
+    tareas = [
+        asyncio.create_task(
+            cliente(ranura, fin, args.lento_ms / 1000.0 if i < lentos else 0.0, m)
+        )
+        for i in range(args.clientes)
+    ]
+    await asyncio.sleep(0.05)  # los clientes se enlazan antes del primer frame
+    hilo = threading.Thread(target=productor, args=(ranura, args.fps, args.segundos, fin))
+    hilo.start()
+    await asyncio.get_running_loop().run_in_executor(None, hilo.join)
+    await asyncio.gather(*tareas)
+    m["cpu_seg"] = time.process_time() - cpu
+    return m
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de difusión MJPEG")
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--fraccion-lentos", type=float, default=0.1)
+    parser.add_argument("--lento-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    print(
+        f"{args.clientes} clientes, {args.fps:g} fps, {args.segundos:g}s, "
+        f"{int(args.clientes * args.fraccion_lentos)} lentos ({args.lento_ms:g} ms/envío)\n"
+    )
+    print(f"{'modo':<10}{'despertares':>13}{'entregados':>12}{'saltados':>10}"
+          f"{'lat. media ms':>15}{'lat. p95 ms':>13}{'CPU s':>8}")
+    for modo in ("polling", "difusor"):
+        m = asyncio.run(ejecutar(modo, args))
+        latencias = sorted(m["latencias"]) or [0.0]
+        p95 = latencias[int(len(latencias) * 0.95) - 1 if len(latencias) > 1 else 0]
+        print(
+            f"{modo:<10}{m['despertares']:>13}{m['entregados']:>12}{m['saltados']:>10}"
+            f"{statistics.mean(latencias) * 1000:>15.1f}{p95 * 1000:>13.1f}{m['cpu_seg']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+Configuración común de las pruebas unitarias del backend.
+
+Se ejecutan desde BACKEND/ con las dependencias de requirements-test.txt:
+
+    pip install -r requirements-test.txt
+    python -m pytest -q
+
+Los módulos que dependen de numpy, OpenCV, pydantic o la pila de BD se
+omiten con pytest.importorskip si el paquete no está instalado; pytest.ini
+activa -rs para que cada omisión aparezca en el resumen con su motivo.
+
+Los módulos que importan app.bd crean el engine de SQLAlchemy al
+importarse; no se abre ninguna conexión, pero hace falta una DATABASE_URL.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "postgresql+psycopg2://localhost/vescom_pruebas")
@@ -0,0 +1,92 @@
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("sqlalchemy", reason="requiere sqlalchemy (requirements-test.txt)")
+pytest.importorskip("pgvector", reason="requiere pgvector (requirements-test.txt)")
+pytest.importorskip("psycopg2", reason="requiere psycopg2-binary (requirements-test.txt)")
+pytest.importorskip("dotenv", reason="requiere python-dotenv (requirements-test.txt)")
+
+import agrupar_intrusos  # noqa: E402
+from agrupar_intrusos import (  # noqa: E402
+    FASE_GRAFO,
+    buscar_raiz,
+    cargar_checkpoint,
+    fusiones,
+    guardar_checkpoint,
+    unir,
+)
+
+
+def _padre(n: int) -> "np.ndarray":
+    return np.arange(n, dtype=np.int64)
+
+
+def test_unir_usa_el_menor_id_como_raiz():
+    padre = _padre(6)
+    assert unir(padre, 4, 2)
+    assert unir(padre, 5, 4)
+    assert not unir(padre, 2, 5)
+    assert {buscar_raiz(padre, i) for i in (2, 4, 5)} == {2}
+    assert buscar_raiz(padre, 3) == 3
+
+
+def test_compresion_de_camino():
+    padre = np.array([0, 0, 1, 2, 3], dtype=np.int64)
+    assert buscar_raiz(padre, 4) == 0
+    assert list(padre) == [0, 0, 0, 0, 0]
+
+
+def test_unir_prefiere_ids_existentes():
+    padre = _padre(8)
+    existente = np.zeros(8, dtype=bool)
+    existente[6] = True
+    unir(padre, 3, 6, existente)
+    assert buscar_raiz(padre, 3) == 6
+
+    existente[4] = True
+    unir(padre, 6, 4, existente)
+    assert buscar_raiz(padre, 3) == 4
+    assert fusiones(padre, existente) == ([6], [4])
+
+
+def test_checkpoint_ida_y_vuelta(tmp_path):
+    padre = _padre(5)
+    unir(padre, 1, 3)
+    existente = np.zeros(5, dtype=bool)
+    existente[1] = True
+    estado = {
+        "fase": FASE_GRAFO, "tope": 4, "ultimo": 2,
+        "padre": padre, "existente": existente, "aristas": 1,
+    }
+    ruta = tmp_path / "agrupamiento.npz"
+    guardar_checkpoint(ruta, estado)
+    cargado = cargar_checkpoint(ruta)
+
+    assert (cargado["fase"], cargado["tope"], cargado["ultimo"], cargado["aristas"]) == (
+        FASE_GRAFO, 4, 2, 1,
+    )
+    np.testing.assert_array_equal(cargado["padre"], padre)
+    np.testing.assert_array_equal(cargado["existente"], existente)
+    # Al reanudar, el union-find sigue donde quedó
+    assert buscar_raiz(cargado["padre"], 3) == 1
+
+
+def test_checkpoint_inexistente_o_sin_semilla(tmp_path):
+    ruta = tmp_path / "agrupamiento.npz"
+    assert cargar_checkpoint(ruta) is None
+    with open(ruta, "wb") as f:
+        np.savez(f, fase=FASE_GRAFO, tope=4, ultimo=2, padre=_padre(5), aristas=0)
+    assert cargar_checkpoint(ruta) is None
+
+
+def test_checkpoint_guarda_segun_intervalo(tmp_path):
+    ruta = tmp_path / "agrupamiento.npz"
+    checkpoint = agrupar_intrusos.Checkpoint(ruta, intervalo_seg=3600)
+    estado = {
+        "fase": FASE_GRAFO, "tope": 1, "ultimo": 0,
+        "padre": _padre(2), "existente": np.zeros(2, dtype=bool), "aristas": 0,
+    }
+    checkpoint.tal_vez_guardar(estado)
+    assert not ruta.exists()
+    checkpoint.guardar(estado)
+    assert cargar_checkpoint(ruta)["tope"] == 1
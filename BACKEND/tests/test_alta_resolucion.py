@@ -0,0 +1,35 @@
+import threading
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+
+from app.utils.alta_resolucion import BufferAltaResolucion  # noqa: E402
+
+
+def test_sin_armar_no_abre():
+    buffer = BufferAltaResolucion(capacidad=2, fps_max=0)
+    assert not buffer.esperar_armado(0.01)
+    assert not buffer.requiere_frame(time.monotonic())
+
+
+def test_armar_despierta_al_hilo_del_stream_principal():
+    buffer = BufferAltaResolucion(capacidad=2, fps_max=0)
+    threading.Timer(0.05, lambda: buffer.armar(time.monotonic() + 5)).start()
+    assert buffer.esperar_armado(2.0)
+    assert buffer.armado(time.monotonic())
+
+
+def test_vencido_deja_de_estar_armado():
+    buffer = BufferAltaResolucion(capacidad=2, fps_max=0)
+    buffer.armar(time.monotonic() - 1)
+    assert not buffer.esperar_armado(0.01)
+
+
+def test_frame_mas_cercano_dentro_de_la_tolerancia():
+    buffer = BufferAltaResolucion(capacidad=3, fps_max=0)
+    for ts in (1.0, 1.2, 1.4):
+        buffer.agregar(ts, np.full((2, 2, 3), int(ts * 10), dtype=np.uint8))
+    assert buffer.cercano(1.25, 0.1)[0, 0, 0] == 12
+    assert buffer.cercano(3.0, 0.1) is None
@@ -0,0 +1,102 @@
+import uuid
+
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+
+from app.utils.anillo_frames import AnilloFrames  # noqa: E402
+from app.utils.calidad import BufferMejorFrame  # noqa: E402
+
+FORMA = (4, 6, 3)
+
+
+@pytest.fixture
+def anillos():
+    nombre = f"vescom_prueba_{uuid.uuid4().hex[:8]}"
+    escritor = AnilloFrames.crear(nombre, ranuras=3, forma=FORMA)
+    lector = AnilloFrames.conectar(nombre, ranuras=3, forma=FORMA)
+    yield escritor, lector
+    lector.cerrar()
+    escritor.destruir()
+
+
+def _frame(valor: int) -> "np.ndarray":
+    return np.full(FORMA, valor, dtype=np.uint8)
+
+
+def test_vista_sin_copia_de_solo_lectura(anillos):
+    escritor, lector = anillos
+    seq = escritor.escribir(_frame(7), ts=12.5)
+    assert seq == 1 and lector.escrito == 1
+    lectura = lector.vista(seq)
+    assert lectura.ts == 12.5 and (lectura.frame == 7).all()
+    assert not lectura.frame.flags.writeable
+    assert np.shares_memory(lectura.frame, lector._frames)
+    with pytest.raises(ValueError):
+        lectura.frame[...] = 0
+
+
+def test_retener_copia_validada(anillos):
+    escritor, lector = anillos
+    lectura = lector.vista(escritor.escribir(_frame(1), ts=1.0))
+    copia = lectura.retener()
+    assert not np.shares_memory(copia, lector._frames)
+    for i in range(3):
+        escritor.escribir(_frame(2 + i), ts=2.0 + i)
+    # La copia sobrevive a la vuelta del escritor; la vista ya no es vigente
+    assert (copia == 1).all()
+    assert not lectura.vigente()
+    assert lectura.retener() is None
+
+
+def test_ranura_sobrescrita(anillos):
+    escritor, lector = anillos
+    primera = escritor.escribir(_frame(1), ts=1.0)
+    for i in range(3):
+        escritor.escribir(_frame(2 + i), ts=2.0 + i)
+    assert not lector.vigente(primera)
+    assert lector.vista(primera) is None
+    lectura = lector.vista(lector.escrito)
+    assert lectura.ts == 4.0 and (lectura.frame == 4).all()
+
+
+def test_ranura_en_escritura(anillos):
+    escritor, lector = anillos
+    seq = escritor.escribir(_frame(1), ts=1.0)
+    lectura = lector.vista(seq)
+    # El escritor marca -1 mientras copia
+    escritor._seqs[seq % escritor.ranuras] = -1
+    assert lector.vista(seq) is None
+    assert lectura.retener() is None
+
+
+def test_anillo_cerrado_no_es_vigente(anillos):
+    escritor, lector = anillos
+    lectura = lector.vista(escritor.escribir(_frame(1), ts=1.0))
+    lector.cerrar()
+    assert not lectura.vigente()
+
+
+def test_mejor_frame_solo_copia_al_retener(anillos):
+    escritor, lector = anillos
+    buffer = BufferMejorFrame()
+    mejor = lector.vista(escritor.escribir(_frame(1), ts=1.0))
+    buffer.ofrecer(mejor.frame, 0.9, mejor.ts, retener=mejor.retener)
+    peor = lector.vista(escritor.escribir(_frame(2), ts=2.0))
+    llamadas = []
+    buffer.ofrecer(peor.frame, 0.1, peor.ts, retener=lambda: llamadas.append(1))
+    assert not llamadas
+    for i in range(3):
+        escritor.escribir(_frame(3 + i), ts=3.0 + i)
+    frame, puntaje, ts = buffer.tomar()
+    assert (frame == 1).all() and puntaje == 0.9 and ts == 1.0
+
+
+def test_mejor_frame_descarta_ranura_sobrescrita(anillos):
+    escritor, lector = anillos
+    buffer = BufferMejorFrame()
+    lectura = lector.vista(escritor.escribir(_frame(1), ts=1.0))
+    for i in range(3):
+        escritor.escribir(_frame(2 + i), ts=2.0 + i)
+    buffer.ofrecer(lectura.frame, 0.9, lectura.ts, retener=lectura.retener)
+    assert buffer.tomar()[0] is None
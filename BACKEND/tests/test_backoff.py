@@ -0,0 +1,38 @@
+import random
+
+from app.utils.backoff import BackoffExponencial
+
+
+def test_espera_dentro_de_la_mitad_superior_del_techo():
+    backoff = BackoffExponencial(base=2.0, maximo=60.0, rng=random.Random(7))
+    for techo in [2, 4, 8, 16, 32, 60, 60, 60]:
+        espera = backoff.siguiente()
+        assert techo / 2 <= espera <= techo
+
+
+def test_reiniciar_vuelve_a_la_base():
+    backoff = BackoffExponencial(base=1.0, maximo=30.0, rng=random.Random(1))
+    for _ in range(10):
+        backoff.siguiente()
+    backoff.reiniciar()
+    assert backoff.intentos == 0
+    assert 0.5 <= backoff.siguiente() <= 1.0
+
+
+def test_maximo_menor_que_la_base():
+    backoff = BackoffExponencial(base=5.0, maximo=1.0, rng=random.Random(3))
+    assert backoff.maximo == 5.0
+    assert all(2.5 <= backoff.siguiente() <= 5.0 for _ in range(5))
+
+
+def test_jitter_en_los_extremos():
+    class Extremo(random.Random):
+        def __init__(self, valor):
+            super().__init__()
+            self.valor = valor
+
+        def uniform(self, a, b):
+            return a if self.valor == "min" else b
+
+    assert BackoffExponencial(4.0, 60.0, rng=Extremo("min")).siguiente() == 2.0
+    assert BackoffExponencial(4.0, 60.0, rng=Extremo("max")).siguiente() == 4.0
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("pydantic", reason="requiere pydantic (requirements-test.txt)")
+
+from pydantic import ValidationError  # noqa: E402
+
+from app.schemas.camara_schema import RegionInteres  # noqa: E402
+
+
+@pytest.mark.parametrize("datos", [
+    {"rect": [0.25, 0.0, 0.75, 1.0]},
+    {"poligono": [[0.3, 0.0], [0.7, 0.0], [0.8, 1.0], [0.2, 1.0]]},
+])
+def test_roi_valida(datos):
+    roi = RegionInteres(**datos)
+    assert roi.model_dump(exclude_none=True) == datos
+
+
+@pytest.mark.parametrize("datos", [
+    {},
+    {"rect": [0, 0, 1, 1], "poligono": [[0, 0], [1, 0], [1, 1]]},
+    {"rect": [0, 0, 1]},
+    {"rect": [0.5, 0, 0.4, 1]},
+    {"rect": [0, 0, 1.2, 1]},
+    {"poligono": [[0, 0], [1, 1]]},
+    {"poligono": [[0, 0], [1, 0], [1]]},
+    {"poligono": [[0, 0], [1, 0], [1, 1.5]]},
+])
+def test_roi_invalida(datos):
+    with pytest.raises(ValidationError):
+        RegionInteres(**datos)
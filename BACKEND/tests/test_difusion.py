@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from app.utils.difusion import DifusorFrames
+
+
+def test_publicar_incrementa_la_version():
+    difusor: DifusorFrames[str] = DifusorFrames()
+    assert difusor.version == 0
+    assert difusor.publicar("a") == 1
+    assert difusor.publicar("b") == 2
+    assert difusor.datos == "b"
+
+
+def test_consumidor_atrasado_recibe_el_mas_reciente():
+    async def escenario():
+        difusor: DifusorFrames[str] = DifusorFrames()
+        for datos in ("a", "b", "c"):
+            difusor.publicar(datos)
+        return await difusor.esperar(1, timeout=1)
+
+    assert asyncio.run(escenario()) == ("c", 3)
+
+
+def test_espera_una_publicacion_desde_otro_hilo():
+    async def escenario():
+        difusor: DifusorFrames[str] = DifusorFrames()
+        difusor.publicar("a")
+        espera = asyncio.create_task(difusor.esperar(1, timeout=2))
+        await asyncio.sleep(0.01)
+        hilo = threading.Thread(target=difusor.publicar, args=("b",))
+        hilo.start()
+        resultado = await espera
+        hilo.join()
+        return resultado
+
+    assert asyncio.run(escenario()) == ("b", 2)
+
+
+def test_timeout_conserva_la_version_vista():
+    async def escenario():
+        difusor: DifusorFrames[str] = DifusorFrames()
+        difusor.publicar("a")
+        return await difusor.esperar(1, timeout=0.01)
+
+    assert asyncio.run(escenario()) == (None, 1)
+
+
+def test_publicar_none_no_despierta_con_datos():
+    async def escenario():
+        difusor: DifusorFrames[str] = DifusorFrames()
+        difusor.publicar(None)
+        return await difusor.esperar(0, timeout=0.01)
+
+    assert asyncio.run(escenario()) == (None, 0)
@@ -0,0 +1,101 @@
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("cv2", reason="requiere opencv-python-headless (requirements-test.txt)")
+pytest.importorskip("sqlalchemy", reason="requiere sqlalchemy (requirements-test.txt)")
+
+from app.services.galeria_service import GaleriaEmbeddings  # noqa: E402
+from app.utils.face_utils import DIM_EMBEDDING  # noqa: E402
+
+
+def _vector(semilla: int) -> "np.ndarray":
+    return np.random.default_rng(semilla).normal(size=DIM_EMBEDDING).astype(np.float32)
+
+
+@pytest.fixture
+def galeria():
+    galeria = GaleriaEmbeddings()
+    galeria.agregar(1, 100, "Ana", "López", _vector(1))
+    galeria.agregar(2, 100, "Ana", "López", _vector(2))
+    galeria.agregar(3, 200, "Luis", "Pérez", _vector(3))
+    return galeria
+
+
+def _unitario(semilla: int) -> "np.ndarray":
+    v = _vector(semilla)
+    return v / np.linalg.norm(v)
+
+
+def test_galeria_vacia():
+    assert GaleriaEmbeddings().buscar([_unitario(1)]) == [(None, -1.0)]
+
+
+def test_buscar_mejor_coincidencia(galeria):
+    resultados = galeria.buscar([_unitario(3), _unitario(2)])
+    (persona_a, sim_a), (persona_b, sim_b) = resultados
+    assert persona_a == {"id_persona": 200, "nombre": "Luis", "apellidos": "Pérez"}
+    assert persona_b["id_persona"] == 100
+    # agregar() normaliza: la similitud con el mismo vector es 1
+    assert sim_a == pytest.approx(1.0, abs=1e-5)
+    assert sim_b == pytest.approx(1.0, abs=1e-5)
+
+
+def test_excluir_persona(galeria):
+    (persona, _), = galeria.buscar([_unitario(3)], excluir_persona=200)
+    assert persona["id_persona"] == 100
+
+
+def test_eliminar_persona(galeria):
+    galeria.eliminar_persona(100)
+    assert galeria.estado()["embeddings"] == 1
+    (persona, _), = galeria.buscar([_unitario(1)])
+    assert persona["id_persona"] == 200
+
+
+def test_actualizar_persona(galeria):
+    galeria.actualizar_persona(200, "Luis", "Pérez Gómez")
+    galeria.actualizar_persona(999, "Nadie", "")
+    (persona, _), = galeria.buscar([_unitario(3)])
+    assert persona["apellidos"] == "Pérez Gómez"
+    (persona, _), = galeria.buscar([_unitario(1)])
+    assert persona["id_persona"] == 100
+
+
+class _BDConcurrente:
+    """Sesión falsa: durante el SELECT de la recarga llega un cambio incremental."""
+
+    def __init__(self, filas, durante_select):
+        self.filas = filas
+        self.durante_select = durante_select
+
+    def execute(self, _consulta):
+        self.durante_select()
+        return self
+
+    def all(self):
+        return self.filas
+
+
+def test_recarga_conserva_cambios_concurrentes(galeria):
+    filas = [
+        (1, 100, _vector(1).tolist(), "Ana", "López"),
+        (3, 200, _vector(3).tolist(), "Luis", "Pérez"),
+    ]
+
+    def durante_select():
+        galeria.agregar(4, 300, "Eva", "Ruiz", _vector(4))
+        galeria.eliminar_persona(200)
+
+    assert galeria.cargar(_BDConcurrente(filas, durante_select)) == 2
+    assert galeria.estado()["embeddings"] == 2
+    (persona_eva, _), (persona_luis, _) = galeria.buscar([_unitario(4), _unitario(3)])
+    assert persona_eva["id_persona"] == 300
+    assert persona_luis["id_persona"] != 200
+
+
+def test_recarga_que_ya_vio_el_cambio_no_lo_duplica(galeria):
+    filas = [(4, 300, _vector(4).tolist(), "Eva", "Ruiz")]
+    galeria.cargar(_BDConcurrente(
+        filas, lambda: galeria.agregar(4, 300, "Eva", "Ruiz", _vector(4))
+    ))
+    assert galeria.estado()["embeddings"] == 1
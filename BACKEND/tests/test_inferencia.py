@@ -0,0 +1,56 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("cv2", reason="requiere opencv-python-headless (requirements-test.txt)")
+
+from app.services.inferencia_service import InferenciaNoDisponible, PoolInferencia  # noqa: E402
+
+
+def _pool(**kwargs) -> PoolInferencia:
+    pool = PoolInferencia(workers=1, **kwargs)
+    # Hilos en lugar de procesos: mismo contrato de submit() sin cargar el modelo
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    return pool
+
+
+def test_resultado_y_cupo_liberado():
+    async def escenario():
+        pool = _pool(max_pendientes=2)
+        resultado = await pool.ejecutar(sum, [1, 2, 3])
+        await asyncio.sleep(0.01)
+        return resultado, pool.estado()["pendientes"]
+
+    assert asyncio.run(escenario()) == (6, 0)
+
+
+def test_timeout_mantiene_el_cupo_hasta_que_termina_el_trabajo():
+    async def escenario():
+        pool = _pool(max_pendientes=1, timeout_seg=0.05)
+        with pytest.raises(InferenciaNoDisponible, match="tiempo límite"):
+            await pool.ejecutar(time.sleep, 0.3)
+        # El hilo sigue ocupado: el cupo no se devuelve todavía
+        assert pool.estado()["pendientes"] == 1
+        with pytest.raises(InferenciaNoDisponible, match="llena"):
+            await pool.ejecutar(sum, [1])
+        await asyncio.sleep(0.4)
+        assert pool.estado()["pendientes"] == 0
+        assert await pool.ejecutar(sum, [1]) == 1
+        pool.detener()
+
+    asyncio.run(escenario())
+
+
+def test_cupos_de_deteccion_y_lotes_separados():
+    async def escenario():
+        pool = _pool(max_pendientes=1, max_lotes=1, timeout_seg=0.05)
+        with pytest.raises(InferenciaNoDisponible):
+            await pool.ejecutar(time.sleep, 0.2)
+        pool.timeout_seg = 1.0
+        assert await pool.ejecutar(sum, [2], lote=True) == 2
+        pool.detener()
+
+    asyncio.run(escenario())
@@ -0,0 +1,88 @@
+import math
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+
+from app.utils.lote_embeddings import (  # noqa: E402
+    CABECERA,
+    DIMENSION,
+    RostroEmbebido,
+    codificar_embeddings,
+    decodificar_embeddings,
+)
+
+
+def _rostro(semilla: int, recorte=None, id_camara=2, ts=1_700_000_000.5) -> RostroEmbebido:
+    embedding = np.random.default_rng(semilla).normal(size=DIMENSION).astype(np.float32)
+    return RostroEmbebido(
+        embedding=embedding / np.linalg.norm(embedding),
+        bbox=[10.0, 20.0, 110.0, 140.0],
+        det_score=0.875,
+        id_camara=id_camara,
+        ts=ts,
+        recorte=recorte,
+    )
+
+
+def test_ida_y_vuelta():
+    rostros = [_rostro(1, recorte=b"\xff\xd8jpeg"), _rostro(2, id_camara=None, ts=None)]
+    decodificados = decodificar_embeddings(codificar_embeddings(rostros), max_rostros=8)
+    assert len(decodificados) == 2
+    for original, rostro in zip(rostros, decodificados):
+        np.testing.assert_allclose(rostro.embedding, original.embedding, atol=1e-6)
+        assert rostro.bbox == original.bbox
+        assert rostro.det_score == original.det_score
+        assert rostro.id_camara == original.id_camara
+        assert rostro.ts == original.ts
+        assert rostro.recorte == original.recorte
+
+
+def test_renormaliza_el_embedding():
+    rostro = _rostro(3)
+    rostro.embedding = rostro.embedding * 7
+    decodificado, = decodificar_embeddings(codificar_embeddings([rostro]), max_rostros=1)
+    assert np.linalg.norm(decodificado.embedding) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_rostro_truncado():
+    cuerpo = codificar_embeddings([_rostro(4)])
+    with pytest.raises(ValueError, match="Rostro #0 truncado"):
+        decodificar_embeddings(cuerpo[: CABECERA.size + 10], max_rostros=4)
+
+
+def test_recorte_truncado():
+    cuerpo = codificar_embeddings([_rostro(5, recorte=b"abcdef")])
+    with pytest.raises(ValueError, match="Recorte del rostro #0 truncado"):
+        decodificar_embeddings(cuerpo[:-1], max_rostros=4)
+
+
+def test_embedding_invalido():
+    rostro = _rostro(6)
+    rostro.embedding = np.zeros(DIMENSION, dtype=np.float32)
+    with pytest.raises(ValueError, match="inválido"):
+        decodificar_embeddings(codificar_embeddings([rostro]), max_rostros=4)
+
+
+def test_excede_max_rostros():
+    cuerpo = codificar_embeddings([_rostro(i) for i in range(3)])
+    with pytest.raises(ValueError, match="excede 2"):
+        decodificar_embeddings(cuerpo, max_rostros=2)
+
+
+@pytest.mark.parametrize("campo", ["bbox", "det_score", "ts"])
+@pytest.mark.parametrize("valor", [math.nan, math.inf, -math.inf])
+def test_cabecera_no_finita(campo, valor):
+    rostro = _rostro(7)
+    if campo == "bbox":
+        rostro.bbox = [10.0, valor, 110.0, 140.0]
+    else:
+        setattr(rostro, campo, valor)
+    with pytest.raises(ValueError, match="no finitos"):
+        decodificar_embeddings(codificar_embeddings([rostro]), max_rostros=4)
+
+
+def test_little_endian():
+    cuerpo = codificar_embeddings([_rostro(8, id_camara=1)])
+    assert struct.unpack_from("<I", cuerpo)[0] == 1
@@ -0,0 +1,45 @@
+import struct
+
+import pytest
+
+from app.utils.lote_frames import CABECERA, FrameLote, codificar_lote, decodificar_lote
+
+
+def test_ida_y_vuelta():
+    frames = [
+        FrameLote(b"\xff\xd8jpeg-1", id_camara=3, ts=1_700_000_000.25),
+        FrameLote(b"png-2"),
+    ]
+    assert decodificar_lote(codificar_lote(frames), max_frames=8) == frames
+
+
+def test_cuerpo_vacio():
+    assert decodificar_lote(b"", max_frames=4) == []
+
+
+def test_cabecera_truncada():
+    cuerpo = codificar_lote([FrameLote(b"abc", id_camara=1, ts=1.0)])
+    with pytest.raises(ValueError, match="Cabecera truncada"):
+        decodificar_lote(cuerpo + cuerpo[: CABECERA.size - 1], max_frames=4)
+
+
+def test_imagen_truncada():
+    cuerpo = codificar_lote([FrameLote(b"abcdef", id_camara=1, ts=1.0)])
+    with pytest.raises(ValueError, match="truncada"):
+        decodificar_lote(cuerpo[:-1], max_frames=4)
+
+
+def test_imagen_vacia():
+    with pytest.raises(ValueError, match="vacía"):
+        decodificar_lote(CABECERA.pack(1, 1.0, 0), max_frames=4)
+
+
+def test_excede_max_frames():
+    cuerpo = codificar_lote([FrameLote(b"x")] * 3)
+    with pytest.raises(ValueError, match="excede 2"):
+        decodificar_lote(cuerpo, max_frames=2)
+
+
+def test_little_endian():
+    cuerpo = codificar_lote([FrameLote(b"abc", id_camara=1, ts=2.0)])
+    assert struct.unpack_from("<IdI", cuerpo) == (1, 2.0, 3)
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("cv2", reason="requiere opencv-python-headless (requirements-test.txt)")
+pytest.importorskip("fastapi", reason="requiere fastapi (requirements-test.txt)")
+pytest.importorskip("sqlalchemy", reason="requiere sqlalchemy (requirements-test.txt)")
+pytest.importorskip("pgvector", reason="requiere pgvector (requirements-test.txt)")
+pytest.importorskip("psycopg2", reason="requiere psycopg2-binary (requirements-test.txt)")
+pytest.importorskip("twilio", reason="requiere twilio (requirements-test.txt)")
+
+import app.bd  # noqa: E402,F401  (registra los modelos antes que los servicios)
+from app.schemas.reconocimiento_schema import ResultadoReconocimiento  # noqa: E402
+from app.services import reconocimiento_service as servicio  # noqa: E402
+from app.utils.seguimiento import RastreadorRostros  # noqa: E402
+
+BBOX = np.array([0, 0, 100, 100], dtype=np.float32)
+ANA = {"id_persona": 7, "nombre": "Ana", "apellidos": "López"}
+
+
+def _unitario(semilla: int) -> "np.ndarray":
+    v = np.random.default_rng(semilla).normal(size=512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+@pytest.fixture
+def motor(monkeypatch):
+    """Inferencia y BD simuladas; cuenta los eventos registrados."""
+    estado = {"embedding": _unitario(1), "coincidencia": (ANA, 0.45), "eventos": 0}
+
+    async def detectar_rostros(imagen, perfil=None):
+        return [{"bbox": BBOX, "det_score": 0.9, "alineado": np.zeros((112, 112, 3), np.uint8)}]
+
+    async def embeber(alineados):
+        return [estado["embedding"] for _ in alineados]
+
+    async def registrar(db, embeddings, contenido, id_camara, coincidencias=None):
+        resultados = []
+        for persona, similitud in coincidencias:
+            estado["eventos"] += 1
+            autorizado = persona is not None and similitud >= servicio.SIMILITUD_UMBRAL
+            resultados.append(ResultadoReconocimiento(
+                tipo_acceso="Autorizado" if autorizado else "No Autorizado",
+                similitud=similitud,
+                id_persona=persona["id_persona"] if autorizado else None,
+                id_evento=estado["eventos"],
+            ))
+        return resultados
+
+    monkeypatch.setattr(servicio.inferencia_pool, "detectar_rostros", detectar_rostros)
+    monkeypatch.setattr(servicio.agrupador_reconocimiento, "embeber", embeber)
+    monkeypatch.setattr(
+        servicio, "_buscar_coincidencias", lambda db, embs: [estado["coincidencia"]] * len(embs)
+    )
+    monkeypatch.setattr(servicio, "_registrar_identificaciones", registrar)
+    return estado
+
+
+def _frame(rastreador, ahora, monkeypatch):
+    monkeypatch.setattr(servicio.time, "monotonic", lambda: ahora)
+    rostro, = asyncio.run(servicio._identificar_rostros(None, b"", 1, None, rastreador))
+    return rostro
+
+
+def test_revalidacion_con_la_misma_identidad_no_genera_evento(motor, monkeypatch):
+    rastreador = RastreadorRostros(umbral=servicio.SIMILITUD_UMBRAL, margen=0.08, max_reintentos=3)
+    primero = _frame(rastreador, 0.0, monkeypatch)
+    assert primero.reconocido and motor["eventos"] == 1
+
+    # Similitud ambigua: se reintenta, pero la identidad no cambia
+    for t in (0.1, 0.2, 0.3):
+        rostro = _frame(rastreador, t, monkeypatch)
+        assert not rostro.reconocido
+        assert rostro.id_evento == primero.id_evento
+    assert motor["eventos"] == 1
+
+
+def test_revalidacion_con_otra_identidad_genera_evento(motor, monkeypatch):
+    rastreador = RastreadorRostros(umbral=servicio.SIMILITUD_UMBRAL, margen=0.08)
+    _frame(rastreador, 0.0, monkeypatch)
+    motor["coincidencia"] = (ANA, 0.1)
+    rostro = _frame(rastreador, 0.1, monkeypatch)
+    assert rostro.reconocido and rostro.tipo_acceso == "No Autorizado"
+    assert motor["eventos"] == 2
+
+
+def test_intruso_distinto_en_la_misma_pista_genera_evento(motor, monkeypatch):
+    rastreador = RastreadorRostros(
+        umbral=servicio.SIMILITUD_UMBRAL, revalidar_dudosa_seg=10, verificar_seg=60, ttl_seg=60
+    )
+    motor["coincidencia"] = (None, -1.0)
+    _frame(rastreador, 0.0, monkeypatch)
+    _frame(rastreador, 10.0, monkeypatch)
+    assert motor["eventos"] == 1
+    motor["embedding"] = _unitario(2)
+    _frame(rastreador, 20.0, monkeypatch)
+    assert motor["eventos"] == 2
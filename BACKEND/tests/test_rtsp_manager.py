@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("cv2", reason="requiere opencv-python-headless (requirements-test.txt)")
+pytest.importorskip("sqlalchemy", reason="requiere sqlalchemy (requirements-test.txt)")
+pytest.importorskip("psycopg2", reason="requiere psycopg2-binary (requirements-test.txt)")
+
+import app.bd  # noqa: E402,F401  (registra los modelos antes que los servicios)
+from app.services import rtsp_manager as modulo  # noqa: E402
+
+
+class _WorkerFalso:
+    creados = 0
+
+    def __init__(self, id_camara, rtsp_url, perfil, rtsp_url_alta=None, intervalo_seg=0.0):
+        _WorkerFalso.creados += 1
+        self.id_camara, self.rtsp_url, self.rtsp_url_alta = id_camara, rtsp_url, rtsp_url_alta
+        self.intervalo_seg = intervalo_seg
+        self.origenes = set()
+        self.activo = False
+        self.detenido = False
+        self.vista = type("Vista", (), {"nombre": "vista"})()
+        self._consumidores = {"vista": self.vista}
+
+    def adjuntar_consumidor(self, consumidor) -> None:
+        pass
+
+    async def iniciar_async(self, token: str) -> None:
+        self.activo = True
+
+    def detener(self) -> None:
+        self.activo = False
+        self.detenido = True
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    _WorkerFalso.creados = 0
+    monkeypatch.setattr(modulo, "CameraWorker", _WorkerFalso)
+    monkeypatch.setattr(modulo, "DOBLE_STREAM", False)
+    # Perfil lento: deja a la otra llamada correr durante el await
+    monkeypatch.setattr(modulo, "_cargar_perfil_camara", lambda _id: time.sleep(0.05))
+    m = modulo.RTSPManager()
+    monkeypatch.setattr(m, "_asegurar_supervisor", lambda: None)
+    return m
+
+
+def test_arranques_simultaneos_crean_un_solo_worker(manager):
+    async def escenario():
+        return await asyncio.gather(
+            manager.iniciar_camara(1, "rtsp://cam/1", origen="rtsp"),
+            manager.iniciar_camara(1, "rtsp://cam/1", origen="monitoreo"),
+        )
+
+    primero, segundo = asyncio.run(escenario())
+    assert primero is segundo
+    assert _WorkerFalso.creados == 1
+    assert primero.origenes == {"rtsp", "monitoreo"}
+
+
+def test_reinicios_simultaneos_dejan_un_worker_activo(manager):
+    async def escenario():
+        anterior = await manager.iniciar_camara(1, "rtsp://cam/1", origen="rtsp")
+        nuevos = await asyncio.gather(
+            manager.iniciar_camara(1, "rtsp://cam/2", origen="rtsp"),
+            manager.iniciar_camara(1, "rtsp://cam/2", origen="monitoreo"),
+        )
+        return anterior, nuevos
+
+    anterior, (a, b) = asyncio.run(escenario())
+    assert anterior.detenido
+    assert a is b and a.activo
+    assert _WorkerFalso.creados == 2
+    assert manager.obtener_worker(1) is a
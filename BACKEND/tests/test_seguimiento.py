@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+
+from app.utils.seguimiento import RastreadorRostros, iou  # noqa: E402
+
+
+def _caja(x1, y1, x2, y2):
+    return np.array([x1, y1, x2, y2], dtype=np.float32)
+
+
+def _unitario(semilla: int) -> "np.ndarray":
+    v = np.random.default_rng(semilla).normal(size=512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_iou():
+    assert iou(_caja(0, 0, 10, 10), _caja(0, 0, 10, 10)) == pytest.approx(1.0)
+    assert iou(_caja(0, 0, 10, 10), _caja(5, 0, 15, 10)) == pytest.approx(50 / 150)
+    assert iou(_caja(0, 0, 10, 10), _caja(20, 20, 30, 30)) == 0.0
+
+
+def test_misma_pista_entre_frames():
+    rastreador = RastreadorRostros(umbral=0.4)
+    a, b = rastreador.actualizar([_caja(0, 0, 100, 100), _caja(300, 0, 400, 100)], ahora=0.0)
+    b2, a2 = rastreador.actualizar([_caja(305, 5, 405, 105), _caja(10, 0, 110, 100)], ahora=0.1)
+    assert (a2.id_pista, b2.id_pista) == (a.id_pista, b.id_pista)
+    assert a2.frames == 2
+    assert rastreador.pistas_activas() == 2
+
+
+def test_asociacion_por_centro_con_poco_solapamiento():
+    rastreador = RastreadorRostros(umbral=0.4, iou_min=0.3, distancia_max=0.6)
+    pista, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=0.0)
+    movida, = rastreador.actualizar([_caja(50, 0, 150, 100)], ahora=0.1)
+    assert movida.id_pista == pista.id_pista
+
+
+def test_pistas_vencidas_se_descartan():
+    rastreador = RastreadorRostros(umbral=0.4, ttl_seg=3.0)
+    pista, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=0.0)
+    nueva, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=5.0)
+    assert nueva.id_pista != pista.id_pista
+    assert rastreador.pistas_activas() == 1
+
+
+def test_politica_de_reconocimiento():
+    rastreador = RastreadorRostros(
+        umbral=0.4, margen=0.08, max_reintentos=2, revalidar_seg=300, revalidar_dudosa_seg=10
+    )
+    pista, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=0.0)
+    assert rastreador.requiere_reconocimiento(pista, ahora=0.0)
+
+    pista.asignar_resultado("confiable", 0.9, ahora=0.0)
+    assert not rastreador.requiere_reconocimiento(pista, ahora=100.0)
+    assert rastreador.requiere_reconocimiento(pista, ahora=300.0)
+
+    pista.asignar_resultado("ambigua", 0.42, ahora=0.0)
+    assert rastreador.requiere_reconocimiento(pista, ahora=1.0)
+    pista.asignar_resultado("ambigua", 0.42, ahora=0.0)
+    assert not rastreador.requiere_reconocimiento(pista, ahora=1.0)
+
+    pista.asignar_resultado("No Autorizado", 0.1, ahora=0.0)
+    assert not rastreador.requiere_reconocimiento(pista, ahora=5.0)
+    assert rastreador.requiere_reconocimiento(pista, ahora=10.0)
+
+
+def test_verificacion_de_identidad():
+    rastreador = RastreadorRostros(umbral=0.4, verificar_seg=2, similitud_pista=0.5)
+    pista, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=0.0)
+    assert not rastreador.requiere_verificacion(pista, ahora=10.0)
+
+    embedding = _unitario(1)
+    pista.asignar_resultado("persona", 0.9, ahora=0.0, embedding=embedding)
+    assert not rastreador.requiere_verificacion(pista, ahora=1.0)
+    assert rastreador.requiere_verificacion(pista, ahora=2.0)
+    assert rastreador.verificar(pista, embedding, ahora=2.0)
+    assert not rastreador.requiere_verificacion(pista, ahora=3.0)
+    assert not rastreador.verificar(pista, _unitario(2), ahora=3.0)
+
+
+def test_cambio_de_escala_fuerza_verificacion():
+    rastreador = RastreadorRostros(umbral=0.4, verificar_seg=60, cambio_escala_max=2.0)
+    pista, = rastreador.actualizar([_caja(0, 0, 100, 100)], ahora=0.0)
+    pista.asignar_resultado("persona", 0.9, ahora=0.0, embedding=_unitario(1))
+    pista, = rastreador.actualizar([_caja(0, 0, 160, 160)], ahora=0.1)
+    assert rastreador.requiere_verificacion(pista, ahora=0.1)
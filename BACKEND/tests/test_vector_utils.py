@@ -0,0 +1,14 @@
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+
+from app.utils.vector_utils import literal_vector, literal_vectores  # noqa: E402
+
+
+def test_literal_vector():
+    assert literal_vector(np.array([0.5, -1.0, 1e-8], dtype=np.float32)) == "[0.5,-1,1e-08]"
+
+
+def test_literal_vectores():
+    vectores = [np.array([1.0, 0.0]), np.array([0.25, 2.0])]
+    assert literal_vectores(vectores) == '{"[1,0]","[0.25,2]"}'
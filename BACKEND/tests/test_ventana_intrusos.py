@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip("numpy", reason="requiere numpy (requirements-test.txt)")
+pytest.importorskip("sqlalchemy", reason="requiere sqlalchemy (requirements-test.txt)")
+pytest.importorskip("pgvector", reason="requiere pgvector (requirements-test.txt)")
+pytest.importorskip("psycopg2", reason="requiere psycopg2-binary (requirements-test.txt)")
+pytest.importorskip("dotenv", reason="requiere python-dotenv (requirements-test.txt)")
+
+import app.bd  # noqa: E402,F401  (registra los modelos antes que los servicios)
+from app.services.intrusos_service import VentanaIntrusos  # noqa: E402
+
+
+def _unitario(semilla: int) -> "np.ndarray":
+    v = np.random.default_rng(semilla).normal(size=512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_mismo_intruso_dentro_de_la_ventana():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    embedding = _unitario(1)
+    assert ventana.buscar(1, embedding, ahora=0.0) is None
+    ventana.registrar(1, id_evento=10, embedding=embedding, ahora=0.0)
+
+    entrada = ventana.buscar(1, embedding, ahora=60.0)
+    assert entrada.id_evento == 10
+    ventana.avistar(entrada, ahora=60.0)
+    assert entrada.avistamientos == 2
+    # Cada avistamiento renueva la vigencia
+    assert ventana.buscar(1, embedding, ahora=170.0) is entrada
+
+
+def test_buscar_no_modifica_la_entrada():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    ventana.registrar(1, id_evento=10, embedding=_unitario(1), ahora=0.0)
+    entrada = ventana.buscar(1, _unitario(1), ahora=60.0)
+    assert (entrada.avistamientos, entrada.ultimo_avistamiento) == (1, 0.0)
+    # Sin avistamientos anotados la entrada vence a su hora original
+    assert ventana.buscar(1, _unitario(1), ahora=121.0) is None
+
+
+def test_otra_camara_u_otra_persona():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    ventana.registrar(1, id_evento=10, embedding=_unitario(1), ahora=0.0)
+    assert ventana.buscar(2, _unitario(1), ahora=1.0) is None
+    assert ventana.buscar(1, _unitario(2), ahora=1.0) is None
+
+
+def test_entrada_vencida():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    ventana.registrar(1, id_evento=10, embedding=_unitario(1), ahora=0.0)
+    assert ventana.buscar(1, _unitario(1), ahora=121.0) is None
+
+
+def test_max_entradas_descarta_las_mas_viejas():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=2)
+    for i in range(3):
+        ventana.registrar(1, id_evento=i, embedding=_unitario(i), ahora=float(i))
+    assert ventana.estado()["intrusos"] == {1: 2}
+    assert ventana.buscar(1, _unitario(0), ahora=3.0) is None
+    assert ventana.buscar(1, _unitario(2), ahora=3.0).id_evento == 2
+
+
+def test_deshabilitada():
+    ventana = VentanaIntrusos(ventana_seg=0)
+    ventana.registrar(1, id_evento=10, embedding=_unitario(1), ahora=0.0)
+    assert ventana.buscar(1, _unitario(1), ahora=0.0) is None
+
+
+def test_pendiente_solo_se_ve_tras_confirmar():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    pendiente = ventana.nueva_pendiente()
+    pendiente.registrar(1, id_evento=10, embedding=_unitario(1))
+    assert pendiente.buscar(1, _unitario(1)).id_evento == 10
+    assert ventana.buscar(1, _unitario(1)) is None
+    ventana.confirmar(pendiente)
+    assert ventana.buscar(1, _unitario(1)).id_evento == 10
+
+
+def test_confirmar_aplica_los_avistamientos_de_la_transaccion():
+    ventana = VentanaIntrusos(ventana_seg=120, similitud_min=0.45, max_entradas=8)
+    ventana.registrar(1, id_evento=10, embedding=_unitario(1), ahora=0.0)
+    entrada = ventana.buscar(1, _unitario(1), ahora=50.0)
+    # Rollback: la transacción se descarta sin confirmar
+    assert entrada.avistamientos == 1
+    ventana.confirmar(ventana.nueva_pendiente(), [(entrada, 100.0), (entrada, 90.0)])
+    assert entrada.avistamientos == 3
+    assert entrada.ultimo_avistamiento == 100.0
@@ -40,7 +40,14 @@ CREATE TABLE IF NOT EXISTS camaras (
     id_cubiculo INTEGER REFERENCES cubiculos(id_cubiculo),
     activa BOOLEAN DEFAULT TRUE,
     estado VARCHAR(20) DEFAULT 'Activa',
-    fecha_registro TIMESTAMP DEFAULT NOW()
+    fecha_registro TIMESTAMP DEFAULT NOW(),
+    -- Perfil de detección (NULL = valores globales del motor)
+    roi JSONB,
+    det_size INTEGER,
+    min_rostro_px INTEGER,
+    max_rostros INTEGER,
+    sensibilidad_movimiento FLOAT,
+    fps_decodificacion FLOAT
 );
 
 -- -----------------------------------------------------
@@ -73,7 +80,18 @@ CREATE TABLE IF NOT EXISTS personas_no_autorizadas (
     fecha DATE DEFAULT CURRENT_DATE,
     hora TIME DEFAULT CURRENT_TIME,
     ruta_imagen_captura VARCHAR(255),
-    embedding_detectado vector(512)
+    embedding_detectado vector(512),
+    id_intruso INT,
+    id_camara INT REFERENCES camaras(id_camara),
+    id_evento INT -- eventos_acceso se crea después; sin FK en BD
+);
+
+-- Un centroide por identidad de intruso (lo reconstruye agrupar_intrusos.py)
+CREATE TABLE IF NOT EXISTS intrusos_centroides (
+    id_intruso INT PRIMARY KEY,
+    embedding vector(512) NOT NULL,
+    capturas INT NOT NULL,
+    actualizado TIMESTAMP DEFAULT NOW()
 );
 
 -- -----------------------------------------------------
@@ -87,7 +105,9 @@ CREATE TABLE IF NOT EXISTS eventos_acceso (
     tipo_acceso VARCHAR(20),
     fecha DATE DEFAULT CURRENT_DATE,
     hora TIME DEFAULT CURRENT_TIME,
-    similitud FLOAT
+    similitud FLOAT,
+    avistamientos INT NOT NULL DEFAULT 1,
+    ultimo_avistamiento TIMESTAMP DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS alertas (
@@ -130,6 +150,22 @@ CREATE TABLE IF NOT EXISTS profesores (
     fecha_registro TIMESTAMP DEFAULT NOW()
 );
 
+-- -----------------------------------------------------
+-- Migraciones para bases de datos existentes
+-- -----------------------------------------------------
+
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS roi JSONB;
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS det_size INTEGER;
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS min_rostro_px INTEGER;
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS max_rostros INTEGER;
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS sensibilidad_movimiento FLOAT;
+ALTER TABLE camaras ADD COLUMN IF NOT EXISTS fps_decodificacion FLOAT;
+ALTER TABLE eventos_acceso ADD COLUMN IF NOT EXISTS avistamientos INT NOT NULL DEFAULT 1;
+ALTER TABLE eventos_acceso ADD COLUMN IF NOT EXISTS ultimo_avistamiento TIMESTAMP DEFAULT NOW();
+ALTER TABLE personas_no_autorizadas ADD COLUMN IF NOT EXISTS id_intruso INT;
+ALTER TABLE personas_no_autorizadas ADD COLUMN IF NOT EXISTS id_camara INT REFERENCES camaras(id_camara);
+ALTER TABLE personas_no_autorizadas ADD COLUMN IF NOT EXISTS id_evento INT;
+
 -- -----------------------------------------------------
 -- Índices para rendimiento
 -- -----------------------------------------------------
@@ -145,6 +181,12 @@ CREATE INDEX IF NOT EXISTS idx_personas_no_autorizadas_embedding
     ON personas_no_autorizadas USING hnsw (embedding_detectado vector_cosine_ops)
     WHERE embedding_detectado IS NOT NULL;
 
+CREATE INDEX IF NOT EXISTS idx_personas_no_autorizadas_id_intruso
+    ON personas_no_autorizadas(id_intruso);
+
+CREATE INDEX IF NOT EXISTS idx_intrusos_centroides_embedding
+    ON intrusos_centroides USING hnsw (embedding vector_cosine_ops);
+
 CREATE INDEX IF NOT EXISTS idx_camaras_id_cubiculo
     ON camaras(id_cubiculo);
 